@@ -1,9 +1,10 @@
 import threading
-import json
 import logging
 from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 import os
+from audio_analysis import read_waveform_sidecar
+from lyrics_timeline import load_lyrics, find_lyrics_files
 
 # Configure Flask logging to be less verbose
 log = logging.getLogger('werkzeug')
@@ -17,6 +18,8 @@ class KaraokeAPI:
         CORS(self.app)  # Enable CORS for all routes
         self.thread = None
         self.running = False
+        self.request_count = 0 # Total de requisições (taxa no overlay de desempenho)
+        self.app.before_request(self._count_request)
 
         # Register Routes
         self.app.add_url_rule('/api/library', 'get_library', self.get_library, methods=['GET'])
@@ -25,12 +28,16 @@ class KaraokeAPI:
         self.app.add_url_rule('/api/queue/add', 'add_to_queue', self.add_to_queue, methods=['POST'])
         self.app.add_url_rule('/api/player/<action>', 'player_control', self.player_control, methods=['POST'])
         self.app.add_url_rule('/api/song/<int:song_id>/lyrics', 'get_lyrics', self.get_lyrics, methods=['GET'])
+        self.app.add_url_rule('/api/song/<int:song_id>/peaks', 'get_peaks', self.get_peaks, methods=['GET'])
         
         # Static media serving
         # Assuming we run from 'E:\karaoke\karaoke', songs are in 'songs/'
         self.SONGS_DIR = os.path.join(os.getcwd(), 'songs')
         self.app.add_url_rule('/media/<path:filename>', 'serve_media', self.serve_media, methods=['GET'])
 
+    def _count_request(self):
+        self.request_count += 1
+
     def serve_media(self, filename):
         """Serves files from the songs directory."""
         return send_from_directory(self.SONGS_DIR, filename)
@@ -162,6 +169,8 @@ class KaraokeAPI:
                 'artist': song.get('artist', "Unknown"),
                 'path': song.get('path', ""),
                 'lyrics_file': song.get('lyrics_file', None),
+                'duration_ms': song.get('duration_ms', 0),
+                'stems': song.get('stems', {}),
                 'audio_file': song.get('audio_file', None),
             }
             song_data = self._generate_urls(song_data)
@@ -204,6 +213,8 @@ class KaraokeAPI:
                 'status': status,
                 'current_song': current,
                 'queue': queue_data,
+                'duration_ms': int(getattr(self.player, 'total_duration', 0) or 0),
+                'position_ms': int(self.player.playback_clock.position_ms()) if hasattr(self.player, 'playback_clock') else 0,
                 'volume': self.player.volume if hasattr(self.player, 'volume') else 1.0
             })
         except Exception as e:
@@ -269,6 +280,8 @@ class KaraokeAPI:
                 # self.player.current_song = None # UNSAFE in thread, let player loop handle it
                 import pygame
                 pygame.mixer.music.stop()
+                if hasattr(self.player, 'stem_player'):
+                    self.player.stem_player.stop()
             
             elif action == 'restart':
                 self.player.restart_requested = True
@@ -286,39 +299,68 @@ class KaraokeAPI:
             return jsonify({'error': str(e)}), 500
 
     def get_lyrics(self, song_id):
-        """Returns the lyrics for a song (V1 or V2)."""
+        """Returns the lyrics for a song (V1, V2 or LRC), from the player's compact representation."""
+        try:
+            song = self.player.library.get_song(song_id)
+            if not song:
+                return jsonify({'error': 'Song not found'}), 404
+
+            # Song on stage: serve the lyrics the player is showing (may be V2 after 'L')
+            current = self.player.current_song
+            if current and str(current.get('id')) == str(song_id) and len(self.player.lyrics):
+                return jsonify(self.player.lyrics.to_json())
+
+            # Same priority as the player: V1 -> V2 -> LRC
+            for lyrics_file in find_lyrics_files(os.path.dirname(song.get('path', ''))):
+                lyrics = load_lyrics(lyrics_file['path'])
+                if len(lyrics):
+                    return jsonify(lyrics.to_json())
+            # Return error 404 if really no lyrics.
+            return jsonify({'error': 'Lyrics file not found'}), 404
+
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def get_peaks(self, song_id):
+        """
+        Returns precomputed waveform peaks for a song stem (for seek bars).
+        Query params: stem (instrumental|original), level (samples per peak, optional),
+        format=bin returns raw int8 (min,max) pairs instead of JSON.
+        """
         try:
             song = self.player.library.get_song(song_id)
             if not song:
                 return jsonify({'error': 'Song not found'}), 404
-            
-            lyrics_data = None
-            
-            # Locate lyrics file
-            # Logic: Look for lyrics_v1.json or similar in song's directory
-            # Assuming song.path is the audio file or directory
-            
-            target_path = getattr(song, 'lyrics_file', None)
-            
-            if not target_path or not os.path.exists(target_path):
-                 # Try to infer if not explicitly set
-                 if hasattr(song, 'path'):
-                     # stored path usually audio file? e.g. songs/17/vocals.wav
-                     folder = os.path.dirname(song.path)
-                     possible = os.path.join(folder, "lyrics_v1.json")
-                     if os.path.exists(possible):
-                         target_path = possible
-            
-            if target_path and os.path.exists(target_path):
-                 with open(target_path, 'r', encoding='utf-8') as f:
-                     lyrics_data = json.load(f)
-            
-            if lyrics_data:
-                return jsonify(lyrics_data)
-            else:
-                 # Return empty structure or error? Contract says return lyrics.
-                 # Let's return error 404 if really no lyrics.
-                return jsonify({'error': 'Lyrics file not found'}), 404
 
+            sidecar = os.path.join(os.path.dirname(song['path']), 'waveform.bin')
+            if not os.path.exists(sidecar):
+                return jsonify({'error': 'Waveform not available'}), 404
+
+            stems = read_waveform_sidecar(sidecar)
+            stem = request.args.get('stem', 'instrumental')
+            if stem not in stems:
+                stem = next(iter(stems))
+            info = stems[stem]
+
+            levels = sorted(info['levels'])
+            level = request.args.get('level', type=int)
+            # Default: coarsest level (smallest payload); otherwise the closest available
+            spp = levels[-1] if not level else min(levels, key=lambda l: abs(l - level))
+            peaks = info['levels'][spp]
+
+            if request.args.get('format') == 'bin':
+                return self.app.response_class(peaks.tobytes(), mimetype='application/octet-stream',
+                                               headers={'X-Samples-Per-Peak': str(spp), 'X-Sample-Rate': str(info['sample_rate'])})
+
+            return jsonify({
+                'stem': stem,
+                'stems': list(stems),
+                'sample_rate': info['sample_rate'],
+                'duration_ms': int(info['num_samples'] * 1000 / info['sample_rate']) if info['sample_rate'] else 0,
+                'loudness': info['loudness'],
+                'samples_per_peak': spp,
+                'levels': levels,
+                'peaks': peaks.ravel().tolist()
+            })
         except Exception as e:
             return jsonify({'error': str(e)}), 500
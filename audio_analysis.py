@@ -0,0 +1,322 @@
+import bisect
+import struct
+import numpy as np
+
+# Sidecar de forma de onda: cabeçalho + níveis de picos por faixa (stem)
+WAVEFORM_MAGIC = b'KWAV'
+WAVEFORM_VERSION = 1
+PEAK_LEVELS = (256, 1024, 4096) # Amostras por pico (zoom aproximado -> visão geral)
+TARGET_LOUDNESS = -16.0 # Nível alvo (LUFS aproximado) para normalização no player
+
+
+class VoicedTimeline:
+    """
+    Mapeia o tempo do áudio "compactado" (apenas trechos com voz, concatenados)
+    de volta para a linha do tempo original da música.
+    """
+    def __init__(self, regions, pad_sec=0.0):
+        # regions: lista de (inicio_seg, fim_seg) na linha do tempo original
+        self.regions = list(regions)
+        self.pad_sec = pad_sec
+        self.packed_starts = []
+        pos = 0.0
+        for start, end in self.regions:
+            self.packed_starts.append(pos)
+            pos += (end - start) + pad_sec
+        self.packed_duration = pos
+
+    def to_original(self, t, is_end=False):
+        """
+        Converte um tempo (s) do áudio compactado para o tempo original.
+
+        Tempos caindo no silêncio de padding entre regiões vão para o início da
+        região seguinte (o que começa ali só soa depois dela); com is_end=True
+        são presos ao fim da região anterior.
+        """
+        if not self.regions or t is None:
+            return t
+        i = bisect.bisect_right(self.packed_starts, t) - 1
+        i = max(0, i)
+        start, end = self.regions[i]
+        mapped = start + (t - self.packed_starts[i])
+        if mapped <= end:
+            return mapped
+        if is_end or i + 1 >= len(self.regions):
+            return end
+        return self.regions[i + 1][0]
+
+
+def frame_rms(samples, frame_len, hop):
+    """RMS por frame (vetorizado, sem loop Python)."""
+    frames = _frames(samples, frame_len, hop)
+    return np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+
+
+def detect_voiced_regions(samples, sr, frame_ms=30, hop_ms=10, rel_db=-35.0,
+                          abs_floor_db=-55.0, min_region_sec=0.3, merge_gap_sec=0.8,
+                          pad_sec=0.25):
+    """
+    VAD simples por energia sobre os vocais separados pelo Demucs.
+
+    O limiar é relativo ao nível típico de canto (percentil 95 do RMS), o que
+    funciona bem porque o Demucs deixa as partes instrumentais quase em silêncio.
+    Retorna lista de (inicio_seg, fim_seg) ordenada e sem sobreposição.
+    """
+    frame_len = max(1, int(sr * frame_ms / 1000))
+    hop = max(1, int(sr * hop_ms / 1000))
+    rms = frame_rms(np.asarray(samples, dtype=np.float32), frame_len, hop)
+    if rms.size == 0:
+        return []
+
+    db = 20 * np.log10(rms + 1e-9)
+    ref_db = np.percentile(db, 95)
+    threshold = max(ref_db + rel_db, abs_floor_db)
+    voiced = db > threshold
+    if not voiced.any():
+        return []
+
+    # Bordas das regiões ativas (transições 0->1 e 1->0)
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * hop / sr
+    ends = (np.flatnonzero(edges == -1) * hop + frame_len) / sr
+    total = len(samples) / sr
+
+    # Margem de segurança para não cortar consoantes/respirações
+    starts = np.maximum(0.0, starts - pad_sec)
+    ends = np.minimum(total, ends + pad_sec)
+
+    regions = []
+    for s, e in zip(starts, ends):
+        if regions and s - regions[-1][1] <= merge_gap_sec:
+            regions[-1][1] = max(regions[-1][1], e)
+        else:
+            regions.append([s, e])
+
+    return [(float(s), float(e)) for s, e in regions if e - s >= min_region_sec]
+
+
+def pack_regions(samples, sr, regions, max_chunk_sec=240.0, gap_sec=0.5):
+    """
+    Agrupa as regiões com voz em lotes (chunks) de até max_chunk_sec,
+    concatenando os trechos com um pequeno silêncio entre eles.
+    Retorna lista de (audio_compactado, VoicedTimeline).
+    """
+    chunks = []
+    current = []
+    current_len = 0.0
+    for start, end in regions:
+        dur = end - start
+        if current and current_len + dur > max_chunk_sec:
+            chunks.append(current)
+            current, current_len = [], 0.0
+        current.append((start, end))
+        current_len += dur + gap_sec
+    if current:
+        chunks.append(current)
+
+    gap = np.zeros(int(sr * gap_sec), dtype=np.float32)
+    packed = []
+    for chunk_regions in chunks:
+        parts = []
+        for start, end in chunk_regions:
+            parts.append(samples[int(start * sr):int(end * sr)])
+            parts.append(gap)
+        packed.append((np.concatenate(parts).astype(np.float32), VoicedTimeline(chunk_regions, gap_sec)))
+    return packed
+
+
+def _frames(samples, frame_len, hop):
+    if len(samples) < frame_len:
+        samples = np.pad(samples, (0, frame_len - len(samples)))
+    n_frames = 1 + (len(samples) - frame_len) // hop
+    return np.lib.stride_tricks.as_strided(
+        samples,
+        shape=(n_frames, frame_len),
+        strides=(samples.strides[0] * hop, samples.strides[0])
+    )
+
+
+def estimate_pitch_frames(frames, sr, fmin=80.0, fmax=1000.0, voicing=0.5):
+    """
+    Estima f0 (Hz) de vários frames de uma vez via autocorrelação (FFT).
+    Retorna array com 0.0 nos frames sem voz.
+    """
+    frames = np.atleast_2d(frames).astype(np.float32)
+    frames = frames - frames.mean(axis=1, keepdims=True)
+    n = frames.shape[1]
+    spec = np.fft.rfft(frames, n=2 * n, axis=1)
+    acf = np.fft.irfft(spec * np.conj(spec), axis=1)[:, :n]
+
+    min_lag = max(1, int(sr / fmax))
+    max_lag = min(n - 1, int(sr / fmin))
+    energy = acf[:, 0] + 1e-9
+    # Normaliza pelo número de amostras sobrepostas para não favorecer lags curtos
+    overlap = (n - np.arange(min_lag, max_lag)) / n
+    norm = acf[:, min_lag:max_lag] / energy[:, None] / overlap
+    peak = norm.max(axis=1)
+    # Múltiplos do período têm picos quase iguais: escolhe o primeiro lag perto do máximo
+    # (evita erros de oitava para baixo)
+    near_peak = norm >= 0.9 * peak[:, None]
+    first = np.argmax(near_peak, axis=1)
+    lags = np.arange(norm.shape[1])
+    # Topo do primeiro pico: maior valor dentro do trecho contíguo acima do limiar
+    after = lags[None, :] > first[:, None]
+    run_end = np.where((~near_peak & after).any(axis=1), np.argmax(~near_peak & after, axis=1), norm.shape[1])
+    in_run = (lags[None, :] >= first[:, None]) & (lags[None, :] < run_end[:, None])
+    best = np.argmax(np.where(in_run, norm, -np.inf), axis=1)
+    rows = np.arange(len(best))
+    strength = norm[rows, best]
+
+    # Interpolação parabólica para precisão abaixo de 1 amostra
+    left = norm[rows, np.maximum(best - 1, 0)]
+    right = norm[rows, np.minimum(best + 1, norm.shape[1] - 1)]
+    denom = left - 2 * strength + right
+    valid = np.abs(denom) > 1e-9
+    shift = np.where(valid, 0.5 * (left - right) / np.where(valid, denom, 1.0), 0.0)
+
+    f0 = sr / (best + min_lag + np.clip(shift, -0.5, 0.5)).astype(np.float32)
+    f0[strength < voicing] = 0.0
+    return f0
+
+
+def hz_to_midi(f0):
+    """Converte Hz para nota MIDI (float). 0 Hz (sem voz) vira 0."""
+    f0 = np.asarray(f0, dtype=np.float32)
+    midi = np.zeros_like(f0)
+    voiced = f0 > 0
+    midi[voiced] = 69.0 + 12.0 * np.log2(f0[voiced] / 440.0)
+    return midi
+
+
+def extract_reference_contours(samples, sr, hop_ms=20, frame_ms=64, floor_db=-60.0):
+    """
+    Extrai os contornos de referência dos vocais separados:
+    - midi: altura (nota MIDI, float16; 0 = sem voz)
+    - energy: energia em dB relativa ao pico, quantizada em uint8 (0 = floor_db, 255 = 0 dB)
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    hop = max(1, int(sr * hop_ms / 1000))
+    frame_len = max(hop, int(sr * frame_ms / 1000))
+    frames = _frames(samples, frame_len, hop)
+
+    f0 = np.concatenate([
+        estimate_pitch_frames(frames[i:i + 2048], sr) for i in range(0, len(frames), 2048)
+    ]) if len(frames) else np.zeros(0, dtype=np.float32)
+
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    db = 20 * np.log10(rms / (rms.max() + 1e-9) + 1e-9)
+    energy = np.clip((db - floor_db) / -floor_db * 255, 0, 255).astype(np.uint8)
+    # Frames muito baixos não têm altura confiável
+    f0[energy < 40] = 0.0
+
+    return hz_to_midi(f0).astype(np.float16), energy, hop_ms
+
+
+def save_reference_contours(path, midi, energy, hop_ms):
+    np.savez_compressed(path, midi=midi, energy=energy, hop_ms=np.array(hop_ms, dtype=np.int32))
+
+
+class ReferenceContour:
+    """Contornos de referência carregados para consulta O(1) por tempo (ms)."""
+    def __init__(self, midi, energy, hop_ms):
+        self.midi = midi.astype(np.float32)
+        self.energy = energy
+        self.hop_ms = int(hop_ms)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['midi'], data['energy'], int(data['hop_ms']))
+
+    def at(self, time_ms):
+        """Retorna (midi, energia_uint8) no instante dado, ou (0, 0) fora da música."""
+        idx = int(time_ms) // self.hop_ms
+        if idx < 0 or idx >= len(self.midi):
+            return 0.0, 0
+        return float(self.midi[idx]), int(self.energy[idx])
+
+
+def compute_peaks(samples, samples_per_peak):
+    """
+    Picos (min, max) por bloco de samples_per_peak amostras, quantizados em int8.
+    Retorna array (n, 2) int8.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    n = len(samples) // samples_per_peak
+    if n == 0:
+        return np.zeros((0, 2), dtype=np.int8)
+    blocks = samples[:n * samples_per_peak].reshape(n, samples_per_peak)
+    peaks = np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1)
+    return np.clip(np.round(peaks * 127), -127, 127).astype(np.int8)
+
+
+def integrated_loudness(samples, sr, block_sec=0.4, overlap=0.75):
+    """
+    Loudness integrado com gating no estilo BS.1770 (blocos de 400ms,
+    gate absoluto -70 e relativo -10). Não aplica o filtro K, então o valor
+    é uma aproximação em LUFS — suficiente para igualar músicas entre si.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    block = int(sr * block_sec)
+    hop = max(1, int(block * (1 - overlap)))
+    if len(samples) < block:
+        return -70.0
+    ms = np.mean(_frames(samples, block, hop) ** 2, axis=1)
+    lufs = -0.691 + 10 * np.log10(ms + 1e-12)
+
+    gated = ms[lufs > -70.0]
+    if gated.size == 0:
+        return -70.0
+    relative = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+    gated = ms[lufs > max(-70.0, relative)]
+    return float(-0.691 + 10 * np.log10(gated.mean() + 1e-12))
+
+
+def loudness_gain(loudness, target=TARGET_LOUDNESS, min_gain=0.25, max_gain=4.0):
+    """Ganho linear para levar a faixa até o nível alvo."""
+    if loudness is None:
+        return 1.0
+    return float(np.clip(10 ** ((target - loudness) / 20.0), min_gain, max_gain))
+
+
+def write_waveform_sidecar(path, stems):
+    """
+    Grava o sidecar binário (little-endian):
+        'KWAV' u8 versão, u8 n_stems
+        por stem: 16s nome, u32 sample_rate, u32 n_amostras, f32 loudness, u8 n_níveis
+            por nível: u32 amostras_por_pico, u32 n_picos, n_picos * (i8 min, i8 max)
+    stems: {nome: (samples_mono_float, sample_rate)}
+    """
+    with open(path, 'wb') as f:
+        f.write(WAVEFORM_MAGIC + struct.pack('<BB', WAVEFORM_VERSION, len(stems)))
+        for name, (samples, sr) in stems.items():
+            loud = integrated_loudness(samples, sr)
+            f.write(struct.pack('<16sIIfB', name.encode('ascii')[:16], sr, len(samples), loud, len(PEAK_LEVELS)))
+            for spp in PEAK_LEVELS:
+                peaks = compute_peaks(samples, spp)
+                f.write(struct.pack('<II', spp, len(peaks)))
+                f.write(peaks.tobytes())
+
+
+def read_waveform_sidecar(path, with_peaks=True):
+    """
+    Lê o sidecar. Retorna {stem: {'sample_rate', 'num_samples', 'loudness', 'levels': {spp: array(n,2)}}}.
+    Com with_peaks=False apenas os cabeçalhos são lidos (os picos são pulados com seek).
+    """
+    result = {}
+    with open(path, 'rb') as f:
+        if f.read(4) != WAVEFORM_MAGIC:
+            raise ValueError(f"Sidecar inválido: {path}")
+        version, n_stems = struct.unpack('<BB', f.read(2))
+        header = struct.Struct('<16sIIfB')
+        for _ in range(n_stems):
+            name, sr, n_samples, loud, n_levels = header.unpack(f.read(header.size))
+            info = {'sample_rate': sr, 'num_samples': n_samples, 'loudness': loud, 'levels': {}}
+            for _ in range(n_levels):
+                spp, count = struct.unpack('<II', f.read(8))
+                if with_peaks:
+                    info['levels'][spp] = np.frombuffer(f.read(count * 2), dtype=np.int8).reshape(count, 2)
+                else:
+                    f.seek(count * 2, 1)
+            result[name.rstrip(b'\0').decode('ascii')] = info
+    return result
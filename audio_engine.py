@@ -0,0 +1,163 @@
+import threading
+import logging
+import numpy as np
+import pyaudio
+from stem_mixer import DualStemPlayer
+
+BLOCK_SIZES = (128, 256, 512, 1024) # Opções da tela de configuração
+MONITOR_MAX_MS = 100 # Retorno do mic acumulado além disso é descartado (latência limitada)
+
+
+class AudioEngine(DualStemPlayer):
+    """
+    Saída de áudio única (PyAudio em modo callback) para música e retorno dos mics.
+
+    Mesma interface do DualStemPlayer (load, play/seek, pause, set_vocal_level,
+    get_pos...), mas em vez de enfileirar blocos em um Channel do pygame, o
+    callback do stream mistura a cada bloco a faixa instrumental, a faixa
+    original (com o nível de vocais) e o áudio de monitoramento entregue pelo
+    Scorer (push_monitor). Um só stream no dispositivo, com bloco pequeno.
+
+    latency_ms é a latência de saída informada pelo PortAudio; get_pos a
+    desconta, então o relógio da música segue o que está saindo na caixa.
+    """
+    def __init__(self, pa, rate=44100, block=256, fade_ms=150):
+        super().__init__(fade_ms=fade_ms)
+        self.pa = pa # Instância PyAudio (a mesma do Scorer)
+        self.rate = rate
+        self.block = block
+        self.stream = None
+        self.out_channels = 2
+        self.latency_ms = 0.0
+
+        self.frames_played = 0 # Frames de música entregues ao dispositivo desde o play
+        self.underruns = 0
+
+        self.monitor_lock = threading.Lock()
+        self.monitor_buf = np.zeros(0, dtype=np.float32)
+        self.monitor_prefill = 0 # Tamanho da última entrega do Scorer
+        self.monitor_primed = False
+
+    def open(self, block=None):
+        """Abre o stream de saída. Retorna True se conseguiu."""
+        self.close()
+        if block:
+            self.block = block
+        for channels in (2, 1):
+            try:
+                self.stream = self.pa.open(
+                    format=pyaudio.paInt16,
+                    channels=channels,
+                    rate=self.rate,
+                    output=True,
+                    frames_per_buffer=self.block,
+                    stream_callback=self._callback
+                )
+                self.out_channels = channels
+                break
+            except Exception as e:
+                logging.warning(f"Motor de áudio: falha ao abrir saída ({channels}ch, {self.rate}Hz): {e}")
+        if self.stream is None:
+            return False
+
+        self.latency_ms = self.stream.get_output_latency() * 1000.0
+        logging.info(f"Motor de áudio: {self.out_channels}ch @ {self.rate}Hz, bloco {self.block}, latência {self.latency_ms:.1f} ms")
+        print(f"Motor de áudio: bloco {self.block} ({self.block * 1000.0 / self.rate:.1f} ms), latência de saída {self.latency_ms:.1f} ms")
+        self.stream.start_stream()
+        return True
+
+    def close(self):
+        if self.stream:
+            try:
+                self.stream.stop_stream()
+                self.stream.close()
+            except Exception:
+                pass
+            self.stream = None
+
+    def push_monitor(self, samples):
+        """
+        Áudio mono dos mics (int16) para o retorno nas caixas (chamado pelo
+        Scorer, que lê os mics no tamanho de bloco do motor).
+        """
+        max_frames = int(self.rate * MONITOR_MAX_MS / 1000)
+        with self.monitor_lock:
+            buf = np.concatenate((self.monitor_buf, samples.astype(np.float32)))
+            self.monitor_buf = buf[-max_frames:]
+            self.monitor_prefill = len(samples)
+
+    def _pull_monitor(self, count):
+        """
+        Próximos frames do retorno. Depois de esvaziar, só volta a tocar com
+        uma entrega inteira acumulada (pré-buffer): uma leitura do mic
+        atrasada vira um pouco mais de latência, não um buraco a cada bloco.
+        """
+        with self.monitor_lock:
+            if not self.monitor_primed:
+                # O que este callback consome + uma entrega de folga
+                if not len(self.monitor_buf) or len(self.monitor_buf) < count + self.monitor_prefill:
+                    return None
+                self.monitor_primed = True
+            out = self.monitor_buf[:count]
+            self.monitor_buf = self.monitor_buf[count:]
+            if not len(self.monitor_buf):
+                self.monitor_primed = False
+        return out
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paOutputUnderflow:
+            self.underruns += 1
+
+        out = np.zeros((frame_count, 2), dtype=np.float32)
+        if self.playing and not self.paused and self.stems:
+            pcm = self._mix_frames(frame_count)
+            if pcm is not None:
+                n = len(pcm)
+                out[:n] += pcm[:, :2] * self.volume
+                self.frames_played += n
+
+        mon = self._pull_monitor(frame_count)
+        if mon is not None:
+            out[:len(mon)] += mon[:, None]
+
+        if self.out_channels == 1:
+            out = out.mean(axis=1)
+        data = np.clip(out, -32768, 32767).astype(np.int16)
+        return (data.tobytes(), pyaudio.paContinue)
+
+    # --- Interface do DualStemPlayer (sem Channel do pygame) ---
+
+    def play(self, start_ms=0.0):
+        if not self.stems:
+            return
+        with self.lock:
+            self.next_frame = min(self.num_frames, int(start_ms * self.sample_rate / 1000.0))
+            self.vocal_level = self.target_level
+            self.frames_played = 0
+        self.paused = False
+        self.playing = True
+
+    seek = play
+
+    def pause(self):
+        if self.playing:
+            self.paused = True
+
+    def resume(self):
+        if self.playing:
+            self.paused = False
+
+    def stop(self):
+        self.playing = False
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def get_busy(self):
+        return self.playing and self.next_frame < self.num_frames
+
+    def get_pos(self):
+        """ms tocados desde o último play (já descontada a latência de saída), ou -1 parado."""
+        if not self.playing:
+            return -1
+        return max(0, int(self.frames_played * 1000 / self.sample_rate - self.latency_ms))
@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import wave
+import struct
+
+# Faixas do layout songs/<id>/ lido pelo player
+STEM_FILES = {
+    "instrumental": "instrumental.mp3",
+    "original": "original.mp3",
+}
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Tabelas do cabeçalho de frame MPEG (kbps / Hz)
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_BITRATES[(2, 3)] = _BITRATES[(2, 2)]
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+
+
+def _parse_frame_header(b):
+    """Decodifica os 4 bytes de um cabeçalho de frame MPEG. Retorna dict ou None se inválido."""
+    if len(b) < 4 or b[0] != 0xFF or (b[1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (b[1] >> 3) & 0x3
+    layer_bits = (b[1] >> 1) & 0x3
+    bitrate_idx = b[2] >> 4
+    sr_idx = (b[2] >> 2) & 0x3
+    if version_bits == 1 or layer_bits == 0 or bitrate_idx in (0, 15) or sr_idx == 3:
+        return None # Reservado / livre (não suportado)
+
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][sr_idx]
+    padding = (b[2] >> 1) & 0x1
+    channels = 1 if (b[3] >> 6) == 3 else 2
+
+    if layer == 1:
+        samples = 384
+        frame_len = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or version == 1) else 576
+        frame_len = samples // 8 * bitrate // sample_rate + padding
+
+    return {'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+            'channels': channels, 'samples': samples, 'frame_len': frame_len}
+
+
+def _id3v2_size(head):
+    """Tamanho total da tag ID3v2 no início do arquivo (0 se não houver)."""
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def probe_mp3(path):
+    """
+    Duração e formato de um MP3 lendo só os cabeçalhos: tag ID3v2, primeiro
+    frame e o cabeçalho Xing/Info (LAME) ou VBRI com o total de frames.
+    Sem esses cabeçalhos, assume CBR pelo tamanho do arquivo.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start = _id3v2_size(f.read(10))
+        f.seek(start)
+        buf = f.read(64 * 1024)
+
+        # Primeiro frame válido (confirmado pelo frame seguinte quando possível)
+        info = None
+        pos = 0
+        while pos < len(buf) - 4:
+            if buf[pos] == 0xFF:
+                hdr = _parse_frame_header(buf[pos:pos + 4])
+                if hdr:
+                    nxt = pos + hdr['frame_len']
+                    if nxt + 4 > len(buf) or _parse_frame_header(buf[nxt:nxt + 4]):
+                        info = hdr
+                        break
+            pos += 1
+        if info is None:
+            raise ValueError("Nenhum frame MPEG válido encontrado")
+
+        audio_start = start + pos
+        frame = buf[pos:pos + info['frame_len']]
+
+        f.seek(-128, os.SEEK_END)
+        has_id3v1 = f.read(3) == b"TAG"
+
+    # Cabeçalho Xing/Info logo após o side info
+    if info['version'] == 1:
+        side = 17 if info['channels'] == 1 else 32
+    else:
+        side = 9 if info['channels'] == 1 else 17
+    num_frames = None
+    xing = frame[4 + side:4 + side + 12]
+    if xing[:4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", xing[4:8])[0]
+        if flags & 0x1:
+            num_frames = struct.unpack(">I", xing[8:12])[0]
+    elif frame[36:40] == b"VBRI":
+        num_frames = struct.unpack(">I", frame[50:54])[0]
+
+    if num_frames:
+        # Frame do cabeçalho Xing não contém áudio
+        duration_ms = num_frames * info['samples'] * 1000.0 / info['sample_rate']
+    else:
+        audio_bytes = size - audio_start - (128 if has_id3v1 else 0)
+        duration_ms = audio_bytes * 8 * 1000.0 / info['bitrate']
+
+    return {'duration_ms': int(round(duration_ms)), 'sample_rate': info['sample_rate'],
+            'channels': info['channels'], 'size': size}
+
+
+def probe_wav(path):
+    with wave.open(path, "rb") as w:
+        rate = w.getframerate()
+        return {'duration_ms': int(round(w.getnframes() * 1000.0 / rate)), 'sample_rate': rate,
+                'channels': w.getnchannels(), 'size': os.path.getsize(path)}
+
+
+def probe_audio(path):
+    """Duração (ms), taxa de amostragem, canais e tamanho de um arquivo de áudio, sem decodificar."""
+    with open(path, "rb") as f:
+        head = f.read(12)
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return probe_wav(path)
+    return probe_mp3(path)
+
+
+def build_manifest(stem_paths):
+    """Manifest das faixas: {nome: caminho}. Faixas ausentes são ignoradas."""
+    stems = {}
+    for name, path in stem_paths.items():
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            stems[name] = dict(probe_audio(path), file=STEM_FILES.get(name, os.path.basename(path)))
+        except (OSError, ValueError, EOFError, wave.Error) as e:
+            print(f"Aviso: não foi possível ler o cabeçalho de {path}: {e}")
+    return {'version': MANIFEST_VERSION, 'stems': stems}
+
+
+def write_manifest(path, manifest):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def read_manifest(song_path):
+    """Lê songs/<id>/manifest.json. Retorna None se não existe ou está corrompido."""
+    try:
+        with open(os.path.join(song_path, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest if manifest.get('version') == MANIFEST_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def _is_current(manifest, song_path):
+    """Manifest confere com os arquivos (mesmas faixas, mesmos tamanhos)?"""
+    if not manifest:
+        return False
+    for name, fname in STEM_FILES.items():
+        path = os.path.join(song_path, fname)
+        entry = manifest['stems'].get(name)
+        if os.path.exists(path) != (entry is not None):
+            return False
+        if entry and os.path.getsize(path) != entry.get('size'):
+            return False
+    return True
+
+
+def ensure_manifest(song_path):
+    """
+    Garante um manifest atualizado para songs/<id>/ (backfill da biblioteca).
+    Retorna (manifest, gerado_agora).
+    """
+    manifest = read_manifest(song_path)
+    if _is_current(manifest, song_path):
+        return manifest, False
+    manifest = build_manifest({name: os.path.join(song_path, fname) for name, fname in STEM_FILES.items()})
+    write_manifest(os.path.join(song_path, MANIFEST_NAME), manifest)
+    return manifest, True
+
+
+def backfill(songs_dir="songs"):
+    """Gera/atualiza o manifest de todas as músicas. Retorna quantos foram (re)gerados."""
+    count = 0
+    if not os.path.isdir(songs_dir):
+        return 0
+    for item in sorted(os.listdir(songs_dir)):
+        song_path = os.path.join(songs_dir, item)
+        if not os.path.isdir(song_path) or not item.isdigit():
+            continue
+        try:
+            _, created = ensure_manifest(song_path)
+            count += created
+        except OSError as e:
+            print(f"Erro no manifest de {song_path}: {e}")
+    return count
+
+
+if __name__ == "__main__":
+    songs_dir = sys.argv[1] if len(sys.argv) > 1 else "songs"
+    print(f"Manifests gerados/atualizados: {backfill(songs_dir)}")
@@ -0,0 +1,415 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import collections
+import numpy as np
+import pygame
+
+MB = 1024 * 1024
+CACHE_DIR = os.path.join("backgrounds", ".cache")
+CACHE_MAX_BYTES = 256 * MB # Derivados em JPEG: ~0.2 MB em 1024x768, ~1-2 MB em 4K
+
+
+def cover_scale(image, size):
+    """
+    Redimensiona a imagem para cobrir 'size' inteiro (modo "cover"),
+    com crop centralizado. Retorna uma Surface opaca do tamanho exato,
+    ainda sem convert() (pode rodar fora da thread principal).
+    """
+    w, h = size
+    img_w, img_h = image.get_size()
+    scale = max(w / img_w, h / img_h)
+    new_size = (max(w, int(img_w * scale)), max(h, int(img_h * scale)))
+    scaled = pygame.transform.smoothscale(image, new_size)
+
+    surf = pygame.Surface((w, h))
+    surf.blit(scaled, ((w - new_size[0]) // 2, (h - new_size[1]) // 2))
+    return surf
+
+
+def load_cover(path, size):
+    """Decodifica e aplica cover_scale (síncrono)."""
+    return cover_scale(pygame.image.load(path), size)
+
+
+GRADIENT_KINDS = ("vertical", "diagonal", "radial")
+_last_gradient = (None, None) # (chave, Surface) do gradiente atual: redraw/resize da mesma música
+
+
+def gradient_array(size, stops, kind="vertical"):
+    """
+    Gradiente como array (w, h, 3) uint8, calculado de uma vez com numpy.
+
+    stops: cores (r, g, b) igualmente espaçadas (2 ou mais).
+    kind: "vertical" (cima -> baixo), "diagonal" (canto superior esquerdo ->
+    inferior direito) ou "radial" (centro -> cantos).
+    """
+    w, h = size
+    stops = np.asarray(stops, dtype=np.float32)
+    positions = np.linspace(0.0, 1.0, len(stops))
+
+    if kind == "diagonal":
+        t = (np.arange(w, dtype=np.float32)[:, None] / w + np.arange(h, dtype=np.float32)[None, :] / h) * 0.5
+    elif kind == "radial":
+        dx = np.arange(w, dtype=np.float32)[:, None] - w / 2.0
+        dy = np.arange(h, dtype=np.float32)[None, :] - h / 2.0
+        t = np.sqrt(dx * dx + dy * dy) / np.hypot(w / 2.0, h / 2.0)
+    else:
+        # Só depende da linha: calcula uma coluna e replica
+        t = (np.arange(h, dtype=np.float32) / h)[None, :]
+
+    # Tabela de cores (LUT) + índice: evita interpolar 3 canais em cada pixel
+    levels = 1024
+    lut_t = np.linspace(0.0, 1.0, levels)
+    lut = np.stack([np.interp(lut_t, positions, stops[:, c]) for c in range(3)], axis=1)
+    lut = np.clip(lut, 0, 255).astype(np.uint8)
+    idx = np.minimum((t * (levels - 1) + 0.5).astype(np.int32), levels - 1)
+    return np.broadcast_to(lut[idx], (w, h, 3))
+
+
+def render_gradient(size, stops, kind="vertical"):
+    """
+    Surface do gradiente (sem convert). Só o último fica em cache: as cores
+    são sorteadas por música, então outro gradiente nunca se repete.
+    """
+    global _last_gradient
+    key = (tuple(size), tuple(tuple(int(v) for v in c) for c in stops), kind)
+    if _last_gradient[0] == key:
+        return _last_gradient[1]
+    if kind == "vertical":
+        # Uma coluna de 1 pixel esticada na horizontal (sem interpolação: exato)
+        column = pygame.Surface((1, size[1]))
+        pygame.surfarray.blit_array(column, gradient_array((1, size[1]), stops, kind))
+        surf = pygame.transform.scale(column, size)
+    else:
+        # Gradiente 2D é suave: calcula em 1/4 da resolução e amplia (bilinear)
+        w, h = size
+        small_size = (max(2, w // 4), max(2, h // 4))
+        small = pygame.Surface(small_size)
+        pygame.surfarray.blit_array(small, gradient_array(small_size, stops, kind))
+        surf = pygame.transform.smoothscale(small, size)
+    _last_gradient = (key, surf)
+    return surf
+
+
+class DerivativeCache:
+    """
+    Cache em disco de fundos já em "cover" no tamanho da tela.
+
+    Derivados ficam em backgrounds/.cache/ em JPEG (opacos, só para
+    exibição), com nome pela imagem + hash do caminho de origem
+    (a/x.png e b/x.jpg não se sobrescrevem). O manifest.json guarda, por
+    derivado, a origem e o mtime/tamanho dela (origem mudou: refaz), o
+    tamanho em disco e o último uso. O total é limitado a max_bytes (LRU),
+    e derivados de outras resoluções são removidos a cada build.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.building = False
+        self.pending = None # Último pedido de build recebido durante um build
+        self.reload()
+
+    def reload(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        with self.lock:
+            self.entries = entries
+
+    def _save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    @staticmethod
+    def _signature(src):
+        st = os.stat(src)
+        return {"mtime": st.st_mtime, "size": st.st_size}
+
+    def _name(self, src, size):
+        base = os.path.splitext(os.path.basename(src))[0]
+        digest = hashlib.sha1(os.path.normpath(src).encode("utf-8")).hexdigest()[:10]
+        # Fundos são opacos e só para exibição: JPEG (~10x menor que PNG nessas imagens).
+        # Sem SDL_image só há BMP (o limite de bytes ainda vale)
+        fmt = "jpg" if pygame.image.get_extended() else "bmp"
+        return f"{base}_{digest}_{size[0]}x{size[1]}.{fmt}"
+
+    def lookup(self, src, size):
+        """Caminho do derivado válido para (origem, tamanho), ou None."""
+        name = self._name(src, size)
+        with self.lock:
+            entry = self.entries.get(name)
+        if not entry or entry.get("source") != src:
+            return None
+        try:
+            if self._signature(src) != {"mtime": entry["mtime"], "size": entry["size"]}:
+                return None
+        except OSError:
+            return None
+        path = os.path.join(self.cache_dir, name)
+        if not os.path.exists(path):
+            return None
+        entry["last_used"] = time.time() # Gravado no manifest no próximo build
+        return path
+
+    def count(self, size):
+        with self.lock:
+            return sum(1 for e in self.entries.values() if (e.get("width"), e.get("height")) == tuple(size))
+
+    def total_bytes(self):
+        with self.lock:
+            return sum(e.get("bytes", 0) for e in self.entries.values())
+
+    def load(self, src, size):
+        """Fundo no tamanho exato: derivado em disco se válido, senão decodifica a origem."""
+        path = self.lookup(src, size)
+        if path:
+            try:
+                surf = pygame.image.load(path)
+                if surf.get_size() == tuple(size):
+                    return surf
+            except pygame.error:
+                pass
+        return load_cover(src, size)
+
+    def build(self, sources, sizes, log=print):
+        """
+        Gera os derivados que faltam ou estão desatualizados e remove os de
+        outras resoluções. Retorna quantos foram gerados.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        sizes = [tuple(size) for size in sizes]
+        built = 0
+        for src in sources:
+            if self.pending:
+                break # Resolução mudou de novo: o build mais novo assume
+            image = None
+            for size in sizes:
+                if self.lookup(src, size):
+                    continue
+                try:
+                    sig = self._signature(src)
+                    if image is None:
+                        image = pygame.image.load(src)
+                    name = self._name(src, size)
+                    path = os.path.join(self.cache_dir, name)
+                    root, ext = os.path.splitext(path)
+                    tmp = root + ".tmp" + ext # Extensão define o formato
+                    pygame.image.save(cover_scale(image, size), tmp)
+                    os.replace(tmp, path)
+                    nbytes = os.path.getsize(path)
+                except (OSError, pygame.error) as e:
+                    log(f"Erro ao gerar derivado de {src}: {e}")
+                    continue
+                with self.lock:
+                    self.entries[name] = dict(sig, source=src, width=size[0], height=size[1],
+                                              bytes=nbytes, last_used=time.time())
+                    self._evict(keep=name)
+                    self._save()
+                built += 1
+        self.prune(sources, sizes)
+        return built
+
+    def _remove(self, name):
+        """Remove um derivado (chamar com o lock)."""
+        self.entries.pop(name, None)
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+    def _evict(self, keep=None):
+        """Remove os derivados usados há mais tempo até caber em max_bytes (chamar com o lock)."""
+        total = sum(e.get("bytes", 0) for e in self.entries.values())
+        for name in sorted(self.entries, key=lambda n: self.entries[n].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self.entries[name].get("bytes", 0)
+            self._remove(name)
+
+    def prune(self, sources, sizes=None):
+        """Remove derivados cuja origem não existe mais, de outras resoluções ou em formato antigo."""
+        sources = set(sources)
+        sizes = {tuple(size) for size in sizes} if sizes is not None else None
+        with self.lock:
+            stale = []
+            for name, e in self.entries.items():
+                size = (e.get("width"), e.get("height"))
+                if (e.get("source") not in sources or (sizes is not None and size not in sizes)
+                        or name != self._name(e.get("source", ""), size)):
+                    stale.append(name)
+            for name in stale:
+                self._remove(name)
+            self._save()
+
+    def build_async(self, sources, sizes, log=print):
+        """
+        Roda build() em uma thread (startup, resize, atualização da biblioteca).
+        Pedidos durante um build substituem o pendente e rodam em seguida
+        (ex.: só a última resolução de um redimensionamento).
+        """
+        with self.lock:
+            if self.building:
+                self.pending = (list(sources), list(sizes))
+                return False
+            self.building = True
+
+        def run():
+            args = (sources, sizes)
+            while True:
+                try:
+                    built = self.build(args[0], args[1], log)
+                    if built:
+                        log(f"Fundos: {built} derivados gerados em {self.cache_dir}")
+                except Exception as e:
+                    log(f"Erro ao gerar derivados de fundo: {e}")
+                with self.lock:
+                    args, self.pending = self.pending, None
+                    if not args:
+                        self.building = False
+                        return
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+class BackgroundLoader:
+    """
+    Serviço de fundos: decodifica e redimensiona os próximos fundos em uma
+    thread de trabalho, na resolução atual da janela.
+
+    - Mantém um pool pequeno de fundos prontos (pool_size), com limite de
+      memória (max_bytes); os mais antigos são descartados primeiro.
+    - Mudou a resolução: o pool é descartado e refeito no novo tamanho.
+    - take() entrega (caminho, Surface) sem bloquear; o convert() fica para
+      a thread principal (depende do display).
+    """
+    def __init__(self, pool_size=2, max_bytes=128 * MB, loader=load_cover):
+        self.pool_size = pool_size
+        self.max_bytes = max_bytes
+        self.loader = loader
+
+        self.cond = threading.Condition()
+        self.sources = []
+        self.target = None
+        self.ready = collections.OrderedDict() # caminho -> Surface no tamanho target
+        self.last_taken = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def set_sources(self, paths):
+        with self.cond:
+            self.sources = list(paths)
+            for path in list(self.ready):
+                if path not in self.sources:
+                    del self.ready[path]
+            self.cond.notify_all()
+
+    def set_target(self, size):
+        """Resolução alvo. Fundos prontos em outro tamanho são descartados."""
+        size = tuple(size)
+        with self.cond:
+            if size != self.target:
+                self.target = size
+                self.ready.clear()
+                self.cond.notify_all()
+
+    def take(self):
+        """Retorna (caminho, Surface) pronto para a resolução atual, ou None."""
+        with self.cond:
+            if not self.ready:
+                return None
+            path, surf = self.ready.popitem(last=False)
+            self.last_taken = path
+            self.cond.notify_all() # Repõe o pool
+            return path, surf
+
+    def _memory_used(self):
+        return sum(s.get_width() * s.get_height() * s.get_bytesize() for s in self.ready.values())
+
+    def _pool_full(self):
+        if len(self.ready) >= self.pool_size:
+            return True
+        w, h = self.target
+        # Não prepara outro se ele não caberia no limite de memória (evita preparar e descartar em loop)
+        return bool(self.ready) and self._memory_used() + w * h * 4 > self.max_bytes
+
+    def _pick_next(self):
+        """Escolhe uma imagem ainda não preparada (evita repetir a última usada)."""
+        candidates = [p for p in self.sources if p not in self.ready and p != self.last_taken]
+        if not candidates:
+            candidates = [p for p in self.sources if p not in self.ready]
+        return random.choice(candidates) if candidates else None
+
+    def _worker_loop(self):
+        while True:
+            with self.cond:
+                while self.running and (self.target is None or self._pool_full()
+                                        or self._pick_next() is None):
+                    self.cond.wait()
+                if not self.running:
+                    return
+                path = self._pick_next()
+                target = self.target
+
+            try:
+                surf = self.loader(path, target)
+            except Exception as e:
+                print(f"Erro ao preparar fundo {path}: {e}")
+                with self.cond:
+                    if path in self.sources:
+                        self.sources.remove(path) # Não tenta de novo a cada ciclo
+                continue
+
+            with self.cond:
+                if target != self.target:
+                    continue # Resolução mudou durante o trabalho
+                self.ready[path] = surf
+                while len(self.ready) > 1 and self._memory_used() > self.max_bytes:
+                    self.ready.popitem(last=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera derivados dos fundos nas resoluções de exibição")
+    parser.add_argument("sizes", nargs="+", help="Resoluções, ex.: 1920x1080 3840x2160")
+    parser.add_argument("--src", default="backgrounds", help="Pasta das imagens originais")
+    args = parser.parse_args(argv)
+
+    sizes = [tuple(int(v) for v in s.lower().split("x")) for s in args.sizes]
+    valid_ext = ('.jpg', '.jpeg', '.png', '.bmp')
+    sources = [os.path.join(args.src, f) for f in sorted(os.listdir(args.src))
+               if os.path.splitext(f)[1].lower() in valid_ext]
+    cache = DerivativeCache(os.path.join(args.src, ".cache"))
+    built = cache.build(sources, sizes)
+    print(f"{built} derivados gerados ({len(sources)} imagens x {len(sizes)} resoluções)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,279 @@
+"""
+Benchmark de renderização do player, sem monitor, áudio ou microfones.
+
+Roda o KaraokePlayer em modo headless (drivers 'dummy' do SDL), com um
+scorer simulado e relógio falso, avançando a letra em passos fixos de
+1/60 s. Para cada cenário (letra densa, linhas LRC longas, 1080p/4K e
+cada opção do HUD) mede o tempo de frame (eventos + update + draw) e as
+alocações por frame (tracemalloc).
+
+Uso:
+    python benchmark_player.py
+    python benchmark_player.py --seconds 20 --only dense_1080p,dense_4k
+    python benchmark_player.py --song 1234   (letra real: ID da música ou caminho do arquivo)
+    python benchmark_player.py --save base.json
+    python benchmark_player.py --compare base.json   (sai com 1 se o p95 piorar)
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+from lyrics_timeline import find_lyrics_files, load_lyrics
+
+STEP_MS = 1000.0 / 60
+
+# Cenários: letra, resolução e opções do HUD (atributos do player)
+SCENARIOS = [
+    ("dense_768p", "dense", (1024, 768), {}),
+    ("dense_1080p", "dense", (1920, 1080), {}),
+    ("dense_4k", "dense", (3840, 2160), {}),
+    ("lrc_long_1080p", "lrc_long", (1920, 1080), {}),
+    ("lrc_long_4k", "lrc_long", (3840, 2160), {}),
+    ("no_rhythm_1080p", "dense", (1920, 1080), {"show_rhythm_indicator": False}),
+    ("help_1080p", "dense", (1920, 1080), {"show_help": True}),
+    ("gradient_1080p", "dense", (1920, 1080), {"cfg_bg_mode": "GRADIENTE"}),
+    ("full_redraw_1080p", "dense", (1920, 1080), {"cfg_dirty_rects": False}),
+    ("outline4_1080p", "dense", (1920, 1080), {"cfg_outline_width": 4}),
+]
+
+
+class FakeTimer:
+    """Relógio controlado pelo benchmark (segundos), usado pelo PlaybackClock."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BenchScorer:
+    """Scorer simulado: sem PyAudio, com volume de mic sintético para o VU e o indicador de ritmo."""
+    def __init__(self, timer):
+        self.timer = timer
+        self.p = None
+        self.paused = True
+
+    @property
+    def current_volume_mic1(self):
+        return 0.0 if self.paused else 12.0 + 10.0 * math.sin(self.timer.now * 7.0)
+
+    @property
+    def current_volume_mic2(self):
+        return 0.0
+
+    def get_input_devices(self): return []
+    def set_config(self, *args): pass
+    def set_clock(self, clock): pass
+    def set_monitor_sink(self, sink): pass
+    def set_reference(self, reference): pass
+    def set_singing_segment(self, is_active): pass
+    def set_paused(self, paused): self.paused = paused
+    def get_current_accuracy(self): return 0.5 + 0.5 * math.sin(self.timer.now)
+    def get_score(self): return 0
+    def get_loop_stats(self): return 0.0, 0.0, 0
+    def reset(self): pass
+    def start(self): pass
+    def stop_streams(self): pass
+    def shutdown(self): pass
+
+
+def write_dense_lyrics(path, seconds):
+    """Letra sincronizada por palavra, densa: ~4 palavras/s, linhas de 10 palavras."""
+    lines = []
+    t = 1.0
+    li = 0
+    while t < seconds:
+        words = []
+        for wi in range(10):
+            text = f"pala{li % 7}vra{wi}"
+            words.append({"display": text, "text": text, "start": t, "end": t + 0.2})
+            t += 0.25
+        lines.append({"start": words[0]["start"], "end": words[-1]["end"],
+                      "text": " ".join(w["display"] for w in words), "words": words})
+        t += 0.5 if li % 4 else 3.0
+        li += 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"lines": lines}, f)
+
+
+def write_long_lrc(path, seconds):
+    """LRC de linha inteira com linhas longas (quebradas em várias linhas na tela)."""
+    with open(path, "w", encoding="utf-8") as f:
+        t = 1.0
+        i = 0
+        while t < seconds:
+            text = " ".join(f"palavra{i}_{k}" for k in range(18))
+            f.write(f"[{int(t // 60):02d}:{t % 60:05.2f}]{text}\n")
+            t += 3.5
+            i += 1
+
+
+def resolve_song_lyrics(player, song):
+    """
+    Arquivo de letra de uma música real: caminho de arquivo, pasta songs/<id>
+    ou ID da biblioteca (mesma prioridade do player: v1 -> v2 -> lrc).
+    Retorna (caminho, título) ou (None, None).
+    """
+    if os.path.isfile(song):
+        return song, os.path.basename(song)
+    title = song
+    base = song if os.path.isdir(song) else os.path.join("songs", song)
+    data = player.library.get_song(song) if not os.path.isdir(song) else None
+    if data:
+        base = data['base_path']
+        title = f"{data['title']} - {data['artist']}"
+    files = find_lyrics_files(base)
+    return (files[0]['path'], title) if files else (None, None)
+
+
+def lyrics_duration(path):
+    """Fim da última linha (s) + 2 s de folga."""
+    lyrics = load_lyrics(path)
+    return (max(lyrics.line_end) / 1000.0 + 2.0) if len(lyrics) else 0.0
+
+
+def run_scenario(player, timer, lyrics_path, size, options, seconds, alloc_frames, title="Benchmark"):
+    import pygame
+
+    player.resize(*size)
+    defaults = {attr: getattr(player, attr) for attr in options}
+    for attr, value in options.items():
+        setattr(player, attr, value)
+    if "cfg_bg_mode" in options:
+        player.load_random_background()
+
+    player.current_song = {"id": 0, "title": title, "artist": "Headless", "base_path": ""}
+    player.set_lyrics(player.parse_lrc(lyrics_path))
+    player.total_duration = seconds * 1000
+    player.page_index = 0
+    player.paused = False
+    player.state = "PLAYING"
+    player.force_full_redraw = True
+    player.scorer.set_paused(False)
+
+    def frame(i):
+        timer.now = i * STEP_MS / 1000.0
+        t0 = time.perf_counter()
+        pygame.event.get()
+        player.update()
+        player.draw()
+        return (time.perf_counter() - t0) * 1000
+
+    timer.now = 0.0
+    player.playback_clock.start(0)
+    total = int(seconds * 1000 / STEP_MS) - 1
+    times = np.array([frame(i) for i in range(total)])
+
+    # Segunda passada (trecho inicial) só para alocações: tracemalloc deixa tudo mais lento
+    timer.now = 0.0
+    player.playback_clock.start(0)
+    player.force_full_redraw = True
+    peaks = []
+    tracemalloc.start()
+    base_mem = tracemalloc.get_traced_memory()[0]
+    for i in range(min(alloc_frames, total)):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        frame(i)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - base_mem
+    tracemalloc.stop()
+
+    player.state = "MENU"
+    for attr, value in defaults.items():
+        setattr(player, attr, value)
+    if "cfg_bg_mode" in options:
+        player.load_random_background()
+
+    return {
+        "frames": len(times),
+        "mean_ms": float(times.mean()),
+        "p50_ms": float(np.percentile(times, 50)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "max_ms": float(times.max()),
+        "alloc_kb_frame": float(np.mean(peaks) / 1024) if peaks else 0.0,
+        "alloc_kb_max": float(np.max(peaks) / 1024) if peaks else 0.0,
+        "retained_kb": retained / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless de renderização do player")
+    parser.add_argument("--seconds", type=float, default=None,
+                        help="Duração por cenário (padrão: 30 s simulados, ou a letra inteira com --song)")
+    parser.add_argument("--song", help="Reproduz a letra de uma música real (ID, pasta songs/<id> ou arquivo)")
+    parser.add_argument("--alloc-frames", type=int, default=300, help="Frames medidos com tracemalloc")
+    parser.add_argument("--only", help="Cenários separados por vírgula")
+    parser.add_argument("--save", help="Grava os resultados em JSON")
+    parser.add_argument("--compare", help="JSON de referência: falha se o p95 piorar além da tolerância")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Piora aceita no p95 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    from karaoke_player import KaraokePlayer
+    timer = FakeTimer()
+    player = KaraokePlayer(headless=True, scorer=BenchScorer(timer), start_api=False, timer=timer)
+    player.prefetcher.stop()
+    # Derivados de fundo sendo gerados em segundo plano distorcem os primeiros cenários
+    while player.bg_cache.building:
+        time.sleep(0.05)
+
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="karaoke_bench_") as tmp:
+        if args.song:
+            # Letra real em todos os cenários (os de LRC longo seriam repetidos)
+            path, title = resolve_song_lyrics(player, args.song)
+            if not path:
+                print(f"Letra não encontrada para {args.song}")
+                sys.exit(2)
+            seconds = args.seconds or lyrics_duration(path)
+            scenarios = [(name.replace("dense", "song") if "dense" in name else f"song_{name}", kind, size, options)
+                         for name, kind, size, options in SCENARIOS if kind == "dense"]
+            lyrics = {"dense": path}
+            print(f"Letra: {path} ({title}, {seconds:.0f} s)")
+        else:
+            title = "Benchmark"
+            seconds = args.seconds or 30
+            scenarios = SCENARIOS
+            lyrics = {"dense": os.path.join(tmp, "dense.json"), "lrc_long": os.path.join(tmp, "long.lrc")}
+            write_dense_lyrics(lyrics["dense"], seconds)
+            write_long_lrc(lyrics["lrc_long"], seconds)
+
+        print(f"{'cenário':<20}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'KB/frame':>10}{'retido KB':>11}")
+        for name, kind, size, options in scenarios:
+            if only and name not in only:
+                continue
+            r = run_scenario(player, timer, lyrics[kind], size, options, seconds, args.alloc_frames, title)
+            results[name] = r
+            print(f"{name:<20}{r['p50_ms']:>8.2f}{r['p95_ms']:>8.2f}{r['p99_ms']:>8.2f}{r['max_ms']:>8.2f}"
+                  f"{r['alloc_kb_frame']:>10.1f}{r['retained_kb']:>11.1f}")
+
+    player.bg_loader.stop()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados gravados em {args.save}")
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        for name, r in results.items():
+            ref = base.get(name)
+            if ref and r["p95_ms"] > ref["p95_ms"] * (1 + args.tolerance):
+                print(f"REGRESSÃO {name}: p95 {ref['p95_ms']:.2f} -> {r['p95_ms']:.2f} ms")
+                status = 1
+        if not status:
+            print("Sem regressões de p95.")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
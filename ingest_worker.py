@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import socket
+import argparse
+import threading
+import importlib
+
+# Nome dos artefatos gerados pelo SongManager (flat, em song_dir) -> nome final em songs/<id>/
+# que é o layout lido pelo player (SongLibrary).
+ARTIFACT_NAMES = {
+    "{id}.mp3": "original.mp3",
+    "{id}_instrumental.mp3": "instrumental.mp3",
+    "{id}_lyrics.json": "lyrics_v1.json",
+    "{id}.lrc": "lyrics.lrc",
+    "{id}_reference.npz": "reference.npz",
+    "{id}_waveform.bin": "waveform.bin",
+    "{id}_manifest.json": "manifest.json",
+}
+
+
+class SharedJobQueue:
+    """
+    Fila de jobs de ingestão em um diretório compartilhado (NFS/SMB).
+
+    Estrutura:
+        pending/<job>.json   Jobs aguardando (ou em execução)
+        leases/<job>.lease   Lock exclusivo (O_EXCL) do worker que pegou o job.
+                             O mtime é o heartbeat; lease vencido = worker morto.
+        done/<job>.json      Jobs concluídos
+        failed/<job>.json    Jobs que esgotaram as tentativas
+        ids/<id>             Reserva de IDs de música entre todas as máquinas
+
+    Todas as transições usam operações atômicas do sistema de arquivos
+    (criação exclusiva e rename), sem servidor central.
+    """
+    def __init__(self, root, lease_sec=120, max_attempts=3):
+        self.root = root
+        self.lease_sec = lease_sec
+        self.max_attempts = max_attempts
+        for sub in ("pending", "leases", "done", "failed", "ids"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    def _path(self, sub, name):
+        return os.path.join(self.root, sub, name)
+
+    def _write_atomic(self, path, data):
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def reserve_song_id(self, songs_dir):
+        """Reserva um ID de 4 dígitos único em todas as máquinas."""
+        while True:
+            code = str(random.randint(1000, 9999))
+            if os.path.exists(os.path.join(songs_dir, code)):
+                continue
+            try:
+                fd = os.open(self._path("ids", code), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                return code
+            except FileExistsError:
+                continue
+
+    def enqueue(self, payload, songs_dir):
+        """Adiciona um job (dict com video_id/title/artist). Retorna o ID da música."""
+        job = dict(payload)
+        if not job.get("song_id"):
+            job["song_id"] = self.reserve_song_id(songs_dir)
+        job.setdefault("attempts", 0)
+        job_name = f"{int(time.time() * 1000)}_{job['song_id']}"
+        job["job"] = job_name
+        self._write_atomic(self._path("pending", f"{job_name}.json"), job)
+        return job["song_id"]
+
+    def claim(self, worker_id):
+        """Tenta pegar um job pendente. Retorna o dict do job ou None."""
+        self.reclaim_expired()
+        for fname in sorted(os.listdir(os.path.join(self.root, "pending"))):
+            if not fname.endswith(".json"):
+                continue
+            job_name = fname[:-5]
+            lease = self._path("leases", f"{job_name}.lease")
+            try:
+                fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(worker_id)
+
+            try:
+                with open(self._path("pending", fname), encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                # Job concluído por outro worker entre o listdir e o lock
+                self._drop_lease(job_name)
+                continue
+
+            if job.get("attempts", 0) >= self.max_attempts:
+                # Todas as tentativas já foram pegas e nenhuma terminou (worker morto pelo
+                # OOM killer, lease reclamado): desiste em vez de derrubar outro worker
+                self._move_to_failed(dict(job, last_error=job.get("last_error") or
+                                          "Worker interrompido em todas as tentativas"))
+                continue
+
+            job["attempts"] = job.get("attempts", 0) + 1
+            self._write_atomic(self._path("pending", fname), job)
+            return job
+        return None
+
+    def heartbeat(self, job, worker_id):
+        """Renova o lease. Retorna False se o lease foi perdido (reclamado por outro)."""
+        lease = self._path("leases", f"{job['job']}.lease")
+        try:
+            with open(lease, encoding="utf-8") as f:
+                if f.read() != worker_id:
+                    return False
+            os.utime(lease, None)
+            return True
+        except OSError:
+            return False
+
+    def reclaim_expired(self):
+        """Libera leases sem heartbeat (worker morto) para que outro worker pegue o job."""
+        now = time.time()
+        for fname in os.listdir(os.path.join(self.root, "leases")):
+            if not fname.endswith(".lease"):
+                continue
+            lease = self._path("leases", fname)
+            try:
+                if now - os.path.getmtime(lease) < self.lease_sec:
+                    continue
+                # Rename atômico: só um worker consegue reclamar o mesmo lease
+                stale = f"{lease}.{uuid.uuid4().hex}.stale"
+                os.rename(lease, stale)
+                os.remove(stale)
+                print(f"Lease vencido reclamado: {fname}")
+            except OSError:
+                continue
+
+    def _drop_lease(self, job_name):
+        try:
+            os.remove(self._path("leases", f"{job_name}.lease"))
+        except OSError:
+            pass
+
+    def complete(self, job, result=None):
+        job = dict(job, result=result, finished_at=time.time())
+        self._write_atomic(self._path("done", f"{job['job']}.json"), job)
+        try:
+            os.remove(self._path("pending", f"{job['job']}.json"))
+        except OSError:
+            pass
+        self._drop_lease(job["job"])
+
+    def _move_to_failed(self, job):
+        self._write_atomic(self._path("failed", f"{job['job']}.json"), job)
+        try:
+            os.remove(self._path("pending", f"{job['job']}.json"))
+        except OSError:
+            pass
+        self._drop_lease(job["job"])
+
+    def fail(self, job, error):
+        """Devolve o job para a fila ou move para failed/ se esgotou as tentativas."""
+        if os.path.exists(self._path("done", f"{job['job']}.json")):
+            # Outro worker (após reclamar o lease) já concluiu: não ressuscita o job
+            self._drop_lease(job["job"])
+            return
+        job = dict(job, last_error=str(error))
+        if job.get("attempts", 0) >= self.max_attempts:
+            self._move_to_failed(job)
+        else:
+            self._write_atomic(self._path("pending", f"{job['job']}.json"), job)
+            self._drop_lease(job["job"])
+
+
+def commit_artifacts(staging_dir, song_id, songs_dir):
+    """
+    Move os artefatos gerados em staging para songs/<id> de forma atômica.
+    O diretório final só aparece completo (rename de diretório no mesmo FS).
+    Retorna False se outro worker já publicou a mesma música.
+    """
+    final_tmp = os.path.join(staging_dir, song_id)
+    os.makedirs(final_tmp, exist_ok=True)
+    for src_pattern, dst_name in ARTIFACT_NAMES.items():
+        src = os.path.join(staging_dir, src_pattern.format(id=song_id))
+        if os.path.exists(src):
+            shutil.move(src, os.path.join(final_tmp, dst_name))
+
+    target = os.path.join(songs_dir, song_id)
+    try:
+        os.rename(final_tmp, target)
+        return True
+    except OSError:
+        # Já existe (job reprocessado após reclamação de lease): mantém o publicado
+        return False
+
+
+def process_with_song_manager(job, staging_dir):
+    """Processador padrão: pipeline completo do SongManager dentro do diretório de staging."""
+    from song_manager import SongManager
+    manager = SongManager(song_dir=staging_dir, library_file=os.path.join(staging_dir, "library.json"))
+    code = manager.download_song(job["video_id"], job["title"], job["artist"], song_id=job["song_id"])
+    if not code:
+        raise RuntimeError("Download/Processamento falhou")
+    return code
+
+
+def load_processor(spec):
+    """Carrega o processador a partir de 'modulo:funcao'."""
+    module_name, func_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def run_worker(queue_dir, songs_dir, worker_id=None, process_fn=None, poll_sec=5.0,
+               lease_sec=120, exit_when_idle=False):
+    """
+    Loop de um worker headless: pega jobs da fila compartilhada, processa em
+    staging local ao songs_dir e publica o resultado em songs/<id>.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    process_fn = process_fn or process_with_song_manager
+    queue = SharedJobQueue(queue_dir, lease_sec=lease_sec)
+    staging_root = os.path.join(songs_dir, ".staging")
+    os.makedirs(staging_root, exist_ok=True)
+    print(f"Worker {worker_id} iniciado. Fila: {queue_dir}")
+
+    processed = 0
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            if exit_when_idle:
+                break
+            time.sleep(poll_sec)
+            continue
+
+        print(f"[{worker_id}] Processando {job['job']} ({job.get('title')})")
+        lost_lease = threading.Event()
+        stop_hb = threading.Event()
+
+        def beat():
+            while not stop_hb.wait(lease_sec / 3.0):
+                if not queue.heartbeat(job, worker_id):
+                    lost_lease.set()
+                    return
+
+        hb = threading.Thread(target=beat, daemon=True)
+        hb.start()
+
+        staging = os.path.join(staging_root, f"{job['song_id']}.{worker_id}")
+        try:
+            os.makedirs(staging, exist_ok=True)
+            result = process_fn(job, staging)
+            stop_hb.set()
+            if lost_lease.is_set():
+                print(f"[{worker_id}] Lease perdido para {job['job']}. Descartando resultado.")
+                continue
+            if not commit_artifacts(staging, job["song_id"], songs_dir):
+                print(f"[{worker_id}] Publicação de {job['job']} falhou.")
+                queue.fail(job, f"Não foi possível publicar songs/{job['song_id']}")
+                continue
+            queue.complete(job, result)
+            processed += 1
+            print(f"[{worker_id}] Concluído {job['job']}")
+        except Exception as e:
+            stop_hb.set()
+            print(f"[{worker_id}] Erro em {job['job']}: {e}")
+            if not lost_lease.is_set():
+                queue.fail(job, e)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    return processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker headless de ingestão (fila em diretório compartilhado)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    w = sub.add_parser("worker", help="Processa jobs da fila")
+    w.add_argument("--jobs", required=True, help="Diretório compartilhado da fila")
+    w.add_argument("--songs", default="songs", help="Diretório final das músicas")
+    w.add_argument("--id", default=None, help="Identificador do worker")
+    w.add_argument("--lease", type=int, default=120, help="Duração do lease em segundos")
+    w.add_argument("--process", default=None, help="Processador alternativo 'modulo:funcao'")
+    w.add_argument("--exit-when-idle", action="store_true")
+
+    e = sub.add_parser("enqueue", help="Adiciona um job à fila")
+    e.add_argument("--jobs", required=True)
+    e.add_argument("--songs", default="songs")
+    e.add_argument("video_id")
+    e.add_argument("title")
+    e.add_argument("artist")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "worker":
+        process_fn = load_processor(args.process) if args.process else None
+        run_worker(args.jobs, args.songs, args.id, process_fn, lease_sec=args.lease,
+                   exit_when_idle=args.exit_when_idle)
+    else:
+        queue = SharedJobQueue(args.jobs)
+        song_id = queue.enqueue({"video_id": args.video_id, "title": args.title, "artist": args.artist}, args.songs)
+        print(f"Job enfileirado. ID da música: {song_id}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,280 @@
+import time
+import threading
+import subprocess
+import collections
+
+# psutil é opcional: permite medir também os processos filhos (ex.: Demucs roda em subprocesso)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+# Custo estimado de memória por estágio do pipeline: (base_bytes, bytes_por_segundo_de_audio)
+# Valores medidos em CPU com músicas de 3-5 min; ajustados em tempo real pelo agendador.
+STAGE_MEMORY_COSTS = {
+    'download': (150 * MB, 0),
+    'demucs': (1200 * MB, 4 * MB),
+    'whisper': (900 * MB, 1 * MB),
+    'align': (1600 * MB, 3 * MB),   # Modelo Wav2Vec2 (~1.2 GB) + emissões
+}
+
+# Fator de correção por estágio: média móvel (EMA) do uso medido / estimado, limitada
+CORRECTION_MIN = 0.5
+CORRECTION_MAX = 3.0
+CORRECTION_ALPHA = 0.3
+OOM_CORRECTION_STEP = 1.5
+
+
+def estimate_stage_memory(stage, duration_sec):
+    """Estimativa de memória (bytes) de um estágio, escalada pela duração do áudio."""
+    base, per_sec = STAGE_MEMORY_COSTS.get(stage, (500 * MB, 0))
+    return int(base + per_sec * max(0.0, duration_sec or 0.0))
+
+
+def current_rss_bytes():
+    """RSS atual do processo (incluindo filhos quando psutil está disponível)."""
+    if psutil:
+        try:
+            proc = psutil.Process()
+            total = proc.memory_info().rss
+            for child in proc.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        except psutil.Error:
+            pass
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def is_oom_error(exc):
+    """Identifica falhas causadas por falta de memória (inclui subprocesso morto pelo OOM killer)."""
+    if isinstance(exc, MemoryError):
+        return True
+    if isinstance(exc, subprocess.CalledProcessError) and exc.returncode in (-9, 137):
+        return True
+    return 'out of memory' in str(exc).lower()
+
+
+class IngestJob:
+    """Um item de ingestão: função a executar + estado de tentativas."""
+    def __init__(self, job_id, fn, max_retries=2):
+        self.job_id = job_id
+        self.fn = fn
+        self.max_retries = max_retries
+        self.attempts = 0
+        self.oom = False
+        self.result = None
+        self.error = None
+
+
+class MemoryScheduler:
+    """
+    Controle de admissão de jobs de ingestão baseado em orçamento de memória.
+
+    - Cada estágio (download, demucs, whisper, align) reserva sua estimativa
+      antes de rodar; só é admitido se o RSS projetado ficar abaixo do teto.
+    - Uma thread monitora o RSS real: se ultrapassar a margem de segurança,
+      novas admissões são suspensas (back off) até a memória baixar.
+    - O pico de memória real de cada estágio é comparado com a estimativa e
+      o fator de correção do estágio acompanha essa razão (média móvel, sobe
+      e desce); jobs que falham por falta de memória
+      voltam para a fila.
+    - Um estágio que não cabe no teto nem rodando sozinho falha com
+      MemoryError (após idle_grace), em vez de esperar para sempre.
+    """
+    def __init__(self, ceiling_mb=6000, max_workers=4, safety=0.9, poll_interval=0.5, idle_grace=5.0, log=print):
+        self.ceiling = int(ceiling_mb * MB)
+        self.max_workers = max_workers
+        self.safety = safety
+        self.poll_interval = poll_interval
+        self.idle_grace = idle_grace # Espera máxima (s) de um estágio sozinho que não cabe no teto
+        self.log = log
+
+        self.cond = threading.Condition()
+        self.reserved = 0
+        self.active = {}  # token -> (stage, estimate, rss_no_inicio, correção_na_admissão)
+        self.peak_usage = {}  # token -> maior uso atribuído ao estágio (bytes)
+        self.corrections = collections.defaultdict(lambda: 1.0)
+        self.backoff = False
+        self.baseline = current_rss_bytes()
+        self.peak_rss = self.baseline
+
+        self.pending = collections.deque()
+        self.finished = []
+        self._busy_workers = 0
+        self._local = threading.local()
+        self.running = False
+        self.workers = []
+        self.monitor = None
+        self._next_token = 0
+
+    # --- Orçamento por estágio ---
+
+    def stage(self, name, duration_sec=0.0, job=None):
+        """Context manager que reserva memória para um estágio enquanto ele roda."""
+        if job is None:
+            job = getattr(self._local, 'job', None)
+        return _StageReservation(self, name, duration_sec, job)
+
+    def _acquire(self, stage, duration_sec):
+        correction = self.corrections[stage]
+        estimate = int(estimate_stage_memory(stage, duration_sec) * correction)
+        if estimate > self.ceiling * self.safety:
+            raise MemoryError(f"Estágio {stage} estimado em {estimate // MB} MB excede o teto configurado.")
+
+        with self.cond:
+            idle_since = None
+            while True:
+                rss = current_rss_bytes()
+                # Projeção conservadora: o maior entre o RSS medido e o reservado
+                projected = max(rss, self.baseline + self.reserved) + estimate
+                if not self.active:
+                    can_run = projected <= self.ceiling
+                    # Sozinho e ainda sem espaço: dá um tempo para a memória do estágio anterior
+                    # ser devolvida; se não couber, nenhuma espera vai resolver
+                    idle_since = idle_since or time.monotonic()
+                    if not can_run and time.monotonic() - idle_since >= self.idle_grace:
+                        raise MemoryError(f"Estágio {stage} ({estimate // MB} MB) não cabe no teto de "
+                                          f"{self.ceiling // MB} MB com {rss // MB} MB já em uso.")
+                else:
+                    idle_since = None
+                    can_run = not self.backoff and projected <= self.ceiling * self.safety
+                if can_run:
+                    break
+                self.cond.wait(timeout=self.poll_interval)
+
+            self._next_token += 1
+            token = self._next_token
+            self.reserved += estimate
+            self.active[token] = (stage, estimate, rss, correction)
+            return token
+
+    def _release(self, token):
+        with self.cond:
+            stage, estimate, _, correction = self.active.pop(token, (None, 0, 0, 1.0))
+            self.reserved -= estimate
+            peak = self.peak_usage.pop(token, None)
+            if stage is not None and peak is not None and estimate > 0:
+                # Razão medida em relação à estimativa sem correção
+                measured = peak / estimate * correction
+                measured = min(CORRECTION_MAX, max(CORRECTION_MIN, measured))
+                current = self.corrections[stage]
+                self.corrections[stage] = current + CORRECTION_ALPHA * (measured - current)
+            self.cond.notify_all()
+
+    def _monitor_loop(self):
+        while self.running:
+            rss = current_rss_bytes()
+            with self.cond:
+                self.peak_rss = max(self.peak_rss, rss)
+                was_backoff = self.backoff
+                self.backoff = rss > self.ceiling * self.safety
+
+                # Uso real acima/abaixo do reservado -> dividido entre os estágios ativos
+                if self.active:
+                    share = (rss - (self.baseline + self.reserved)) / len(self.active)
+                    for token, (stage, estimate, _, _) in self.active.items():
+                        usage = max(0, estimate + share)
+                        self.peak_usage[token] = max(self.peak_usage.get(token, 0), usage)
+
+                if was_backoff != self.backoff:
+                    state = "suspensas" if self.backoff else "retomadas"
+                    self.log(f"Memória: {rss // MB} MB / teto {self.ceiling // MB} MB. Admissões {state}.")
+                self.cond.notify_all()
+            time.sleep(self.poll_interval)
+
+    # --- Fila de jobs ---
+
+    def submit(self, job):
+        with self.cond:
+            self.pending.append(job)
+            self.cond.notify_all()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.monitor.start()
+        for _ in range(self.max_workers):
+            t = threading.Thread(target=self._worker_loop, daemon=True)
+            t.start()
+            self.workers.append(t)
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+
+    def wait(self):
+        """Bloqueia até a fila esvaziar e todos os jobs terminarem."""
+        with self.cond:
+            while self.pending or self._busy_workers:
+                self.cond.wait(timeout=self.poll_interval)
+        return self.finished
+
+    def _worker_loop(self):
+        while self.running:
+            with self.cond:
+                while self.running and (not self.pending or self.backoff):
+                    self.cond.wait(timeout=self.poll_interval)
+                if not self.running:
+                    return
+                job = self.pending.popleft()
+                self._busy_workers += 1
+
+            job.attempts += 1
+            job.oom = False
+            self._local.job = job
+            try:
+                job.result = job.fn(job)
+                job.error = None
+            except Exception as e:
+                job.error = e
+                if is_oom_error(e):
+                    job.oom = True
+
+            with self.cond:
+                self._local.job = None
+                self._busy_workers -= 1
+                if job.oom and job.attempts <= job.max_retries:
+                    self.log(f"Job {job.job_id} falhou por memória. Reenfileirando (tentativa {job.attempts}).")
+                    self.pending.append(job)
+                else:
+                    self.finished.append(job)
+                self.cond.notify_all()
+
+
+class _StageReservation:
+    def __init__(self, scheduler, name, duration_sec, job):
+        self.scheduler = scheduler
+        self.name = name
+        self.duration_sec = duration_sec
+        self.job = job
+        self.token = None
+
+    def __enter__(self):
+        self.token = self.scheduler._acquire(self.name, self.duration_sec)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.scheduler._release(self.token)
+        if exc is not None and is_oom_error(exc):
+            # Estimativa estava errada: infla o fator do estágio e marca o job para reenfileirar
+            with self.scheduler.cond:
+                corrections = self.scheduler.corrections
+                corrections[self.name] = min(CORRECTION_MAX, corrections[self.name] * OOM_CORRECTION_STEP)
+            if self.job is not None:
+                self.job.oom = True
+        return False
@@ -1,19 +1,31 @@
 import pygame
 import sys
 import os
-import re
 import time
 import random
 import threading
-import json
 import sqlite3
 import ctypes # Para DPI Awareness no Windows
 from scorer import Scorer
+from audio_analysis import read_waveform_sidecar, loudness_gain, ReferenceContour
+from text_cache import TextRenderCache
+from lyrics_timeline import LyricsData, LyricTimeline, DisplaySchedule, load_lyrics, find_lyrics_files
+from background_loader import BackgroundLoader, DerivativeCache, cover_scale, render_gradient
+from song_prefetch import SongPrefetcher, warm_file_cache
+from audio_info import probe_audio, read_manifest, ensure_manifest
+from playback_clock import PlaybackClock
+from stem_mixer import DualStemPlayer, decode_stem
+from pcm_cache import PcmCache
+from audio_engine import AudioEngine, BLOCK_SIZES
+from perf_overlay import FrameProfiler
 from api_server import KaraokeAPI
 
 # Constantes
 WIDTH, HEIGHT = 1024, 768
 FPS = 60
+IDLE_FRAME_MS = 100 # Música sem animação (intervalos): ~10 fps, acorda antes no próximo evento da letra
+STATIC_FRAME_MS = 250 # Menu/pontuação/pausa: espera eventos com timeout
+CONFIG_FPS = 30
 FONT_SIZE_LYRICS = 40
 FONT_SIZE_INFO = 24
 COLOR_WHITE = (255, 255, 255)
@@ -59,13 +71,19 @@ class SongLibrary:
                 if not os.path.exists(audio_path) and os.path.exists(orig_audio_path):
                     audio_path = orig_audio_path
                 
+                # Duração/formato por faixa gravados na ingestão (sem decodificar o áudio)
+                stems = self._stems(base_path)
+                stem = "instrumental" if audio_path.endswith("instrumental.mp3") else "original"
+                
                 return {
                     'id': song_id,
                     'title': row['Titulo'],
                     'artist': row['Cantor'],
                     'audio_path': audio_path,
                     'original_audio_path': orig_audio_path,
-                    'base_path': base_path
+                    'base_path': base_path,
+                    'stems': stems,
+                    'duration_ms': stems.get(stem, {}).get('duration_ms', 0)
                 }
         except sqlite3.Error as e:
             print(f"Erro na busca: {e}")
@@ -88,18 +106,29 @@ class SongLibrary:
                 if not os.path.exists(audio_path) and os.path.exists(orig_audio_path):
                     audio_path = orig_audio_path
                 
+                stems = self._stems(base_path)
+                stem = "instrumental" if audio_path.endswith("instrumental.mp3") else "original"
+                
                 return {
                     'id': row['id'],
                     'code': row['Cod'],
                     'title': row['Titulo'],
                     'artist': row['Cantor'],
                     'path': audio_path,
-                    'lyrics_file': os.path.join(base_path, "lyrics_v1.json")
+                    'lyrics_file': os.path.join(base_path, "lyrics_v1.json"),
+                    'stems': stems,
+                    'duration_ms': stems.get(stem, {}).get('duration_ms', 0)
                 }
         except Exception as e:
             print(f"Erro get_song: {e}")
         return None
 
+    @staticmethod
+    def _stems(base_path):
+        """Faixas do manifest.json da música ({} se ainda não tem manifest)."""
+        manifest = read_manifest(base_path)
+        return manifest['stems'] if manifest else {}
+
     def get_all_songs(self):
         """Retorna todas as músicas disponíveis."""
         songs = []
@@ -149,6 +178,16 @@ class SongLibrary:
                 # Para segurança e simplicidade, vamos de muitas queries (local é rápido) ou batch
                 cursor.executemany("UPDATE musicas SET status = 'disponivel' WHERE id = ?", [(x,) for x in found_ids])
             
+            # 4. Backfill: duração/taxa/tamanho por faixa lidos dos cabeçalhos (manifest.json)
+            created = 0
+            for song_id in found_ids:
+                try:
+                    created += ensure_manifest(os.path.join("songs", song_id))[1]
+                except OSError as e:
+                    print(f"Erro no manifest de {song_id}: {e}")
+            if created:
+                print(f"Manifests de faixas gerados/atualizados: {created}")
+            
             self.conn.commit()
             count = cursor.execute("SELECT COUNT(*) FROM musicas WHERE status = 'disponivel'").fetchone()[0]
             print(f"Sincronização concluída. {count} músicas disponíveis.")
@@ -163,7 +202,18 @@ class KaraokePlayer:
     Classe principal do Player de Karaokê usando Pygame.
     Gerencia a interface, reprodução de áudio, letras e pontuação.
     """
-    def __init__(self):
+    def __init__(self, headless=False, scorer=None, start_api=True, timer=None):
+        """
+        headless: sem janela nem dispositivo de áudio (drivers 'dummy' do SDL),
+        para benchmarks e testes; a música "termina" pela duração, no relógio.
+        scorer: Scorer já criado (ex.: simulado, sem microfones).
+        timer: função de tempo do relógio de reprodução (ex.: relógio falso).
+        """
+        self.headless = headless
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
         # Configura DPI Awareness para Windows (evita borrões e coordenadas erradas em 4k)
         try:
             ctypes.windll.user32.SetProcessDPIAware()
@@ -190,29 +240,60 @@ class KaraokePlayer:
             pass
             
         self.clock = pygame.time.Clock()
+        # Posição da música: mixer + timer de alta resolução (lido por render, scorer e API)
+        self.playback_clock = PlaybackClock(pygame.mixer.music.get_pos, timer=timer or time.perf_counter)
+        # Modo duas faixas: instrumental e original decodificadas e tocando juntas,
+        # troca de faixa instantânea (sem disco) e seek O(1). Desligado usa mixer.music.
+        self.cfg_dual_stem = True
+        self.stem_player = DualStemPlayer()
+        # PCM decodificado em disco (memmap), com LRU por tamanho: músicas repetidas abrem na hora
+        self.cfg_pcm_cache = True
+        self.pcm_cache = PcmCache()
+        self.dual_active = False
 
         self.manager = SongLibrary()
         self.library = self.manager # Alias for API compatibility
-        self.scorer = Scorer()
+        self.scorer = scorer or Scorer()
         
         # Iniciar API Server
         self.api = KaraokeAPI(self)
-        self.api.start()
+        if start_api:
+            self.api.start()
         
+        # Cache de palavras pré-renderizadas (limpo em init_fonts e ao trocar de música)
+        self.text_cache = TextRenderCache()
+        # Fontes de tamanho avulso e quebras de linha já calculadas (limpos em init_fonts)
+        self.font_cache = {}
+        self.wrap_cache = {}
+
         # Fontes do Sistema
         self.init_fonts(1.0) # Inicializa com escala 1.0
 
         # Background Config
         self.cfg_bg_mode = "IMAGEM" # Opções: "IMAGEM", "GRADIENTE"
         self.bg_images = []
+        # Derivados em disco nas resoluções usadas + próximos fundos preparados em segundo plano
+        self.bg_cache = DerivativeCache()
+        self.bg_loader = BackgroundLoader(loader=self.bg_cache.load)
+        self.bg_loader.start()
+        self.current_bg_path = None
+        self.current_bg_image = None
+        self.bg_prescaled = None
         self.load_bg_images()
 
         self.current_song = None
-        self.lyrics = [] # Lista de (timestamp_ms, text)
+        self.total_duration = 0
+        self.lyrics = LyricsData() # Letra atual (arrays de tempos + tabela de textos)
+        self.timeline = LyricTimeline(self.lyrics)
+        self.schedule = DisplaySchedule(self.timeline)
         self.current_line_index = -1
 
         self.queue = []
         self.input_buffer = ""
+
+        # Próxima música da fila preparada em segundo plano (conexão SQLite própria)
+        self.prefetcher = SongPrefetcher(self.prepare_song, lambda: SongLibrary(self.manager.db_path))
+        self.prefetcher.start()
         
         # New State Flags
         self.paused = False
@@ -223,6 +304,19 @@ class KaraokePlayer:
         self.load_random_background()
 
         self.score_result = 0
+        self.frame_time_ms = 0.0
+        # Tempos por fase de cada frame + perf.log rotativo (sempre ligado; overlay no F3)
+        self.profiler = FrameProfiler(self.perf_counters)
+        self.perf_overlay_surf = None
+        self.perf_overlay_time = None
+
+        # Renderização por regiões (dirty rects): só as áreas alteradas vão para a tela
+        self.cfg_dirty_rects = True
+        self.dirty_rects = [] # Regiões desenhadas no frame atual
+        self.force_full_redraw = True
+        self._last_mode_key = None
+        self._last_static_sig = None
+        self._meter_was_active = False
         
         # --- Configurações de Estado ---
         # Padrões
@@ -235,41 +329,82 @@ class KaraokePlayer:
         self.cfg_latency_chunk = 2048 # Aumentado para 2048 para evitar crashes em monitoramento
         self.cfg_difficulty = "Fácil" # Fácil, Normal, Difícil
         self.show_rhythm_indicator = True # Config Visual
+        self.cfg_outline_width = 2 # Espessura do contorno das letras (px)
         
         # Audio Engine
-        self.scorer = Scorer(chunk=self.cfg_latency_chunk)
+        if scorer is None:
+            self.scorer = Scorer(chunk=self.cfg_latency_chunk)
         self.available_devices = self.scorer.get_input_devices()
         
         # Define device padrao se houver
         if self.available_devices:
             self.cfg_mic1_idx = self.available_devices[0]['index']
             
+        # Saída única (música + retorno dos mics) com bloco pequeno. Sem ela, pygame.mixer.
+        self.cfg_audio_engine = True
+        self.cfg_engine_block = 256
+        self.audio_engine = None
+        if self.cfg_audio_engine and self.cfg_dual_stem and not headless:
+            self.open_audio_engine()
+
         self.apply_audio_config()
+        self.scorer.set_clock(self.playback_clock)
         self.scorer.start() # Inicia loop de audio (mudo se sem input)
 
+    def open_audio_engine(self):
+        """Abre o motor de áudio (PyAudio) e passa a tocar a música e o retorno por ele."""
+        freq = pygame.mixer.get_init()[0]
+        # Solta o dispositivo antes de abrir o stream (dispositivos exclusivos/hw não abrem duas vezes).
+        # pygame.mixer fica só para decodificar: com o driver 'dummy' não disputa o dispositivo
+        previous_driver = os.environ.get('SDL_AUDIODRIVER')
+        pygame.mixer.quit()
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        pygame.mixer.init(frequency=freq, size=-16, channels=2, buffer=2048)
+
+        engine = AudioEngine(self.scorer.p, rate=freq, block=self.cfg_engine_block)
+        if not engine.open():
+            print("Motor de áudio indisponível, usando pygame.mixer")
+            # Volta o mixer para o driver real
+            pygame.mixer.quit()
+            if previous_driver is None:
+                os.environ.pop('SDL_AUDIODRIVER', None)
+            else:
+                os.environ['SDL_AUDIODRIVER'] = previous_driver
+            pygame.mixer.init(frequency=freq, size=-16, channels=2, buffer=2048)
+            return
+        self.audio_engine = engine
+        self.stem_player = engine
+        self.scorer.set_monitor_sink(engine)
+
     def init_fonts(self, scale=1.0):
         """Inicializa fontes com fator de escala base."""
+        # Superfícies antigas referenciam as fontes anteriores
+        self.text_cache.clear()
+        self.font_cache.clear()
+        self.wrap_cache.clear()
         self.font_lyrics = pygame.font.Font(None, int(FONT_SIZE_LYRICS * scale))
         self.font_info = pygame.font.Font(None, int(FONT_SIZE_INFO * scale))
         self.font_small = pygame.font.Font(None, int(20 * scale))
 
-    def draw_text_with_outline(self, text, font, color, center_pos, outline_color=(0,0,0), outline_width=2):
-        """Desenha texto centralizado com borda (outline). Retorna Rect."""
-        cx, cy = center_pos
-        # Renderiza texto principal
-        surf = font.render(text, True, color)
-        rect = surf.get_rect(center=(cx, cy))
-        
-        # Desenha outline (8 direções simples)
-        for dx in [-outline_width, 0, outline_width]:
-             for dy in [-outline_width, 0, outline_width]:
-                 if dx != 0 or dy != 0:
-                     out_surf = font.render(text, True, outline_color)
-                     out_rect = out_surf.get_rect(center=(cx + dx, cy + dy))
-                     self.screen.blit(out_surf, out_rect)
-        
-        # Blit main text
-        self.screen.blit(surf, rect)
+    def get_font(self, size):
+        """Fonte padrão no tamanho pedido, criada uma única vez (evita reabrir o arquivo a cada frame)."""
+        font = self.font_cache.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.font_cache[size] = font
+        return font
+
+    def draw_text_with_outline(self, text, font, color, center_pos, outline_color=(0,0,0), outline_width=None):
+        """Desenha texto centralizado com borda (outline) a partir do cache. Retorna Rect."""
+        if outline_width is None:
+            outline_width = self.cfg_outline_width
+        surf = self.text_cache.outlined(font, text, color, outline_color, outline_width)
+        rect = surf.get_rect(center=center_pos)
+        return self.mark_dirty(self.screen.blit(surf, rect))
+
+    def mark_dirty(self, rect):
+        """Registra uma região desenhada neste frame (restaurada e atualizada no próximo)."""
+        self.dirty_rects.append(rect)
         return rect
 
     def load_bg_images(self):
@@ -284,46 +419,57 @@ class KaraokePlayer:
             if ext in valid_ext:
                 self.bg_images.append(os.path.join("backgrounds", f))
         
+        self.bg_loader.set_sources(self.bg_images)
         print(f"Backgrounds carregados: {len(self.bg_images)}")
 
+        # Prefere derivados prontos no tamanho da janela; gera os que faltam em segundo plano
+        self.bg_cache.reload()
+        size = self.screen.get_size()
+        print(f"Derivados de fundo em {size[0]}x{size[1]}: {self.bg_cache.count(size)}")
+        self.bg_cache.build_async(self.bg_images, [size])
+
     def generate_new_background(self):
         """Escolhe novo fundo (Cor ou Imagem)."""
+        self.current_bg_image = None
+        self.bg_prescaled = None
+        self.current_bg_path = None
         if self.cfg_bg_mode == "IMAGEM" and self.bg_images:
-            # Modo Imagem
-            img_path = random.choice(self.bg_images)
-            try:
-                self.current_bg_image = pygame.image.load(img_path)
-                print(f"Background Imagem: {img_path}")
-            except Exception as e:
-                print(f"Erro ao carregar imagem {img_path}: {e}")
-                self.current_bg_image = None
-        else:
-            self.current_bg_image = None
+            # Modo Imagem: usa um fundo já preparado pela thread de fundos
+            ready = self.bg_loader.take()
+            if ready:
+                self.current_bg_path, self.bg_prescaled = ready
+                print(f"Background Imagem (pré-carregado): {self.current_bg_path}")
+            else:
+                # Pool vazio (início ou troca de resolução): carrega na hora (derivado em disco se houver)
+                self.current_bg_path = random.choice(self.bg_images)
+                print(f"Background Imagem: {self.current_bg_path}")
             
         # Sempre gera cores para fallback ou modo Gradiente
+        # Cada tema: (tipo do gradiente, gerador das cores em ordem)
         themes = [
             # Ocean (Azul/Ciano)
-            lambda: ((random.randint(0,50), random.randint(0,100), random.randint(100,200)),
-                     (random.randint(0,30), random.randint(100,200), random.randint(200,255))),
-            # Sunset (Laranja/Roxo)
-            lambda: ((random.randint(150,255), random.randint(50,150), random.randint(0,50)),
-                     (random.randint(50,100), random.randint(0,50), random.randint(100,200))),
+            ("vertical", lambda: ((random.randint(0,50), random.randint(0,100), random.randint(100,200)),
+                                  (random.randint(0,30), random.randint(100,200), random.randint(200,255)))),
+            # Sunset (Laranja/Magenta/Roxo)
+            ("diagonal", lambda: ((random.randint(150,255), random.randint(50,150), random.randint(0,50)),
+                                  (random.randint(150,220), random.randint(0,60), random.randint(80,150)),
+                                  (random.randint(50,100), random.randint(0,50), random.randint(100,200)))),
             # Nature (Verde/Azul)
-            lambda: ((random.randint(0,50), random.randint(100,200), random.randint(50,150)),
-                     (random.randint(0,100), random.randint(50,100), random.randint(100,200))),
-            # Neon (Pink/Roxo)
-            lambda: ((random.randint(200,255), random.randint(0,100), random.randint(200,255)),
-                     (random.randint(50,150), random.randint(0,50), random.randint(150,250))),
-            # Dark Red (Vermelho/Preto)
-            lambda: ((random.randint(100,200), random.randint(0,50), random.randint(0,50)),
-                     (random.randint(50,100), random.randint(0,30), random.randint(0,30))),
+            ("vertical", lambda: ((random.randint(0,50), random.randint(100,200), random.randint(50,150)),
+                                  (random.randint(0,100), random.randint(50,100), random.randint(100,200)))),
+            # Neon (Pink/Roxo), brilho no centro
+            ("radial", lambda: ((random.randint(200,255), random.randint(0,100), random.randint(200,255)),
+                                (random.randint(50,150), random.randint(0,50), random.randint(150,250)))),
+            # Dark Red (Vermelho/Preto), vinheta
+            ("radial", lambda: ((random.randint(100,200), random.randint(0,50), random.randint(0,50)),
+                                (random.randint(50,100), random.randint(0,30), random.randint(0,30)))),
             # Random Vivid
-            lambda: ((random.randint(50,200), random.randint(50,200), random.randint(50,200)),
-                     (random.randint(50,200), random.randint(50,200), random.randint(50,200)))
+            ("diagonal", lambda: ((random.randint(50,200), random.randint(50,200), random.randint(50,200)),
+                                  (random.randint(50,200), random.randint(50,200), random.randint(50,200))))
         ]
         
-        generator = random.choice(themes)
-        self.bg_c1, self.bg_c2 = generator()
+        self.bg_kind, generator = random.choice(themes)
+        self.bg_stops = generator()
         
         self.render_background()
 
@@ -331,25 +477,25 @@ class KaraokePlayer:
         """Renderiza o fundo usando as cores atuais na resolução atual."""
         w, h = self.screen.get_width(), self.screen.get_height()
         
-        if self.cfg_bg_mode == "IMAGEM" and hasattr(self, 'current_bg_image') and self.current_bg_image:
-             # Scale Image to Cover
+        # Fundos futuros são preparados já nesta resolução
+        self.bg_loader.set_target((w, h))
+
+        if self.cfg_bg_mode == "IMAGEM" and self.current_bg_path:
              try:
-                 # Smoothscale é pesado, então fazemos apenas quando necessário (resize/init)
-                 # Calculando aspecto para "Cover"
-                 img_w, img_h = self.current_bg_image.get_size()
-                 scale_w = w / img_w
-                 scale_h = h / img_h
-                 scale = max(scale_w, scale_h)
-                 
-                 new_size = (int(img_w * scale), int(img_h * scale))
-                 scaled_img = pygame.transform.smoothscale(self.current_bg_image, new_size)
-                 
-                 # Centraliza crop
-                 x = (w - new_size[0]) // 2
-                 y = (h - new_size[1]) // 2
-                 
-                 self.background = pygame.Surface((w, h)).convert()
-                 self.background.blit(scaled_img, (x, y))
+                 if self.bg_prescaled is not None and self.bg_prescaled.get_size() == (w, h):
+                     # Já decodificado e em "cover" pela thread de fundos: só converte
+                     self.background = self.bg_prescaled.convert()
+                 else:
+                     # Smoothscale é pesado, então fazemos apenas quando necessário (resize/init)
+                     if self.current_bg_image is None:
+                         cached = self.bg_cache.lookup(self.current_bg_path, (w, h))
+                         if cached:
+                             self.background = pygame.image.load(cached).convert()
+                         else:
+                             self.current_bg_image = pygame.image.load(self.current_bg_path)
+                     if self.current_bg_image is not None:
+                         self.background = cover_scale(self.current_bg_image, (w, h)).convert()
+                 self.bg_prescaled = None
              except Exception as e:
                  print(f"Erro no render imagem: {e}")
                  # Fallback para gradiente se falhar
@@ -361,25 +507,16 @@ class KaraokePlayer:
         self.overlay = pygame.Surface((w, h), pygame.SRCALPHA)
         self.overlay.fill(COLOR_BG_OVERLAY)
 
+        # Fundo + overlay já compostos: um único blit opaco por frame (ou por região)
+        self.composite = self.background.copy()
+        self.composite.blit(self.overlay, (0, 0))
+        self.force_full_redraw = True
+
     def _render_gradient(self, w, h):
-        self.background = pygame.Surface((w, h)).convert()
-        c1 = getattr(self, 'bg_c1', (0,0,100))
-        c2 = getattr(self, 'bg_c2', (0,0,50))
-
-        # Otimização: desenhar linhas horizontais
-        for y in range(h):
-            # Interpolação linear (float) para evitar degraus abruptos
-            f = y / h
-            r = int(c1[0] + (c2[0] - c1[0]) * f)
-            g = int(c1[1] + (c2[1] - c1[1]) * f)
-            b = int(c1[2] + (c2[2] - c1[2]) * f)
-            
-            # Clamp color values (just in case)
-            r = max(0, min(255, r))
-            g = max(0, min(255, g))
-            b = max(0, min(255, b))
-            
-            pygame.draw.line(self.background, (r,g,b), (0,y), (w,y))
+        # Calculado com numpy (sem loop por linha) e em cache por cores/tamanho
+        stops = getattr(self, 'bg_stops', ((0,0,100), (0,0,50)))
+        kind = getattr(self, 'bg_kind', "vertical")
+        self.background = render_gradient((w, h), stops, kind).convert()
 
     def load_random_background(self):
         # Alias para compatibilidade antiga, se necessário, ou redirecionar
@@ -391,96 +528,180 @@ class KaraokePlayer:
 
     def parse_lrc(self, lrc_path):
         """
-        Analisa o arquivo de letras (LRC ou JSON).
+        Analisa o arquivo de letras (LRC ou JSON) para a forma compacta (LyricsData).
+        """
+        return load_lyrics(lrc_path)
+
+    def prepare_song(self, code, library=None):
         """
-        if lrc_path.endswith('.json'):
-            import json
+        Prepara tudo que uma música precisa antes de tocar: metadados, letras
+        já analisadas (com timeline), duração, ganhos e referência de pontuação.
+        Não usa o display, então roda também na thread de prefetch.
+        """
+        library = library or self.manager
+        song_data = library.get_song_by_code(code)
+        if not song_data:
+            return None
+        base = song_data['base_path']
+
+        # Prioridade de Ordem: v1 (Sincronizado Padrão), v2 (Alternativo), lrc (Linha)
+        lyrics_files = find_lyrics_files(base)
+        lyrics = self.parse_lrc(lyrics_files[0]['path']) if lyrics_files else LyricsData()
+
+        # Duração do catálogo (manifest); sem manifest, lê só o cabeçalho do arquivo
+        duration = song_data.get('duration_ms', 0)
+        if not duration:
             try:
-                with open(lrc_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    lines = []
-                    for l in data.get('lines', []):
-                         l['time'] = l['start'] * 1000
-                         l['end_time'] = l['end'] * 1000
-                         for w in l.get('words', []):
-                             w['start_ms'] = w['start'] * 1000
-                             w['end_ms'] = w['end'] * 1000
-                         lines.append(l)
-                    return lines
+                duration = probe_audio(song_data['audio_path'])['duration_ms']
+            except Exception:
+                duration = 0
+
+        try:
+            reference = ReferenceContour.load(os.path.join(base, "reference.npz"))
+        except Exception:
+            reference = None # Sem referência pontua só por energia
+
+        # Modo duas faixas: PCM das faixas preparado aqui (na thread de prefetch, fora do render).
+        # Com o cache de PCM só decodifica na primeira vez; depois é um mapeamento do arquivo.
+        pcm = None
+        stem_paths = {'instrumental': os.path.join(base, "instrumental.mp3"),
+                      'original': os.path.join(base, "original.mp3")}
+        stem_paths = {name: path for name, path in stem_paths.items() if os.path.exists(path)}
+        if self.cfg_dual_stem and stem_paths:
+            try:
+                if self.cfg_pcm_cache:
+                    pcm = {name: self.pcm_cache.get(f"{song_data['id']}_{name}", path)
+                           for name, path in stem_paths.items()}
+                else:
+                    pcm = {name: decode_stem(path) for name, path in stem_paths.items()}
             except Exception as e:
-                print(f"Erro ao analisar letras JSON: {e}")
-                return []
-
-        lyrics = []
-        if not lrc_path or not os.path.exists(lrc_path):
-            return []
-
-        with open(lrc_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                match = re.search(r'\[(\d+):(\d+\.\d+)\](.*)', line)
-                if match:
-                    minutes = int(match.group(1))
-                    seconds = float(match.group(2))
-                    text = match.group(3).strip()
-                    time_ms = (minutes * 60 + seconds) * 1000
-                    lyrics.append({'time': time_ms, 'text': text})
-        return lyrics
+                print(f"Modo duas faixas indisponível ({e}), usando uma faixa por vez")
+
+        if pcm is None:
+            # Áudio já no cache do SO: mixer.music.load/troca de faixa sem esperar o disco
+            warm_file_cache([song_data['audio_path'], song_data['original_audio_path']])
+
+        return {
+            'song_data': song_data,
+            'lyrics_files': lyrics_files,
+            'lyrics': lyrics,
+            'timeline': LyricTimeline(lyrics),
+            'duration': duration,
+            # Ganho por faixa pré-calculado na ingestão (normalização de loudness, custo zero em runtime)
+            'track_gains': self.load_track_gains(base),
+            'reference': reference,
+            'pcm': pcm,
+        }
+
+    def prefetch_next(self):
+        """Pede a preparação da próxima música da fila (chamado a cada update)."""
+        if self.queue:
+            self.prefetcher.request(self.queue[0])
 
     def start_song(self, song_id):
         """Inicia a reprodução."""
-        # Busca no banco
-        song_data = self.manager.get_song_by_code(song_id)
-        if not song_data:
+        # Normalmente já preparada pelo prefetch durante a música anterior
+        prepared = self.prefetcher.take(song_id) or self.prepare_song(song_id)
+        if not prepared:
             print(f"Música {song_id} não encontrada ou indisponível!")
             return
-            
+
+        song_data = prepared['song_data']
         print(f"Iniciando música: {song_data['title']}")
         self.current_song = song_data
+        self.text_cache.clear()
         
-        # Detecta Lyrics Disponíveis
-        base = song_data['base_path']
-        self.lyrics_files = []
-        
-        # Prioridade de Ordem: v1 (Sincronizado Padrão), v2 (Alternativo), lrc (Linha)
-        if os.path.exists(os.path.join(base, "lyrics_v1.json")):
-             self.lyrics_files.append({"type": "v1", "path": os.path.join(base, "lyrics_v1.json")})
-        if os.path.exists(os.path.join(base, "lyrics_v2.json")):
-             self.lyrics_files.append({"type": "v2", "path": os.path.join(base, "lyrics_v2.json")})
-        if os.path.exists(os.path.join(base, "lyrics.lrc")):
-             self.lyrics_files.append({"type": "lrc", "path": os.path.join(base, "lyrics.lrc")})
-             
-        # Carrega o primeiro disponível
+        # Letras: arquivos detectados e o primeiro já analisado
+        self.lyrics_files = prepared['lyrics_files']
         self.current_lyrics_index = 0
         if self.lyrics_files:
-             self._load_lyrics_by_index(0)
-        else:
-             self.lyrics = []
+             print(f"Carregando letras: {self.lyrics_files[0]['type']}")
+        self.set_lyrics(prepared['lyrics'], prepared['timeline'])
 
         try:
-            try:
-                # Carrega duração total (necessita recarregar como Sound)
-                s = pygame.mixer.Sound(song_data['audio_path'])
-                self.total_duration = s.get_length() * 1000
-            except:
-                self.total_duration = 0
-
-            pygame.mixer.music.load(song_data['audio_path'])
-            pygame.mixer.music.set_volume(self.cfg_volume_music)
-            pygame.mixer.music.play()
+            self.total_duration = prepared['duration']
+            self.track_gains = prepared['track_gains']
+            self.current_stem = "instrumental" if song_data['audio_path'].endswith("instrumental.mp3") else "original"
+
+            self.stem_player.stop()
+            pygame.mixer.music.stop()
+            self.dual_active = prepared.get('pcm') is not None
+            if not self.dual_active and self.audio_engine:
+                # Com o motor de áudio o mixer do pygame não tem saída
+                print("Não foi possível decodificar o áudio da música")
+                return
+            if self.dual_active:
+                # As duas faixas tocam sempre; o ganho decide o que se ouve
+                self.stem_player.load(prepared['pcm'], gains=self.track_gains)
+                self.stem_player.set_vocal_level(1.0 if self.current_stem == "original" else 0.0, instant=True)
+                self.stem_player.set_volume(self.get_music_volume())
+                self.stem_player.play(0)
+                self.total_duration = self.stem_player.duration_ms # Duração exata do PCM decodificado
+                self.playback_clock.source = self.stem_player.get_pos
+            else:
+                pygame.mixer.music.load(song_data['audio_path'])
+                pygame.mixer.music.set_volume(self.get_music_volume())
+                pygame.mixer.music.play()
+                self.playback_clock.source = pygame.mixer.music.get_pos
+            self.playback_clock.start(0)
         except pygame.error as e:
             print(f"Não foi possível carregar o áudio: {e}")
             return
         
         self.state = "PLAYING"
+        # Referência de altura/energia gerada na ingestão (opcional: sem ela pontua só por energia)
+        self.scorer.set_reference(prepared['reference'])
         self.scorer.set_paused(False) # Resume audio processing safely
         self.scorer.reset()
         self.load_random_background()
 
+    def load_track_gains(self, base):
+        """Lê apenas os cabeçalhos do waveform.bin e calcula o ganho de cada faixa."""
+        gains = {}
+        path = os.path.join(base, "waveform.bin")
+        if os.path.exists(path):
+            try:
+                for stem, info in read_waveform_sidecar(path, with_peaks=False).items():
+                    gains[stem] = loudness_gain(info['loudness'])
+            except Exception as e:
+                print(f"Erro ao ler waveform.bin: {e}")
+        return gains
+
+    def get_music_volume(self):
+        """Volume efetivo da música: volume configurado x ganho de normalização da faixa atual."""
+        if self.dual_active:
+            # No modo duas faixas o ganho de cada faixa já entra na mistura
+            return max(0.0, min(1.0, self.cfg_volume_music))
+        gains = getattr(self, 'track_gains', {})
+        gain = gains.get(getattr(self, 'current_stem', 'instrumental'), 1.0)
+        return max(0.0, min(1.0, self.cfg_volume_music * gain))
+
+    def music_busy(self):
+        """Música ainda tocando (modo duas faixas ou mixer.music)."""
+        if self.headless:
+            return self.get_current_time() < self.total_duration
+        if self.dual_active:
+            return self.stem_player.get_busy()
+        return pygame.mixer.music.get_busy()
+
+    def update_music_volume(self):
+        if self.dual_active:
+            self.stem_player.set_volume(self.get_music_volume())
+        else:
+            pygame.mixer.music.set_volume(self.get_music_volume())
+
     def _load_lyrics_by_index(self, index):
         if not self.lyrics_files: return
         data = self.lyrics_files[index]
         print(f"Carregando letras: {data['type']}")
-        self.lyrics = self.parse_lrc(data['path'])
+        self.set_lyrics(self.parse_lrc(data['path']))
+
+    def set_lyrics(self, lyrics, timeline=None):
+        """Define as letras atuais (LyricsData) e reconstrói os índices derivados (timeline, agenda e layout)."""
+        self.lyrics = lyrics
+        self.timeline = timeline if timeline is not None else LyricTimeline(lyrics)
+        self.schedule = DisplaySchedule(self.timeline)
+        self.build_layout()
         
     def switch_lyrics(self):
         """Alterna entre arquivos de letra disponíveis."""
@@ -488,18 +709,19 @@ class KaraokePlayer:
         
         self.current_lyrics_index = (self.current_lyrics_index + 1) % len(self.lyrics_files)
         self._load_lyrics_by_index(self.current_lyrics_index)
+
+        # Reposiciona a página no tempo atual da nova letra
+        now = self.get_current_time()
+        self.timeline.seek(now)
+        self.page_index = self.schedule.page_at(now)
         
         # Mostra feedback visual (opcional/debug)
         l_type = self.lyrics_files[self.current_lyrics_index]['type']
         print(f"Letras alteradas para: {l_type}")
         
     def get_current_time(self):
-        """Retorna tempo atual em ms com compensação de offset."""
-        if not hasattr(self, 'current_offset_ms'):
-             self.current_offset_ms = 0
-        pos = pygame.mixer.music.get_pos()
-        if pos == -1: return 0
-        return pos + self.current_offset_ms
+        """Retorna tempo atual da música em ms (relógio de reprodução interpolado)."""
+        return self.playback_clock.position_ms()
         
     def seek_song(self, delta_sec):
         """Avança ou retrocede a música."""
@@ -514,20 +736,16 @@ class KaraokePlayer:
              if new_pos >= max_sec: new_pos = max_sec - 1
         
         try:
-             pygame.mixer.music.play(start=new_pos)
-             self.current_offset_ms = int(new_pos * 1000)
+             if self.dual_active:
+                 self.stem_player.seek(new_pos * 1000)
+             else:
+                 pygame.mixer.music.play(start=new_pos)
+             self.playback_clock.seek(new_pos * 1000)
              
-             # Re-sincroniza a página de letras (Aproximação simples)
-             # Reseta para buscar do inicio
-             self.page_index = 0
-             # Avança paginação até encontrar o tempo atual
+             # Re-sincroniza a página de letras por busca binária
              target_ms = new_pos * 1000
-             while self.page_index + 1 < len(self.lyrics):
-                  line = self.lyrics[self.page_index + 1]
-                  if target_ms > line.get('end_time', line['time'] + 5000):
-                       self.page_index += 2
-                  else:
-                       break
+             self.timeline.seek(target_ms)
+             self.page_index = self.schedule.page_at(target_ms)
                        
              print(f"Seek para {new_pos}s")
         except Exception as e:
@@ -559,10 +777,23 @@ class KaraokePlayer:
                     target_type = 'instrumental'
             
             if target_file:
+                target_stem = "original" if target_type == 'vocal' else "instrumental"
+                if self.dual_active and target_stem not in self.stem_player.stems:
+                    # Música com uma faixa só (ex.: só original.mp3): nada para alternar
+                    return
+                self.current_stem = target_stem
+                stem_info = self.current_song.get('stems', {}).get(self.current_stem)
+                if self.dual_active:
+                    # Faixas já alinhadas na memória: só crossfade, sem disco nem seek
+                    self.stem_player.set_vocal_level(1.0 if target_type == 'vocal' else 0.0)
+                    self.current_track_type = target_type
+                    return
+                if stem_info:
+                    self.total_duration = stem_info['duration_ms']
                 pygame.mixer.music.load(target_file)
-                pygame.mixer.music.set_volume(self.cfg_volume_music)
+                pygame.mixer.music.set_volume(self.get_music_volume())
                 pygame.mixer.music.play(start=start_sec)
-                self.current_offset_ms = int(start_sec * 1000)
+                self.playback_clock.seek(current_time_ms)
                 self.current_track_type = target_type
         except Exception as e:
             print(f"Erro ao alternar áudio: {e}")
@@ -573,10 +804,18 @@ class KaraokePlayer:
 
         self.paused = not self.paused
         if self.paused:
-            pygame.mixer.music.pause()
+            if self.dual_active:
+                self.stem_player.pause()
+            else:
+                pygame.mixer.music.pause()
+            self.playback_clock.pause()
             self.scorer.set_paused(True) # Pause audio processing
         else:
-            pygame.mixer.music.unpause()
+            if self.dual_active:
+                self.stem_player.resume()
+            else:
+                pygame.mixer.music.unpause()
+            self.playback_clock.resume()
             self.scorer.set_paused(False) # Resume audio processing
 
     def draw_help_screen(self):
@@ -601,6 +840,7 @@ class KaraokePlayer:
             ("V", "Trocar Faixa de Áudio (Original/Instrumental)"),
             ("C", "Configurações (Audio/Video/Mic)"),
             ("H / F1", "Mostrar/Esconder esta ajuda"),
+            ("F3", "Diagnóstico de desempenho"),
             ("ESC", "Voltar / Sair da Ajuda")
         ]
         
@@ -610,8 +850,8 @@ class KaraokePlayer:
         for i, (key, desc) in enumerate(commands):
             y_pos = start_y + i * gap_y
             # Draw Key (Left aligned relative to center-ish)
-            key_surf = self.font_info.render(key, True, COLOR_HIGHLIGHT)
-            desc_surf = self.font_info.render(desc, True, COLOR_WHITE)
+            key_surf = self.text_cache.text(self.font_info, key, COLOR_HIGHLIGHT)
+            desc_surf = self.text_cache.text(self.font_info, desc, COLOR_WHITE)
             
             # Align them nicely
             key_x = W // 2 - int(250 * ui_scale)
@@ -634,11 +874,14 @@ class KaraokePlayer:
             self.cfg_volume_mic2
         )
         # Atualiza volume da música imediatamente se estiver tocando
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.set_volume(self.cfg_volume_music)
+        if self.music_busy():
+            self.update_music_volume()
 
     def handle_input(self, event):
         """Gerencia entradas do usuário para TODOS os estados."""
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.profiler.overlay = not self.profiler.overlay # Diagnóstico de desempenho
+            return
         if event.type == pygame.KEYDOWN:
             if self.state == "MENU":
                 if event.key == pygame.K_RETURN:
@@ -756,7 +999,7 @@ class KaraokePlayer:
             y_mus = start_y + 4 * gap_y
             if col_ctrl_x <= x <= col_ctrl_x + slider_w and y_mus <= y <= y_mus + 20:
                 self.cfg_volume_music = (x - col_ctrl_x) / slider_w
-                pygame.mixer.music.set_volume(self.cfg_volume_music)
+                self.update_music_volume()
 
             # Dificuldade (Ciclar)
             y_dif = start_y + 5 * gap_y
@@ -782,6 +1025,14 @@ class KaraokePlayer:
                 self.cfg_bg_mode = "GRADIENTE" if self.cfg_bg_mode == "IMAGEM" else "IMAGEM"
                 print(f"Modo Fundo alterado para: {self.cfg_bg_mode}")
                 self.load_random_background()
+
+            # Bloco do motor de áudio (ciclar tamanhos; reabre a saída)
+            y_blk = start_y + 9 * gap_y
+            if self.audio_engine and col_ctrl_x <= x <= col_ctrl_x + int(300*ui_scale) and y_blk <= y <= y_blk + btn_h_small:
+                idx = BLOCK_SIZES.index(self.cfg_engine_block) if self.cfg_engine_block in BLOCK_SIZES else 0
+                self.cfg_engine_block = BLOCK_SIZES[(idx + 1) % len(BLOCK_SIZES)]
+                self.audio_engine.open(self.cfg_engine_block)
+                self.scorer.set_monitor_sink(self.audio_engine) # Mics passam a ler no novo tamanho de bloco
                 
             self.apply_audio_config()
 
@@ -817,7 +1068,7 @@ class KaraokePlayer:
             if self.paused:
                 return # Skip logic update if paused
 
-            if not pygame.mixer.music.get_busy():
+            if not self.music_busy():
                 # Double check to prevent accidental finish if just buffer lag
                 # But mostly fine.
                 self.finish_song()
@@ -825,35 +1076,30 @@ class KaraokePlayer:
             
             current_time = self.get_current_time()
             
-            # Encontra linha atual
-            found_index = -1
-            for i, line in enumerate(self.lyrics):
-                if current_time >= line['time'] - 200: found_index = i
-                else: break
+            # Encontra linha atual (cursor monótono, O(1) amortizado)
+            tl = self.timeline
+            found_index = tl.line_at(current_time)
             
-            # Paginação (Cascading Page Flip)
-            if not hasattr(self, 'page_index'): self.page_index = 0
-            
-            if self.page_index < len(self.lyrics):
-                 line = self.lyrics[self.page_index]
-                 line_end = line.get('end_time', line['time'] + 5000)
-                 
-                 # Only advance if we have passed the end time (Immediate flip)
-                 if current_time > line_end:
-                     self.page_index += 1
+            # Paginação (Cascading Page Flip): trocas pré-calculadas na agenda,
+            # flip imediato ao passar do fim da linha
+            self.page_index = self.schedule.page_at(current_time)
 
             self.current_line_index = found_index
             
-            # Sincroniza Scorer
-            if 0 <= self.current_line_index < len(self.lyrics):
-                l = self.lyrics[self.current_line_index]
-                end_time = l.get('end_time', l['time'] + 5000)
-                in_segment = l['time'] <= current_time <= end_time
+            # Próxima da fila sendo preparada enquanto esta toca
+            self.prefetch_next()
+
+            # Sincroniza Scorer (o tempo da música ele lê direto do relógio de reprodução)
+            if 0 <= self.current_line_index < len(tl):
+                i = self.current_line_index
+                in_segment = tl.starts[i] <= current_time <= tl.ends[i]
                 self.scorer.set_singing_segment(in_segment)
             else:
                  self.scorer.set_singing_segment(False)
 
         elif self.state == "SCORE":
+            self.prefetch_next()
+
             # Auto-advance after 10 seconds or if skip requested
             time_elapsed = time.time() - getattr(self, 'score_start_time', 0)
             
@@ -868,7 +1114,6 @@ class KaraokePlayer:
                      self.start_song(next_song)
                      self.page_index = 0
                      self.current_track_type = 'instrumental'
-                     self.current_offset_ms = 0
                 else:
                      self.state = "MENU"
 
@@ -878,38 +1123,80 @@ class KaraokePlayer:
                 self.start_song(next_song)
                 self.page_index = 0 
                 self.current_track_type = 'instrumental'
-                self.current_offset_ms = 0
 
     def finish_song(self):
+        self.playback_clock.stop()
+        self.stem_player.stop()
         self.scorer.set_paused(True) # Pausa audio processamento de forma segura
         # Aguarda brevemente para thread liberar
         time.sleep(0.1) 
         self.scorer.stop_streams() # Fecha streams agora que está pausado
         self.score_result = self.scorer.get_score()
+        print(f"Desempenho: layout {getattr(self, 'layout_time_ms', 0):.1f} ms ({len(self.lyrics)} linhas), frame médio {self.frame_time_ms:.2f} ms")
         self.state = "SCORE"
         self.score_start_time = time.time()
         self.paused = False # Reset pause state
 
+    def static_signature(self):
+        """
+        Assinatura das telas sem animação (menu, pontuação, pausa).
+        Se não mudou desde o último frame, o draw não precisa fazer nada.
+        None = tela animada/interativa (sempre redesenha).
+        """
+        size = self.screen.get_size()
+        if self.state == "MENU":
+            return ("MENU", size, tuple(self.queue), self.input_buffer, self.show_help)
+        if self.state == "SCORE":
+            remaining = max(0, 10 - int(time.time() - getattr(self, 'score_start_time', 0)))
+            return ("SCORE", size, self.score_result, remaining, self.show_help)
+        if self.state == "PLAYING" and self.paused:
+            return ("PAUSED", size, self.get_current_time(), self.input_buffer, self.show_help)
+        return None
+
     def draw(self):
-        """Renderização."""
+        """
+        Renderização.
+
+        Com cfg_dirty_rects, o frame completo só é redesenhado quando o estado
+        ou a resolução mudam; durante a música, o fundo composto é restaurado
+        sob as regiões do frame anterior e só as regiões alteradas são enviadas
+        com display.update(). Telas estáticas sem mudança não são redesenhadas.
+        """
         W, H = self.screen.get_width(), self.screen.get_height()
+        # Se mudou resolução, re-renderiza o fundo para ficar HD
+        if self.state != "CONFIG" and self.background and self.background.get_size() != (W, H):
+            self.render_background()
+        if not hasattr(self, 'composite'):
+            self.render_background()
+
+        sig = self.static_signature()
+        if sig is not None:
+            # Overlay de desempenho ligado: a tela parada muda quando o resumo é atualizado
+            sig += (self.profiler.overlay, self.profiler.overlay and self.profiler.last_refresh)
+        if (self.cfg_dirty_rects and sig is not None and sig == self._last_static_sig
+                and not self.force_full_redraw):
+            return
+        self._last_static_sig = sig
+
+        mode_key = (self.state, W, H, self.paused, self.show_help)
+        full = (not self.cfg_dirty_rects or self.force_full_redraw or mode_key != self._last_mode_key
+                or self.state != "PLAYING" or self.paused or self.show_help)
+        self._last_mode_key = mode_key
+        self.force_full_redraw = False
+
+        prev_rects = self.dirty_rects
+        self.dirty_rects = []
+
         # Fundo
         if self.state == "CONFIG":
              self.screen.fill((20, 20, 30)) # Fundo escuro tecnico
+        elif full:
+            self.screen.blit(self.composite, (0, 0))
         else:
-            if self.background: 
-                # Se mudou resolução, re-renderiza para ficar HD
-                if self.background.get_size() != (W, H):
-                    self.render_background()
-                self.screen.blit(self.background, (0,0))
-            
-            # Overlay otimizado
-            if hasattr(self, 'overlay'):
-                 self.screen.blit(self.overlay, (0,0))
-            else:
-                 # Fallback temporário
-                 self.render_background()
-                 if hasattr(self, 'overlay'): self.screen.blit(self.overlay, (0,0))
+            # Restaura o fundo só onde algo foi desenhado no frame anterior
+            for r in prev_rects:
+                self.screen.blit(self.composite, r, r)
+        self.profiler.mark("fundo")
 
         if self.state == "MENU":
             # Escala UI baseada na altura (768p referencia)
@@ -924,8 +1211,8 @@ class KaraokePlayer:
             # Instrução visual substitui lista antiga
             self.draw_centered_text("Consulte o catálogo físico ou app", int(200 * ui_scale), color=(150,150,150))
 
-            input_surf = self.font_info.render(f"Entrada: {self.input_buffer}", True, COLOR_HIGHLIGHT)
-            self.screen.blit(input_surf, (50, H - 50))
+            input_surf = self.text_cache.text(self.font_info, f"Entrada: {self.input_buffer}", COLOR_HIGHLIGHT)
+            self.mark_dirty(self.screen.blit(input_surf, (50, H - 50)))
 
         elif self.state == "PLAYING":
             # --- RENDERIZAÇÃO KARAOKE REFINADA ---
@@ -940,119 +1227,59 @@ class KaraokePlayer:
             
             current_time = self.get_current_time()
             
-            # 2. TITLE CARD (0s - 5s)
-            if current_time < 5000 and self.current_song:
-                alpha = 255
-                if current_time > 4000: # Fade out last second
-                    alpha = int(255 * (1 - (current_time - 4000)/1000.0))
+            # Estado de exibição pré-compilado (página, pontos, banner, título)
+            st = self.schedule.at(current_time)
+            page = st.page
+
+            # 2. TITLE CARD (0s - 5s, fade no último segundo)
+            if st.title_alpha > 10 and self.current_song:
+                title = self.current_song.get('title', '')
+                artist = self.current_song.get('artist', '')
                 
-                if alpha > 10:
-                    # Create a surface for the Title Card to handle Alpha
-                    title_surf = pygame.Surface((W, 200), pygame.SRCALPHA)
-                    title = self.current_song.get('title', '')
-                    artist = self.current_song.get('artist', '')
-                    
-                    # Layout: Title at 18%, Lyrics at 45%
-                    # Use LARGER font for Title (font_lyrics is biggest)
-                    title_y = int(H * 0.18)
-                    artist_y = int(H * 0.25)
-                    
-                    self.draw_text_with_outline(title, self.font_lyrics, COLOR_HIGHLIGHT, (W//2, title_y))
-                    self.draw_text_with_outline(artist, self.font_info, COLOR_WHITE, (W//2, artist_y))
+                # Layout: Title at 18%, Lyrics at 45%
+                # Use LARGER font for Title (font_lyrics is biggest)
+                title_y = int(H * 0.18)
+                artist_y = int(H * 0.25)
+                
+                self.draw_text_with_outline(title, self.font_lyrics, COLOR_HIGHLIGHT, (W//2, title_y))
+                self.draw_text_with_outline(artist, self.font_info, COLOR_WHITE, (W//2, artist_y))
 
             # 3. CUE DOTS (4s Countdown)
-            next_start = None
-            if hasattr(self, 'page_index') and self.page_index < len(self.lyrics):
-                 next_start = self.lyrics[self.page_index]['time']
-            
-            if next_start:
-                 time_to = (next_start - current_time) / 1000.0
-                 if 0 < time_to <= 4.0:
-                     # Check layout validity
-                     is_valid_gap = (self.page_index == 0) # Prioritize intro
-                     if not is_valid_gap and self.page_index > 0:
-                         prev_end = self.lyrics[self.page_index-1].get('end_time', 0)
-                         if (next_start - prev_end) > 6000: is_valid_gap = True
-                     
-                     if is_valid_gap:
-                         dot_radius = int(10 * ui_scale)
-                         dot_spacing = int(40 * ui_scale)
-                         start_x = W//2 - (1.5 * dot_spacing)
-                         y_dots = active_y - int(60 * ui_scale)
-                         
-                         for i in range(4): # 0, 1, 2, 3
-                             cx = int(start_x + i * dot_spacing)
-                             # Time mapping: 4.0->0, 3.0->1, 2.0->2, 1.0->3
-                             # i=0 lit if time <= 4.0? No, that's always.
-                             # Reverse logic:
-                             # 4.0 - 3.0: 1st dot (i=0) ONLY? Or 1st dot fills?
-                             # Let's do: 
-                             # 4s -> 0 lit
-                             # 3s -> 0,1 lit
-                             # 2s -> 0,1,2 lit
-                             # 1s -> 0,1,2,3 lit
-                             
-                             threshold = 4.0 - i
-                             # Example: T=3.5. 3.5 <= 4.0 (0=True). 3.5 <= 3.0 (1=False).
-                             # So at 3.5s (start of count), only 1st dot is set. Correct.
-                             
-                             is_lit = time_to <= threshold
-                             
-                             # Draw Empty Circle (Stroke)
-                             pygame.draw.circle(self.screen, (255,255,255), (cx, y_dots), dot_radius, 2)
-                             
-                             if is_lit:
-                                 color = COLOR_BLUE if i < 3 else COLOR_RED
-                                 pygame.draw.circle(self.screen, color, (cx, y_dots), dot_radius - 2)
+            # 4s -> 1 aceso, 3s -> 2, 2s -> 3, 1s -> 4 (calculado na agenda)
+            if st.dots_lit:
+                dot_radius = int(10 * ui_scale)
+                dot_spacing = int(40 * ui_scale)
+                start_x = W//2 - (1.5 * dot_spacing)
+                y_dots = active_y - int(60 * ui_scale)
+                
+                for i in range(4): # 0, 1, 2, 3
+                    cx = int(start_x + i * dot_spacing)
+                    
+                    # Draw Empty Circle (Stroke)
+                    self.mark_dirty(pygame.draw.circle(self.screen, (255,255,255), (cx, y_dots), dot_radius, 2))
+                    
+                    if i < st.dots_lit:
+                        color = COLOR_BLUE if i < 3 else COLOR_RED
+                        pygame.draw.circle(self.screen, color, (cx, y_dots), dot_radius - 2)
 
             # 4. DRAW LYRICS LINES
             # Current Line (Active) - Top
-            if hasattr(self, 'page_index') and self.page_index < len(self.lyrics):
-                line_data = self.lyrics[self.page_index]
-                
-                # Check visibility: Hide if finished for > 1s
-                # AND Hide if it starts too far in future (Instrumental Break)
-                end_t = line_data.get('end_time', line_data['time'] + 5000)
-                
-                # Default visibility: 8s before start
-                vis_threshold = 8000
-                
-                # Check if it's a long intro/break
-                if self.page_index == 0:
-                     vis_threshold = 4000 # Intro strict
-                elif self.page_index > 0:
-                     prev_end = self.lyrics[self.page_index-1].get('end_time', 0)
-                     if (line_data['time'] - prev_end) > 8000:
-                         vis_threshold = 4000 # Instrumental strict (sync with dots)
-
-                is_time_to_show = (line_data['time'] - current_time <= vis_threshold)
-                has_not_ended = (current_time <= end_t + 1000)
-                
-                if has_not_ended and is_time_to_show:
-                    if 'words' in line_data: 
-                        self.draw_karaoke_line(line_data, current_time, active_y, is_active=True) 
-                    else: 
-                         self.draw_text_with_outline(line_data['text'], self.font_lyrics, COLOR_HIGHLIGHT, (W//2, active_y))
+            # Visível de vis_threshold antes do início até 1s após o fim
+            if st.show_active:
+                if self.lyrics.has_words(page):
+                    self.draw_karaoke_line(page, current_time, active_y, is_active=True) 
+                else: 
+                     self.draw_text_with_outline(self.lyrics.text(page), self.font_lyrics, COLOR_HIGHLIGHT, (W//2, active_y))
 
             # Next Line (Preview) - Bottom
-            if hasattr(self, 'page_index') and self.page_index + 1 < len(self.lyrics):
-                line_data = self.lyrics[self.page_index + 1]
-                
-                # Determine visibility threshold
-                # If it's a long gap (Instrumental), show only when dots appear (4s).
-                # Otherwise, show early (8s) for reading.
-                vis_threshold = 8000
-                if hasattr(self, 'page_index') and self.page_index >= 0:
-                     curr_end = self.lyrics[self.page_index].get('end_time', 0)
-                     gap = line_data['time'] - curr_end
-                     if gap > 8000: vis_threshold = 4000 # Sync with dots for instrumental
-                
-                # Check visibility
-                if line_data['time'] - current_time <= vis_threshold:
-                    if 'words' in line_data: 
-                        self.draw_karaoke_line(line_data, current_time, next_y, is_active=False) 
-                    else: 
-                        self.draw_text_with_outline(line_data['text'], self.font_lyrics, (200,200,200), (W//2, next_y))
+            # Após pausa instrumental só aparece junto com os pontos (4s); senão 8s antes
+            if st.show_preview:
+                if self.lyrics.has_words(page + 1):
+                    self.draw_karaoke_line(page + 1, current_time, next_y, is_active=False) 
+                else: 
+                    self.draw_text_with_outline(self.lyrics.text(page + 1), self.font_lyrics, (200,200,200), (W//2, next_y))
+
+            self.profiler.mark("letras")
 
             # HUD Futurista (VU Meter e Ritmo)
             self.draw_vu_meter_hud()
@@ -1062,14 +1289,12 @@ class KaraokePlayer:
             self.draw_ui_progress()
 
             if self.input_buffer:
-                input_surf = self.font_info.render(f"Add Fila: {self.input_buffer}", True, COLOR_WHITE)
-                self.screen.blit(input_surf, (20, H - 40))
+                input_surf = self.text_cache.text(self.font_info, f"Add Fila: {self.input_buffer}", COLOR_WHITE)
+                self.mark_dirty(self.screen.blit(input_surf, (20, H - 40)))
 
-            # Instrumental Progress
-            if next_start and current_time < next_start:
-                 gap = next_start - current_time
-                 if gap > 8000 and self.page_index > 0: # Only if not intro
-                      self.draw_text_with_outline("INSTRUMENTAL", self.font_info, (100,200,255), (W//2, H//2))
+            # Instrumental Progress (fora da intro, enquanto faltar mais de 8s)
+            if st.banner:
+                self.draw_text_with_outline("INSTRUMENTAL", self.font_info, (100,200,255), (W//2, H//2))
 
         elif self.state == "SCORE":
             self.draw_centered_text("MÚSICA FINALIZADA", -50)
@@ -1092,20 +1317,65 @@ class KaraokePlayer:
         if self.show_help:
             self.draw_help_screen()
 
-        pygame.display.flip()
+        if self.profiler.overlay:
+            self.draw_perf_overlay()
+        self.profiler.mark("hud")
 
-    def draw_karaoke_line(self, line_data, current_time, center_y, is_active=True):
+        if full:
+            pygame.display.flip()
+        else:
+            pygame.display.update(prev_rects + self.dirty_rects)
+        self.profiler.mark("flip")
+
+    def perf_counters(self):
+        """Contadores de fora do frame para o overlay/log de desempenho (scorer, saída de áudio, API)."""
+        loop_ms, loop_max_ms, overflows = self.scorer.get_loop_stats()
+        counters = {
+            'scorer_loop_ms': loop_ms,
+            'scorer_loop_max_ms': loop_max_ms,
+            'input_overflows': overflows,
+            'api_requests': self.api.request_count,
+        }
+        if self.audio_engine:
+            counters['output_underruns'] = self.audio_engine.underruns
+            counters['output_latency_ms'] = self.audio_engine.latency_ms
+        return counters
+
+    def draw_perf_overlay(self):
+        """Painel de diagnóstico (F3). O texto só é refeito quando o resumo muda (~4x/s)."""
+        if self.perf_overlay_surf is None or self.perf_overlay_time != self.profiler.last_refresh:
+            font = self.font_small
+            rows = [(font.render(label, True, COLOR_HIGHLIGHT), font.render(value, True, COLOR_WHITE))
+                    for label, value in self.profiler.overlay_lines()]
+            pad = 8
+            line_h = font.get_linesize()
+            col_x = pad + max(lbl.get_width() for lbl, _ in rows) + pad # Valores alinhados em coluna
+            width = col_x + max(val.get_width() for _, val in rows) + pad
+            panel = pygame.Surface((width, line_h * len(rows) + 2 * pad), pygame.SRCALPHA)
+            panel.fill((0, 0, 0, 180))
+            for i, (lbl, val) in enumerate(rows):
+                panel.blit(lbl, (pad, pad + i * line_h))
+                panel.blit(val, (col_x, pad + i * line_h))
+            self.perf_overlay_surf = panel
+            self.perf_overlay_time = self.profiler.last_refresh
+        self.mark_dirty(self.screen.blit(self.perf_overlay_surf, (10, 10)))
+
+    def build_line_layout(self, line_index):
         """
-        Desenha linha de karaokê com Wipe (Máscara) e Outlines.
-        center_y: Y absoluto central.
+        Calcula o plano de layout de uma linha com palavras: quebra em linhas
+        visuais e posição/largura de cada palavra. Depende só do texto, da
+        fonte e do tamanho da tela, então roda no carregamento e no resize.
+        Retorna lista de (índice da palavra, texto, x, dy, largura, altura), com dy relativo ao centro.
         """
-        words = line_data.get('words', [])
-        if not words: return
+        lyrics = self.lyrics
+        words = lyrics.words(line_index)
+        if not words: return None
 
         W, H = self.screen.get_width(), self.screen.get_height()
         ui_scale = H / 768.0
         
-        space_width = self.font_lyrics.size(" ")[0]
+        cache = self.text_cache
+        space_width = cache.size(self.font_lyrics, " ")[0]
         margin = int(100 * ui_scale)
         max_width = W - margin
         
@@ -1115,8 +1385,8 @@ class KaraokePlayer:
         current_line_width = 0
         
         for w in words:
-            word_txt = w['display']
-            word_surf_w = self.font_lyrics.size(word_txt)[0]
+            word_txt = lyrics.word(w)
+            word_surf_w = cache.size(self.font_lyrics, word_txt)[0]
             
             if current_line_width + word_surf_w > max_width and current_line_words:
                 visual_lines.append(current_line_words)
@@ -1129,12 +1399,54 @@ class KaraokePlayer:
         if current_line_words:
             visual_lines.append(current_line_words)
             
-        # 2. Geometria Vertical
+        # 2. Geometria Vertical (relativa ao centro do bloco)
         line_height = self.font_lyrics.get_linesize()
         total_block_height = len(visual_lines) * line_height
+        current_dy = -(total_block_height // 2)
         
-        start_y = center_y - (total_block_height // 2)
-        current_y = start_y
+        # 3. Posições horizontais (centralizadas)
+        plan = []
+        for v_line in visual_lines:
+            line_w = 0
+            for w in v_line:
+                line_w += cache.size(self.font_lyrics, lyrics.word(w))[0] + space_width
+            line_w -= space_width
+            
+            current_x = (W - line_w) // 2
+            for w in v_line:
+                txt = lyrics.word(w)
+                w_w, w_h = cache.size(self.font_lyrics, txt)
+                plan.append((w, txt, current_x, current_dy, w_w, w_h))
+                current_x += w_w + space_width
+            
+            current_dy += line_height
+        return plan
+
+    def build_layout(self):
+        """(Re)calcula os planos de layout de todas as linhas. Chamado ao carregar letras e no resize."""
+        t0 = time.perf_counter()
+        self.layout_plans = [self.build_line_layout(i) for i in range(len(self.lyrics))]
+        self.layout_key = (id(self.lyrics), self.screen.get_size(), id(self.font_lyrics))
+        self.layout_time_ms = (time.perf_counter() - t0) * 1000
+        print(f"Layout: {len(self.lyrics)} linhas em {self.layout_time_ms:.1f} ms")
+
+    def get_line_layout(self, index):
+        """Plano da linha index (recalcula tudo se letras, tela ou fonte mudaram)."""
+        key = (id(self.lyrics), self.screen.get_size(), id(self.font_lyrics))
+        if getattr(self, 'layout_key', None) != key:
+            self.build_layout()
+        return self.layout_plans[index]
+
+    def draw_karaoke_line(self, line_index, current_time, center_y, is_active=True):
+        """
+        Desenha linha de karaokê com Wipe (Máscara) e Outlines.
+        Usa o plano pré-calculado: por frame só calcula o preenchimento e faz blit.
+        center_y: Y absoluto central.
+        """
+        plan = self.get_line_layout(line_index)
+        if not plan: return
+
+        cache = self.text_cache
         
         # Cores
         inactive_color = (200, 200, 200) # Cinza claro
@@ -1143,64 +1455,40 @@ class KaraokePlayer:
         
         active_color = COLOR_HIGHLIGHT # Dourado
         outline_color = (0, 0, 0)
+        word_start = self.lyrics.word_start
+        word_end = self.lyrics.word_end
         
-        # 3. Desenhar
-        for v_line in visual_lines:
-            # Largura total para centralizar
-            line_w = 0
-            for w in v_line:
-                line_w += self.font_lyrics.size(w['display'])[0] + space_width
-            line_w -= space_width
+        for w, txt, x, dy, w_w, w_h in plan:
+            y = center_y + dy
             
-            start_x = (W - line_w) // 2
-            current_x = start_x
+            # A. Base (Inactive) com Outline já embutido (renderizado uma vez e reutilizado)
+            ow = self.cfg_outline_width
+            s_base = cache.outlined(self.font_lyrics, txt, inactive_color, outline_color, ow)
+            self.mark_dirty(self.screen.blit(s_base, (x - ow, y - ow)))
             
-            # Para cada palavra, renderizar Base + Wipe
-            for w in v_line:
-                txt = w['display']
-                w_w, w_h = self.font_lyrics.size(txt)
-                
-                # A. Base (Inactive) com Outline
-                # Desenha outline em loop
-                for dx in [-2, 0, 2]:
-                    for dy in [-2, 0, 2]:
-                        if dx!=0 or dy!=0:
-                            s_out = self.font_lyrics.render(txt, True, outline_color)
-                            self.screen.blit(s_out, (current_x + dx, current_y + dy))
-                
-                # Inactive Fill
-                s_inact = self.font_lyrics.render(txt, True, inactive_color)
-                self.screen.blit(s_inact, (current_x, current_y))
+            # B. Active Wipe (Se for a linha ativa)
+            if is_active:
+                # Calcula % de preenchimento
+                # Se passou do fim: 100%
+                # Se antes do inicio: 0%
+                # No meio: interpola
                 
-                # B. Active Wipe (Se for a linha ativa)
-                if is_active:
-                    # Calcula % de preenchimento
-                    # Se passou do fim: 100%
-                    # Se antes do inicio: 0%
-                    # No meio: interpola
-                    
-                    fill_pct = 0.0
-                    if current_time >= w['end_ms']:
-                        fill_pct = 1.0
-                    elif current_time > w['start_ms']:
-                        duration = w['end_ms'] - w['start_ms']
-                        if duration > 0:
-                            fill_pct = (current_time - w['start_ms']) / duration
-                    
-                    if fill_pct > 0:
-                        # Renderiza Active Surface
-                        s_act = self.font_lyrics.render(txt, True, active_color)
-                        
-                        # Cria Rect de recorte
-                        # Queremos blitar s_act sobre s_inact, mas apenas os primeiros (width * fill_pct) pixels
-                        fill_width = int(w_w * fill_pct)
-                        if fill_width > 0:
-                            area = pygame.Rect(0, 0, fill_width, w_h)
-                            self.screen.blit(s_act, (current_x, current_y), area)
+                fill_pct = 0.0
+                w_start, w_end = word_start[w], word_end[w]
+                if current_time >= w_end:
+                    fill_pct = 1.0
+                elif current_time > w_start:
+                    duration = w_end - w_start
+                    if duration > 0:
+                        fill_pct = (current_time - w_start) / duration
                 
-                current_x += w_w + space_width
-            
-            current_y += line_height
+                if fill_pct > 0:
+                    # Blita só os primeiros (largura * fill_pct) pixels da superfície ativa
+                    fill_width = int(w_w * fill_pct)
+                    if fill_width > 0:
+                        s_act = cache.text(self.font_lyrics, txt, active_color)
+                        area = pygame.Rect(0, 0, fill_width, w_h)
+                        self.screen.blit(s_act, (x, y), area)
         
     def draw_countdown_indicator(self, remaining_sec):
         """Desenha um indicador circular de contagem regressiva."""
@@ -1224,12 +1512,12 @@ class KaraokePlayer:
         pygame.draw.circle(self.screen, color, (center_x, center_y), radius, width=int(3*ui_scale))
         
         # Texto número
-        txt_surf = self.font_info.render(text, True, color)
+        txt_surf = self.text_cache.text(self.font_info, text, color)
         txt_rect = txt_surf.get_rect(center=(center_x, center_y))
         self.screen.blit(txt_surf, txt_rect)
         
         # Label "PREPARE-SE"
-        lbl_surf = self.font_info.render("PRÓXIMA FRASE", True, (200,200,200))
+        lbl_surf = self.text_cache.text(self.font_info, "PRÓXIMA FRASE", (200,200,200))
         lbl_rect = lbl_surf.get_rect(center=(center_x, center_y - radius - int(20 * ui_scale)))
         self.screen.blit(lbl_surf, lbl_rect)
         
@@ -1256,7 +1544,7 @@ class KaraokePlayer:
         max_h = int(150 * ui_scale)
         
         # Barra de Fundo
-        pygame.draw.rect(self.screen, (50, 50, 50), (base_x, base_y - max_h, bar_w, max_h))
+        self.mark_dirty(pygame.draw.rect(self.screen, (50, 50, 50), (base_x, base_y - max_h, bar_w, max_h)))
         
         # Barra Dinâmica
         if height_val > 0:
@@ -1271,11 +1559,11 @@ class KaraokePlayer:
             s = pygame.Surface((glow_w, height_val))
             s.set_alpha(50)
             s.fill(color)
-            self.screen.blit(s, (base_x - int(10*ui_scale), base_y - height_val))
+            self.mark_dirty(self.screen.blit(s, (base_x - int(10*ui_scale), base_y - height_val)))
 
         # Texto "MIC"
-        mic_txt = self.font_small.render("MIC", True, COLOR_WHITE)
-        self.screen.blit(mic_txt, (base_x, base_y + int(5 * ui_scale)))
+        mic_txt = self.text_cache.text(self.font_small, "MIC", COLOR_WHITE)
+        self.mark_dirty(self.screen.blit(mic_txt, (base_x, base_y + int(5 * ui_scale))))
 
     def draw_rhythm_indicator_hud(self):
         """Indicador circular de precisão."""
@@ -1292,7 +1580,7 @@ class KaraokePlayer:
         thickness = max(1, int(3 * ui_scale))
         
         # Círculo base
-        pygame.draw.circle(self.screen, (50, 50, 50), (cx, cy), radius, thickness)
+        self.mark_dirty(pygame.draw.circle(self.screen, (50, 50, 50), (cx, cy), radius, thickness))
         
         # Círculo de Precisão
         if acc > 0.8: color = COLOR_GREEN
@@ -1304,8 +1592,8 @@ class KaraokePlayer:
         if fill_rad > 0:
              pygame.draw.circle(self.screen, color, (cx, cy), fill_rad)
         
-        lbl = self.font_small.render("RITMO", True, COLOR_WHITE)
-        self.screen.blit(lbl, (cx - int(20*ui_scale), cy + radius + int(5*ui_scale)))
+        lbl = self.text_cache.text(self.font_small, "RITMO", COLOR_WHITE)
+        self.mark_dirty(self.screen.blit(lbl, (cx - int(20*ui_scale), cy + radius + int(5*ui_scale))))
 
 
     def draw_ui_progress(self):
@@ -1326,8 +1614,8 @@ class KaraokePlayer:
             return f"{m:02}:{sec:02}"
             
         txt = f"{fmt_time(curr_sec)} / {fmt_time(total_sec)}"
-        surf = self.font_info.render(txt, True, COLOR_WHITE)
-        self.screen.blit(surf, (int(20*ui_scale), H - int(70 * ui_scale)))
+        surf = self.text_cache.text(self.font_info, txt, COLOR_WHITE)
+        self.mark_dirty(self.screen.blit(surf, (int(20*ui_scale), H - int(70 * ui_scale))))
         
         # Progress Bar
         bar_w = W - int(200 * ui_scale)
@@ -1335,7 +1623,7 @@ class KaraokePlayer:
         bar_x = int(100 * ui_scale)
         bar_y = H - int(30 * ui_scale)
         
-        pygame.draw.rect(self.screen, (50,50,50), (bar_x, bar_y, bar_w, bar_h))
+        self.mark_dirty(pygame.draw.rect(self.screen, (50,50,50), (bar_x, bar_y, bar_w, bar_h)))
         
         if self.total_duration > 0:
             pct = min(1.0, curr_ms / self.total_duration)
@@ -1456,6 +1744,17 @@ class KaraokePlayer:
         pygame.draw.rect(self.screen, (100,0,100), (col_ctrl_x, y_bg, int(200*ui_scale), btn_h_small))
         bg_txt = font.render(self.cfg_bg_mode, True, COLOR_WHITE)
         self.screen.blit(bg_txt, (col_ctrl_x + int(20*ui_scale), y_bg + int(5*ui_scale)))
+
+        # Motor de áudio: bloco e latência real de saída
+        y_blk = start_y + 9 * gap_y
+        self.screen.blit(font.render("Bloco de Áudio:", True, COLOR_WHITE), (col_lbl_x, y_blk))
+        if self.audio_engine:
+            blk_label = f"{self.cfg_engine_block}  (saída {self.audio_engine.latency_ms:.0f} ms)"
+        else:
+            blk_label = "pygame.mixer"
+        pygame.draw.rect(self.screen, (0,100,100), (col_ctrl_x, y_blk, int(300*ui_scale), btn_h_small))
+        blk_txt = font.render(blk_label, True, COLOR_WHITE)
+        self.screen.blit(blk_txt, (col_ctrl_x + int(20*ui_scale), y_blk + int(5*ui_scale)))
         
         # VU Meters na Config para teste
         # Mic 1
@@ -1497,10 +1796,16 @@ class KaraokePlayer:
         Função auxiliar para desenhar texto centralizado com quebra de linha.
         """
         font = self.font_lyrics
-        if size: font = pygame.font.Font(None, size)
+        if size: font = self.get_font(size)
         
         max_w = self.screen.get_width() - 100 # Margem
-        lines = self.wrap_text(text, font, max_w)
+        wrap_key = (text, id(font), max_w)
+        lines = self.wrap_cache.get(wrap_key)
+        if lines is None:
+            if len(self.wrap_cache) > 256:
+                self.wrap_cache.clear() # Textos dinâmicos (fila, timer) não crescem sem limite
+            lines = self.wrap_text(text, font, max_w)
+            self.wrap_cache[wrap_key] = lines
         
         # Calcula altura total para centralizar o bloco
         line_height = font.get_linesize()
@@ -1509,40 +1814,95 @@ class KaraokePlayer:
         start_y = (self.screen.get_height() // 2) + y_offset - (total_height // 2)
         
         for i, line in enumerate(lines):
-            surface = font.render(line, True, color)
+            surface = self.text_cache.text(font, line, color)
             rect = surface.get_rect(center=(self.screen.get_width() // 2, start_y + i * line_height))
-            self.screen.blit(surface, rect)
+            self.mark_dirty(self.screen.blit(surface, rect))
+
+    def next_frame_delay(self):
+        """
+        Tempo (ms) até o próximo frame necessário no estado atual.
+        Taxa cheia só com wipe ou medidores em movimento; fora disso o loop
+        dorme até o próximo evento da letra (ou um teto fixo).
+        """
+        frame_ms = 1000 // FPS
+        if self.state == "PLAYING" and not self.paused:
+            now = self.get_current_time()
+            mic_active = max(self.scorer.current_volume_mic1, self.scorer.current_volume_mic2) * 5 >= 1
+            if mic_active or self._meter_was_active or self.schedule.is_animating(now):
+                # Um frame extra após o mic silenciar para zerar o VU
+                self._meter_was_active = mic_active
+                return frame_ms
+            next_event = self.schedule.next_event_after(now)
+            if next_event is not None:
+                return max(frame_ms, min(IDLE_FRAME_MS, next_event - now))
+            return IDLE_FRAME_MS
+        if self.state == "CONFIG":
+            return 1000 // CONFIG_FPS
+        return STATIC_FRAME_MS
+
+    def resize(self, w, h):
+        """Nova resolução da janela: fontes, layout e fundo na escala nova."""
+        # Atualiza display surface
+        self.screen = pygame.display.set_mode((w, h), pygame.RESIZABLE)
+
+        # Calcula nova escala baseada na altura (768p base)
+        scale = h / 768.0
+        # Limita escala minima para não ficar ilegível
+        scale = max(0.8, scale)
+
+        self.init_fonts(scale)
+        self.build_layout() # Layout depende da largura e da fonte
+        self.render_background() # Regenera background na nova resolução (mantendo cores)
+        if not self.headless:
+            # Derivados só na resolução atual (os de outros tamanhos são removidos)
+            self.bg_cache.build_async(self.bg_images, [(w, h)])
 
     def run(self):
         """Loop principal com tratamento de falhas."""
         try:
             running = True
+            waited = [] # Evento que acordou o loop durante a espera
             while running:
-                for event in pygame.event.get():
+                self.profiler.begin_frame()
+                events = waited + pygame.event.get()
+                waited = []
+                for event in events:
                     if event.type == pygame.QUIT:
                         running = False
                     elif event.type == pygame.VIDEORESIZE:
-                         # Atualiza display surface
-                         self.screen = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
-                         
-                         # Calcula nova escala baseada na altura (768p base)
-                         scale = event.h / 768.0
-                         # Limita escala minima para não ficar ilegível
-                         scale = max(0.8, scale)
-                         
-                         self.init_fonts(scale)
-                         self.render_background() # Regenera background na nova resolução (mantendo cores)
+                         self.resize(event.w, event.h)
                     self.handle_input(event)
+                self.profiler.mark("eventos")
 
                 self.update()
+                self.profiler.mark("update")
+                t0 = time.perf_counter()
                 self.draw()
-                self.clock.tick(FPS)
+                # Custo de frame (média móvel), reportado separado do custo de layout
+                self.frame_time_ms = 0.95 * self.frame_time_ms + 0.05 * (time.perf_counter() - t0) * 1000
+                self.profiler.end_frame()
+
+                # Frame pacing adaptativo: telas paradas bloqueiam em eventos com timeout
+                delay = self.next_frame_delay()
+                if delay > 1000 // FPS:
+                    timeout = max(1, delay - self.clock.tick())
+                    event = pygame.event.wait(timeout)
+                    if event.type != pygame.NOEVENT:
+                        waited.append(event)
+                    self.clock.tick()
+                else:
+                    self.clock.tick(FPS)
         except Exception as e:
             print(f"CRASH DETECTADO: {e}")
             import traceback
             traceback.print_exc()
         finally:
             print("Encerrando aplicação...")
+            self.bg_loader.stop()
+            self.prefetcher.stop()
+            self.stem_player.stop()
+            if self.audio_engine:
+                self.audio_engine.close()
             self.scorer.shutdown()
             pygame.quit()
             sys.exit()
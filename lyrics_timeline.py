@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import json
+import bisect
+from array import array
+
+DEFAULT_LINE_MS = 5000 # Duração assumida para linhas sem end_time (LRC)
+LEAD_MS = 200 # A linha "atual" muda um pouco antes do início (antecipação visual)
+LRC_LINE = re.compile(r'\[(\d+):(\d+\.\d+)\](.*)')
+
+
+class LyricsData:
+    """
+    Letra em forma compacta: arrays paralelos em vez de um dict por linha e palavra.
+
+    Linhas: line_start/line_end (ms), line_text (id na tabela de textos) e
+    word_first (a linha i tem as palavras word_first[i] até word_first[i+1]-1).
+    Palavras: word_start/word_end (ms) e word_text. Cada texto distinto fica
+    uma vez só em `strings` (internado), então refrões repetidos não ocupam
+    memória de novo. É a única representação usada pelo renderer, pela
+    timeline (scorer) e pela API.
+    """
+    __slots__ = ('strings', '_string_ids', 'line_start', 'line_end', 'line_text',
+                 'word_first', 'word_start', 'word_end', 'word_text')
+
+    def __init__(self):
+        self.strings = []
+        self._string_ids = {}
+        self.line_start = array('d')
+        self.line_end = array('d')
+        self.line_text = array('i')
+        self.word_first = array('i', [0])
+        self.word_start = array('d')
+        self.word_end = array('d')
+        self.word_text = array('i')
+
+    def _intern(self, text):
+        sid = self._string_ids.get(text)
+        if sid is None:
+            sid = len(self.strings)
+            self.strings.append(sys.intern(text))
+            self._string_ids[text] = sid
+        return sid
+
+    def add_line(self, start_ms, end_ms, text, words=()):
+        """Acrescenta uma linha. words: sequência de (texto, início_ms, fim_ms)."""
+        self.line_start.append(start_ms)
+        self.line_end.append(end_ms)
+        self.line_text.append(self._intern(text))
+        for word, w_start, w_end in words:
+            self.word_start.append(w_start)
+            self.word_end.append(w_end)
+            self.word_text.append(self._intern(word))
+        self.word_first.append(len(self.word_start))
+
+    def __len__(self):
+        return len(self.line_start)
+
+    def text(self, i):
+        return self.strings[self.line_text[i]]
+
+    def has_words(self, i):
+        """Linha com tempo por palavra (wipe) ou só linha inteira (LRC)."""
+        return self.word_first[i + 1] > self.word_first[i]
+
+    def words(self, i):
+        """Índices das palavras da linha i."""
+        return range(self.word_first[i], self.word_first[i + 1])
+
+    def word(self, j):
+        return self.strings[self.word_text[j]]
+
+    @classmethod
+    def from_json(cls, data):
+        """Letra sincronizada (lyrics_v1/v2.json); chaves extras do alinhamento são descartadas."""
+        lyrics = cls()
+        for line in data.get('lines', []):
+            words = [(w.get('display', w.get('text', '')), w['start'] * 1000, w['end'] * 1000)
+                     for w in line.get('words', [])]
+            lyrics.add_line(line['start'] * 1000, line['end'] * 1000, line.get('text', ''), words)
+        return lyrics
+
+    @classmethod
+    def from_lrc(cls, f):
+        """LRC de linha inteira: cada linha dura DEFAULT_LINE_MS."""
+        lyrics = cls()
+        for line in f:
+            match = LRC_LINE.search(line)
+            if match:
+                time_ms = (int(match.group(1)) * 60 + float(match.group(2))) * 1000
+                lyrics.add_line(time_ms, time_ms + DEFAULT_LINE_MS, match.group(3).strip())
+        return lyrics
+
+    def to_json(self):
+        """Formato dos arquivos lyrics_v*.json (tempos em segundos), para a API."""
+        lines = []
+        for i in range(len(self)):
+            line = {'start': self.line_start[i] / 1000, 'end': self.line_end[i] / 1000, 'text': self.text(i)}
+            if self.has_words(i):
+                line['words'] = [{'display': self.word(j), 'start': self.word_start[j] / 1000,
+                                  'end': self.word_end[j] / 1000} for j in self.words(i)]
+            lines.append(line)
+        return {'lines': lines}
+
+
+# Arquivos de letra de uma pasta de música, em ordem de prioridade
+LYRICS_FILES = (("v1", "lyrics_v1.json"), ("v2", "lyrics_v2.json"), ("lrc", "lyrics.lrc"))
+
+
+def find_lyrics_files(base):
+    """Letras disponíveis em songs/<id>: lista de {'type', 'path'} na ordem v1 -> v2 -> lrc."""
+    found = []
+    for kind, name in LYRICS_FILES:
+        path = os.path.join(base, name)
+        if os.path.exists(path):
+            found.append({"type": kind, "path": path})
+    return found
+
+
+def load_lyrics(path):
+    """Lê um arquivo de letra (JSON sincronizado ou LRC). Retorna LyricsData (vazio se falhar)."""
+    if not path or not os.path.exists(path):
+        return LyricsData()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                return LyricsData.from_json(json.load(f))
+            return LyricsData.from_lrc(f)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Erro ao analisar letras {path}: {e}")
+        return LyricsData()
+
+
+class LyricTimeline:
+    """
+    Índice temporal das linhas de letra.
+
+    - Arrays ordenados de início/fim para busca binária (seek).
+    - Cursor monótono para a reprodução normal: cada consulta avança a partir
+      da anterior, O(1) amortizado por frame.
+    - Flags pré-calculadas por linha (intervalo antes da linha, pontos de
+      contagem, limiar de visibilidade), para o draw não recalcular vizinhos.
+    """
+    def __init__(self, lyrics):
+        # Arrays da própria LyricsData (sem cópia)
+        self.starts = lyrics.line_start
+        self.ends = lyrics.line_end
+        self.n = len(lyrics)
+
+        # Máximo acumulado dos fins: torna a busca da página monótona mesmo com linhas sobrepostas
+        self.max_ends = array('d')
+        running = float('-inf')
+        for e in self.ends:
+            running = max(running, e)
+            self.max_ends.append(running)
+
+        # Intervalo (ms) entre o fim da linha anterior e o início desta
+        self.gap_before = [
+            self.starts[i] - (self.ends[i - 1] if i > 0 else 0) for i in range(self.n)
+        ]
+        # Pontos de contagem (4s): na introdução e antes de pausas maiores que 6s
+        self.show_dots = [i == 0 or self.gap_before[i] > 6000 for i in range(self.n)]
+        # Pausa instrumental (> 8s): linha só aparece junto com os pontos
+        self.is_after_break = [i > 0 and self.gap_before[i] > 8000 for i in range(self.n)]
+        # Antecedência com que a linha aparece na tela (ms)
+        self.vis_threshold = [
+            4000 if (i == 0 or self.is_after_break[i]) else 8000 for i in range(self.n)
+        ]
+
+        self._cursor = -1
+        self._cursor_time = float('-inf')
+
+    def __len__(self):
+        return self.n
+
+    def seek(self, time_ms):
+        """Reposiciona o cursor por busca binária (após seek ou troca de letra)."""
+        self._cursor = bisect.bisect_right(self.starts, time_ms + LEAD_MS) - 1
+        self._cursor_time = time_ms
+
+    def line_at(self, time_ms):
+        """Índice da linha atual (última com início - LEAD_MS <= tempo) ou -1."""
+        if time_ms < self._cursor_time:
+            # Voltou no tempo (seek para trás): reposiciona
+            self.seek(time_ms)
+            return self._cursor
+        cursor = self._cursor
+        while cursor + 1 < self.n and time_ms >= self.starts[cursor + 1] - LEAD_MS:
+            cursor += 1
+        self._cursor = cursor
+        self._cursor_time = time_ms
+        return cursor
+
+
+TITLE_CARD_MS = 5000 # Cartão de título visível nos primeiros 5s
+TITLE_FADE_MS = 1000 # Fade out no último segundo
+DOTS_WINDOW_MS = 4000 # Contagem regressiva (4 pontos)
+BANNER_MIN_GAP_MS = 8000 # Banner "INSTRUMENTAL" enquanto faltar mais que isso
+LINGER_MS = 1000 # Linha ativa continua visível 1s após terminar
+
+
+class DisplayState:
+    """O que deve ser desenhado em um instante (resultado de DisplaySchedule.at)."""
+    __slots__ = ('page', 'title_alpha', 'dots_lit', 'show_active', 'show_preview', 'banner')
+
+    def __init__(self, page, title_alpha, dots_lit, show_active, show_preview, banner):
+        self.page = page
+        self.title_alpha = title_alpha
+        self.dots_lit = dots_lit # 0 = sem pontos; 1..4 = pontos acesos
+        self.show_active = show_active
+        self.show_preview = show_preview
+        self.banner = banner
+
+    def __repr__(self):
+        return (f"DisplayState(page={self.page}, title_alpha={self.title_alpha}, dots_lit={self.dots_lit}, "
+                f"show_active={self.show_active}, show_preview={self.show_preview}, banner={self.banner})")
+
+
+class DisplaySchedule:
+    """
+    Agenda de exibição compilada no carregamento da letra.
+
+    Converte a timeline em eventos com intervalos fixos:
+    - trocas de página (tempo a partir do qual cada linha é a ativa)
+    - janelas dos pontos de contagem
+    - intervalos do banner INSTRUMENTAL
+    - fade do cartão de título
+    - janelas de visibilidade das linhas ativa/prévia
+    O renderer só consulta at(tempo); nada depende do pygame.
+    """
+    def __init__(self, timeline):
+        self.timeline = timeline
+        tl = timeline
+        n = tl.n
+
+        # Página i fica ativa quando todas as anteriores terminaram (flip imediato após o fim)
+        self.page_times = tl.max_ends
+
+        # Janelas [inicio, fim) dos pontos de contagem, ordenadas por tempo
+        self.dot_windows = [
+            (tl.starts[i] - DOTS_WINDOW_MS, tl.starts[i], i) for i in range(n) if tl.show_dots[i]
+        ]
+        self._dot_starts = [w[0] for w in self.dot_windows]
+
+        # Banner: da troca para a página i (> 0) até faltar BANNER_MIN_GAP_MS para a linha começar
+        self.banner_windows = []
+        for i in range(1, n):
+            begin = tl.max_ends[i - 1]
+            end = tl.starts[i] - BANNER_MIN_GAP_MS
+            if end > begin:
+                self.banner_windows.append((begin, end))
+        self._banner_starts = [w[0] for w in self.banner_windows]
+
+        # Visibilidade por linha: aparece vis_threshold antes do início
+        self.show_from = [tl.starts[i] - tl.vis_threshold[i] for i in range(n)]
+        self.hide_after = [tl.ends[i] + LINGER_MS for i in range(n)]
+
+        # Instantes em que algo na tela muda (frame pacing: quando o próximo frame é necessário)
+        events = set(self.page_times)
+        for begin, end, _ in self.dot_windows:
+            events.update(begin + k * 1000 for k in range(4))
+            events.add(end)
+        for begin, end in self.banner_windows:
+            events.update((begin, end))
+        events.update(self.show_from)
+        events.update(self.hide_after)
+        events.update(tl.starts)
+        events.update((TITLE_CARD_MS - TITLE_FADE_MS, TITLE_CARD_MS))
+        self.events = sorted(events)
+
+        self._page = 0
+        self._page_time = float('-inf')
+
+    def next_event_after(self, time_ms):
+        """Próximo instante (ms) > time_ms em que a exibição muda, ou None."""
+        i = bisect.bisect_right(self.events, time_ms)
+        return self.events[i] if i < len(self.events) else None
+
+    def is_animating(self, time_ms):
+        """True enquanto a linha ativa está sendo cantada (wipe em andamento)."""
+        page = self.page_at(time_ms)
+        tl = self.timeline
+        return page < tl.n and tl.starts[page] <= time_ms <= tl.ends[page]
+
+    def page_at(self, time_ms):
+        """Página atual: cursor monótono na reprodução, busca binária ao voltar no tempo."""
+        if time_ms < self._page_time:
+            self._page = bisect.bisect_left(self.page_times, time_ms)
+        else:
+            page = self._page
+            while page < self.timeline.n and time_ms > self.page_times[page]:
+                page += 1
+            self._page = page
+        self._page_time = time_ms
+        return self._page
+
+    @staticmethod
+    def _window_at(starts, windows, time_ms, open_start=False):
+        """Janela que contém time_ms ([inicio, fim), ou (inicio, fim) com open_start)."""
+        bisect_fn = bisect.bisect_left if open_start else bisect.bisect_right
+        i = bisect_fn(starts, time_ms) - 1
+        if i >= 0 and time_ms < windows[i][1]:
+            return windows[i]
+        return None
+
+    def title_alpha(self, time_ms):
+        if time_ms >= TITLE_CARD_MS:
+            return 0
+        fade_start = TITLE_CARD_MS - TITLE_FADE_MS
+        if time_ms <= fade_start:
+            return 255
+        return int(255 * (1 - (time_ms - fade_start) / TITLE_FADE_MS))
+
+    def at(self, time_ms):
+        page = self.page_at(time_ms)
+        n = self.timeline.n
+
+        dots_lit = 0
+        window = self._window_at(self._dot_starts, self.dot_windows, time_ms)
+        if window and window[2] == page:
+            # 4s -> 1 aceso, 3s -> 2, 2s -> 3, 1s -> 4
+            time_to = (window[1] - time_ms) / 1000.0
+            dots_lit = sum(1 for i in range(4) if time_to <= 4.0 - i)
+
+        show_active = page < n and self.show_from[page] <= time_ms <= self.hide_after[page]
+        show_preview = page + 1 < n and self.show_from[page + 1] <= time_ms
+        # A página só troca depois do fim da linha anterior: início aberto
+        banner = self._window_at(self._banner_starts, self.banner_windows, time_ms, open_start=True) is not None
+
+        return DisplayState(page, self.title_alpha(time_ms), dots_lit, show_active, show_preview, banner)
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import pygame
+from stem_mixer import decode_stem
+
+CACHE_DIR = "songs/.pcm_cache"
+MAX_BYTES = 2 * 1024 * 1024 * 1024 # ~25 músicas de 4 min com as duas faixas
+
+
+class PcmCache:
+    """
+    Cache em disco do áudio já decodificado (PCM int16 intercalado, sem
+    cabeçalho), no formato do mixer.
+
+    Cada faixa é decodificada uma vez e gravada como <chave>.pcm; nas vezes
+    seguintes o arquivo é só mapeado em memória (np.memmap), então carregar
+    é instantâneo e o seek é O(1): basta indexar o frame. O manifest.json
+    guarda origem, mtime/tamanho da origem, formato e último uso; o total é
+    limitado a max_bytes, removendo as faixas usadas há mais tempo (LRU).
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.lock = threading.Lock()
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def _valid(self, key, src, freq, channels):
+        entry = self.entries.get(key)
+        if not entry or entry.get("source") != src:
+            return False
+        if (entry.get("sample_rate"), entry.get("channels")) != (freq, channels):
+            return False # Mixer aberto em outro formato
+        try:
+            st = os.stat(src)
+            if (st.st_mtime, st.st_size) != (entry["mtime"], entry["size"]):
+                return False
+            return os.path.getsize(os.path.join(self.cache_dir, key + ".pcm")) == entry["bytes"]
+        except OSError:
+            return False
+
+    def get(self, key, src):
+        """
+        PCM da faixa 'src' como array (frames, canais) int16 mapeado do disco.
+        Decodifica e grava na primeira vez (ou se a origem mudou).
+        """
+        freq, _, channels = pygame.mixer.get_init()
+        path = os.path.join(self.cache_dir, key + ".pcm")
+        with self.lock:
+            if not self._valid(key, src, freq, channels):
+                st = os.stat(src)
+                pcm = np.ascontiguousarray(decode_stem(src).reshape(-1, channels), dtype=np.int16)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = path + ".tmp"
+                pcm.tofile(tmp)
+                os.replace(tmp, path)
+                self.entries[key] = {"source": src, "mtime": st.st_mtime, "size": st.st_size,
+                                     "sample_rate": freq, "channels": channels,
+                                     "frames": len(pcm), "bytes": pcm.nbytes}
+                self._evict(keep=key)
+
+            entry = self.entries[key]
+            entry["last_used"] = time.time()
+            self._save()
+
+        if not entry["frames"]:
+            return np.zeros((0, channels), dtype=np.int16)
+        return np.memmap(path, dtype=np.int16, mode="r", shape=(entry["frames"], channels))
+
+    def total_bytes(self):
+        with self.lock:
+            return sum(e.get("bytes", 0) for e in self.entries.values())
+
+    def _evict(self, keep=None):
+        """Remove as faixas menos usadas até caber em max_bytes (chamar com o lock)."""
+        total = sum(e.get("bytes", 0) for e in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, key + ".pcm"))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue # Ainda mapeado (Windows): tenta na próxima vez
+            total -= self.entries.pop(key).get("bytes", 0)
@@ -0,0 +1,144 @@
+import time
+import logging
+import logging.handlers
+from collections import deque
+
+PHASES = ("eventos", "update", "fundo", "letras", "hud", "flip")
+LOG_PATH = "perf.log"
+LOG_INTERVAL = 5.0 # Segundos entre linhas do log
+REFRESH_INTERVAL = 0.25 # Atualização do texto do overlay
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class FrameProfiler:
+    """
+    Tempos por fase de cada frame (eventos, update, fundo, letras, HUD, flip),
+    sempre ligado: só perf_counter e deques de tamanho fixo por frame.
+
+    mark(fase) atribui à fase o tempo desde a marca anterior. A cada
+    LOG_INTERVAL grava um resumo em perf.log (rotativo), junto com os
+    contadores externos de counters_fn (scorer, áudio, API). O overlay (F3)
+    só lê o último resumo.
+
+    Contadores '*_max_ms' são picos desde a leitura anterior; como o overlay
+    lê 4x/s, o log guarda o maior deles no intervalo inteiro (log_peaks).
+    """
+    def __init__(self, counters_fn=None, window=300, log_path=LOG_PATH):
+        self.counters_fn = counters_fn
+        self.overlay = False # Overlay visível (F3)
+
+        self.phase_index = {name: i for i, name in enumerate(PHASES)}
+        self.history = [deque(maxlen=window) for _ in PHASES]
+        self.frame_work = deque(maxlen=window) # Soma das fases (ms)
+        self.frame_interval = deque(maxlen=window) # Entre inícios de frame (ms)
+        self.current = [0.0] * len(PHASES)
+        self.frame_start = None
+        self.last_mark = 0.0
+
+        self.summary = {}
+        self.last_refresh = 0.0
+        self.last_log = time.perf_counter()
+        self.last_api_count = None
+        self.last_api_time = self.last_log
+        self.log_peaks = {} # Picos dos contadores desde a última linha do log
+
+        self.logger = logging.getLogger("karaoke.perf")
+        self.logger.propagate = False
+        if log_path and not self.logger.handlers:
+            try:
+                handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=1024 * 1024,
+                                                               backupCount=3, encoding="utf-8", delay=True)
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                self.logger.addHandler(handler)
+                self.logger.setLevel(logging.INFO)
+            except OSError as e:
+                print(f"Aviso: log de desempenho desativado ({e})")
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.frame_interval.append((now - self.frame_start) * 1000)
+        self.frame_start = self.last_mark = now
+        self.current = [0.0] * len(PHASES)
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.current[self.phase_index[phase]] += (now - self.last_mark) * 1000
+        self.last_mark = now
+
+    def end_frame(self):
+        for hist, value in zip(self.history, self.current):
+            hist.append(value)
+        self.frame_work.append(sum(self.current))
+
+        now = self.last_mark
+        if self.overlay and now - self.last_refresh >= REFRESH_INTERVAL:
+            self.refresh(now)
+        if now - self.last_log >= LOG_INTERVAL:
+            self.refresh(now)
+            self.write_log()
+            self.last_log = now
+
+    def refresh(self, now=None):
+        """Recalcula o resumo da janela recente (chamado ~4x/s com o overlay, senão só para o log)."""
+        now = now or time.perf_counter()
+        self.last_refresh = now
+        work = sorted(self.frame_work)
+        intervals = list(self.frame_interval)
+        mean_interval = sum(intervals) / len(intervals) if intervals else 0.0
+        s = {
+            'fps': 1000.0 / mean_interval if mean_interval else 0.0,
+            'work_ms': sum(work) / len(work) if work else 0.0,
+            'work_p95_ms': _percentile(work, 0.95),
+            'work_max_ms': work[-1] if work else 0.0,
+            'phases': {name: (sum(h) / len(h) if h else 0.0, max(h) if h else 0.0)
+                       for name, h in zip(PHASES, self.history)},
+        }
+
+        counters = self.counters_fn() if self.counters_fn else {}
+        api_count = counters.pop('api_requests', None)
+        if api_count is not None:
+            if self.last_api_count is not None and now > self.last_api_time:
+                s['api_rate'] = (api_count - self.last_api_count) / (now - self.last_api_time)
+            else:
+                s['api_rate'] = 0.0
+            self.last_api_count = api_count
+            self.last_api_time = now
+        s.update(counters)
+        for key, value in counters.items():
+            if key.endswith('_max_ms'):
+                self.log_peaks[key] = max(self.log_peaks.get(key, 0.0), value)
+        self.summary = s
+
+    def write_log(self):
+        s = dict(self.summary, **self.log_peaks)
+        self.log_peaks = {}
+        phases = " ".join(f"{name}={mean:.2f}/{peak:.1f}" for name, (mean, peak) in s['phases'].items())
+        extra = " ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                         for k, v in s.items() if k not in ('fps', 'work_ms', 'work_p95_ms', 'work_max_ms', 'phases'))
+        self.logger.info(f"fps={s['fps']:.1f} frame={s['work_ms']:.2f} p95={s['work_p95_ms']:.2f} "
+                         f"max={s['work_max_ms']:.1f} | {phases} | {extra}")
+
+    def overlay_lines(self):
+        """Linhas (rótulo, valor) do overlay a partir do último resumo."""
+        s = self.summary
+        if not s:
+            return [("", "Coletando...")]
+        lines = [
+            ("frame", f"{s['work_ms']:.2f} ms  p95 {s['work_p95_ms']:.2f}  máx {s['work_max_ms']:.1f}  ({s['fps']:.0f} fps)"),
+        ]
+        for name, (mean, peak) in s['phases'].items():
+            lines.append((name, f"{mean:.2f} ms  (máx {peak:.1f})"))
+        if 'scorer_loop_ms' in s:
+            lines.append(("scorer", f"{s['scorer_loop_ms']:.2f} ms  (máx {s.get('scorer_loop_max_ms', 0.0):.1f})"
+                                    f"  overflows {s.get('input_overflows', 0)}"))
+        if 'output_underruns' in s:
+            lines.append(("saída", f"underruns {s['output_underruns']}  latência {s.get('output_latency_ms', 0.0):.1f} ms"))
+        if 'api_rate' in s:
+            lines.append(("API", f"{s['api_rate']:.1f} req/s"))
+        return lines
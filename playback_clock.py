@@ -0,0 +1,110 @@
+import time
+import threading
+
+
+class PlaybackClock:
+    """
+    Relógio de reprodução de alta resolução.
+
+    A posição do mixer (source(), em ms desde o último play, ou -1) só muda
+    a cada buffer de áudio (~46 ms com 2048 frames). Entre as atualizações a
+    posição é interpolada com um timer monotônico; quando o mixer reporta
+    um valor novo, a diferença é corrigida aos poucos ajustando a taxa do
+    relógio (slew), sem saltos para trás. Erros grandes (ex.: travada do
+    sistema) são corrigidos de uma vez.
+
+    Pausa, seek e troca de faixa são explícitos (pause/resume/seek), então
+    a posição é exata nesses pontos. Seguro para leitura de várias threads
+    (render, scorer, API).
+    """
+    def __init__(self, source=None, timer=time.perf_counter, max_slew=0.05,
+                 slew_window_ms=500.0, snap_ms=250.0):
+        self.source = source
+        self.timer = timer
+        self.max_slew = max_slew # Correção máxima da taxa (5%)
+        self.slew_window_ms = slew_window_ms # Tempo para absorver um erro
+        self.snap_ms = snap_ms # Acima disso, corrige de uma vez
+
+        self.lock = threading.Lock()
+        self.running = False
+        self.paused = False
+        self.offset_ms = 0.0 # Posição da música quando o mixer foi (re)iniciado
+        self.anchor_time = 0.0
+        self.anchor_pos = 0.0
+        self.rate = 1.0
+        self.last_raw = None
+        self.last_value = 0.0
+        self.drift_ms = 0.0 # Último erro medido (diagnóstico)
+
+    def _reanchor(self, pos):
+        self.anchor_time = self.timer()
+        self.anchor_pos = pos
+        self.last_value = pos
+
+    def start(self, position_ms=0.0):
+        """Música (re)iniciada no mixer em position_ms (play ou play(start=...))."""
+        with self.lock:
+            self.running = True
+            self.paused = False
+            self.offset_ms = float(position_ms)
+            self.rate = 1.0
+            self.last_raw = None
+            self._reanchor(float(position_ms))
+
+    # Seek e troca de faixa reiniciam o mixer na posição pedida
+    seek = start
+
+    def pause(self):
+        with self.lock:
+            if self.running and not self.paused:
+                self.last_value = self._predict()
+                self.paused = True
+
+    def resume(self):
+        with self.lock:
+            if self.running and self.paused:
+                self.paused = False
+                self.rate = 1.0
+                self._reanchor(self.last_value)
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.paused = False
+            self.last_value = 0.0
+
+    def _predict(self):
+        return self.anchor_pos + (self.timer() - self.anchor_time) * 1000.0 * self.rate
+
+    def position_ms(self):
+        """Posição atual da música em ms (0 se parada)."""
+        with self.lock:
+            if not self.running:
+                return 0.0
+            if self.paused:
+                return self.last_value
+
+            predicted = self._predict()
+            raw = self.source() if self.source else -1
+            if raw is not None and raw >= 0 and raw != self.last_raw:
+                # Mixer acabou de avançar: neste instante a posição real é raw + offset
+                self.last_raw = raw
+                measured = raw + self.offset_ms
+                error = measured - predicted
+                self.drift_ms = error
+                if abs(error) > self.snap_ms:
+                    self.rate = 1.0
+                    self.anchor_time = self.timer()
+                    self.anchor_pos = measured
+                    self.last_value = measured
+                    return measured
+                # Absorve o erro em slew_window_ms, com a taxa limitada
+                correction = max(-self.max_slew, min(self.max_slew, error / self.slew_window_ms))
+                self.rate = 1.0 + correction
+                self.anchor_time = self.timer()
+                self.anchor_pos = predicted
+
+            # Nunca volta no tempo entre leituras (só seek/start reposicionam)
+            value = max(predicted, self.last_value)
+            self.last_value = value
+            return value
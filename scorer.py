@@ -3,6 +3,7 @@ import numpy as np
 import threading
 import time
 import logging
+from audio_analysis import estimate_pitch_frames, hz_to_midi
 
 # Configuração de Logs de Depuração
 logging.basicConfig(
@@ -29,6 +30,9 @@ class Scorer:
         logging.info("Inicializando Scorer...")
         self.rate = rate
         self.chunk = chunk # Tamanho do Buffer (Latência)
+        self.read_frames = chunk # Frames por leitura dos mics (bloco do motor de áudio com retorno por ele)
+        self.pending_blocks = [] # Leituras acumuladas até completar um chunk (pontuação)
+        self.pending_frames = 0
         self.p = pyaudio.PyAudio()
         
         # Streams
@@ -36,6 +40,7 @@ class Scorer:
         self.stream_mic2 = None
         self.stream_output = None # Para monitoramento
         self.output_channels = 2
+        self.monitor_sink = None # AudioEngine: retorno mixado na saída única (sem stream próprio)
         
         # Configurações
         self.input_device_index_1 = None
@@ -60,6 +65,17 @@ class Scorer:
         self.current_volume_mic2 = 0
         
         self.paused = True # Começa pausado até iniciar música
+
+        # Diagnóstico (overlay de desempenho): processamento por bloco e blocos perdidos
+        self.loop_ms = 0.0 # Média móvel do processamento de um bloco (sem a espera da leitura)
+        self.loop_max_ms = 0.0
+        self.input_overflows = 0
+        self.input_capacity = 2 * chunk # Frames que cabem no buffer de entrada (acima disso há perda)
+
+        # Referência pré-calculada na ingestão (altura/energia dos vocais originais)
+        self.reference = None
+        self.clock = None # PlaybackClock do player (tempo da música no instante de cada bloco)
+        self.last_pitch_error = None # Em semitons (None = sem comparação)
         self.reset()
 
     def get_input_devices(self):
@@ -124,9 +140,22 @@ class Scorer:
         if self.p:
             self.p.terminate()
 
+    def _mic_block(self):
+        """
+        Frames por leitura dos mics. Com o retorno pelo motor de áudio, lê no
+        tamanho do bloco do motor: cada pedaço vai para as caixas assim que
+        chega, sem esperar um chunk inteiro (a pontuação continua por chunk).
+        """
+        if self.monitor_sink is not None and self.monitoring_enabled:
+            return max(1, min(self.chunk, self.monitor_sink.block))
+        return self.chunk
+
     def start_streams(self):
         """Abre os canais de áudio configurados."""
         logging.info(f"Tentando abrir streams. Mic1:{self.input_device_index_1}, Mic2:{self.input_device_index_2}, Mon:{self.monitoring_enabled}")
+        self.read_frames = self._mic_block()
+        self.pending_blocks = []
+        self.pending_frames = 0
         try:
             # Mic 1
             if self.input_device_index_1 is not None:
@@ -136,8 +165,11 @@ class Scorer:
                     rate=self.rate,
                     input=True,
                     input_device_index=self.input_device_index_1,
-                    frames_per_buffer=self.chunk
+                    frames_per_buffer=self.read_frames
                 )
+                # Buffer de entrada do PortAudio ~ latência de entrada (no mínimo dois blocos)
+                self.input_capacity = max(2 * self.read_frames,
+                                          int(self.stream_mic1.get_input_latency() * self.rate))
             
             # Mic 2
             if self.input_device_index_2 is not None and self.input_device_index_2 != self.input_device_index_1:
@@ -147,11 +179,13 @@ class Scorer:
                     rate=self.rate,
                     input=True,
                     input_device_index=self.input_device_index_2,
-                    frames_per_buffer=self.chunk
+                    frames_per_buffer=self.read_frames
                 )
             
             # Saída (Monitoramento)
-            if self.monitoring_enabled:
+            if self.monitoring_enabled and self.monitor_sink is not None:
+                logging.info("Monitoramento pelo motor de áudio (saída única)")
+            elif self.monitoring_enabled:
                 self.stream_output = None
                 self.output_channels = 2 # Default attempt
                 
@@ -223,6 +257,50 @@ class Scorer:
 
     def set_singing_segment(self, is_active):
         self.is_singing_segment = is_active
+
+    def set_monitor_sink(self, sink):
+        """
+        Envia o retorno dos mics para o motor de áudio em vez de abrir uma saída
+        própria. O motor toca as amostras na taxa dele, então os mics passam a
+        ser capturados nessa mesma taxa.
+        """
+        self.monitor_sink = sink
+        if sink is not None and sink.rate != self.rate:
+            logging.warning(f"Mics a {self.rate}Hz e motor de áudio a {sink.rate}Hz: capturando a {sink.rate}Hz")
+            self.rate = sink.rate
+        if self.running:
+            self.restart_requested = True # Fecha/abre a saída própria conforme o caso
+
+    def set_clock(self, clock):
+        """Lê o tempo da música (para consultar a referência) direto do relógio de reprodução."""
+        self.clock = clock
+
+    def get_song_time(self):
+        return self.clock.position_ms() if self.clock else 0
+
+    def set_reference(self, reference):
+        """Usa contornos já carregados (ex.: pelo prefetch da próxima música). None = só energia."""
+        self.reference = reference
+
+    def _pitch_hit(self, samples, ref_midi):
+        """
+        Compara a altura do microfone com a referência (ignorando oitava).
+        Retorna 1/0, ou None se não foi possível estimar a altura do mic.
+        """
+        mic_midi = float(hz_to_midi(estimate_pitch_frames(samples, self.rate))[0])
+        if mic_midi <= 0:
+            self.last_pitch_error = None
+            return None
+        diff = abs(mic_midi - ref_midi) % 12.0
+        diff = min(diff, 12.0 - diff)
+        self.last_pitch_error = diff
+
+        tolerance = 2.0 # Normal (semitons)
+        if self.difficulty == "Fácil":
+            tolerance = 3.0
+        elif self.difficulty == "Difícil":
+            tolerance = 1.0
+        return 1 if diff <= tolerance else 0
         
     def set_paused(self, paused):
         """Pausa ou resume o processamento de áudio de forma segura."""
@@ -256,14 +334,13 @@ class Scorer:
                  logging.info("Process Audio: Streams fechados. Tentando abrir...")
                  self.start_streams()
 
-            data1 = np.zeros(self.chunk, dtype=np.int16)
-            data2 = np.zeros(self.chunk, dtype=np.int16)
+            data1 = np.zeros(self.read_frames, dtype=np.int16)
+            data2 = np.zeros(self.read_frames, dtype=np.int16)
             
             # Ler Mic 1
             if self.stream_mic1:
                 try:
-                    raw_data = self.stream_mic1.read(self.chunk, exception_on_overflow=False)
-                    data1 = np.frombuffer(raw_data, dtype=np.int16)
+                    data1 = self._read_mic(self.stream_mic1)
                 except Exception as e:
                     # Logs de leitura podem ser frequentes, usar debug se necessario
                     pass
@@ -271,27 +348,26 @@ class Scorer:
             # Ler Mic 2
             if self.stream_mic2:
                 try:
-                    raw_data = self.stream_mic2.read(self.chunk, exception_on_overflow=False)
-                    data2 = np.frombuffer(raw_data, dtype=np.int16)
+                    data2 = self._read_mic(self.stream_mic2)
                 except Exception:
                     pass
+
+            t_block = time.perf_counter()
             
             # Aplicar Volume (Gain)
             # Converter para float para processamento, evitar clipping imediato
             float_d1 = data1.astype(np.float32) * self.volume_mic1
             float_d2 = data2.astype(np.float32) * self.volume_mic2
             
-            # Calcular Volumes para VU Meter (RMS)
-            self.current_volume_mic1 = np.linalg.norm(float_d1) / self.chunk if len(float_d1) > 0 else 0
-            self.current_volume_mic2 = np.linalg.norm(float_d2) / self.chunk if len(float_d2) > 0 else 0
-            
             # Mixagem para Monitoramento
             mixed_float = float_d1 + float_d2
             # Clipar
             mixed_audio_mono = np.clip(mixed_float, -32768, 32767).astype(np.int16)
             
             # Enviar para Saída (Monitoramento)
-            if self.stream_output and self.monitoring_enabled:
+            if self.monitor_sink is not None and self.monitoring_enabled:
+                self.monitor_sink.push_monitor(mixed_audio_mono)
+            elif self.stream_output and self.monitoring_enabled:
                 try:
                     output_data = mixed_audio_mono.tobytes()
                     
@@ -306,34 +382,90 @@ class Scorer:
                     print(f"Erro no monitoramento: {e}")
                     self.monitoring_enabled = False 
                     pass
-            
-            # --- Lógica de Pontuação ---
-            
-            # Definir limiar baseado na Dificuldade
-            threshold = 7.0 # Normal (Reduzido de 10.0)
-            if self.difficulty == "Fácil":
-                threshold = 1.5 # Fácil (Reduzido de 5.0 - Muito mais sensível)
-            elif self.difficulty == "Difícil":
-                threshold = 15.0 # Difícil (Reduzido de 20.0)
-            
-            # Analisar se houve "canto" (energia combinada acima do limiar)
-            combined_vol = max(self.current_volume_mic1, self.current_volume_mic2 * 0.8) # Mic1 tem prioridade leve
-            
-            if self.is_singing_segment:
-                self.total_samples += 1
-                hit = 0
-                if combined_vol > threshold:
-                    self.hit_samples += 1
-                    hit = 1
-                
-                # Atualizar janela deslizante de precisão
-                self.recent_hits.append(hit)
-                if len(self.recent_hits) > self.accuracy_window_size:
-                    self.recent_hits.pop(0)
+
+            # VU e pontuação por chunk: leituras menores (bloco do motor) são acumuladas até completar um
+            self.pending_blocks.append((float_d1, float_d2))
+            self.pending_frames += len(float_d1)
+            if self.pending_frames >= self.chunk:
+                if len(self.pending_blocks) > 1:
+                    float_d1 = np.concatenate([b[0] for b in self.pending_blocks])
+                    float_d2 = np.concatenate([b[1] for b in self.pending_blocks])
+                self.pending_blocks = []
+                self.pending_frames = 0
+                self._score_block(float_d1, float_d2)
+
+            block_ms = (time.perf_counter() - t_block) * 1000
+            self.loop_ms = 0.9 * self.loop_ms + 0.1 * block_ms
+            self.loop_max_ms = max(self.loop_max_ms, block_ms)
 
         logging.info("Loop _process_audio encerrado clean.")
         self.stop_streams()
 
+    def _score_block(self, float_d1, float_d2):
+        """VU dos mics e pontuação de um chunk (áudio já com o ganho aplicado)."""
+        # Calcular Volumes para VU Meter (RMS)
+        self.current_volume_mic1 = np.linalg.norm(float_d1) / len(float_d1) if len(float_d1) > 0 else 0
+        self.current_volume_mic2 = np.linalg.norm(float_d2) / len(float_d2) if len(float_d2) > 0 else 0
+
+        # --- Lógica de Pontuação ---
+        
+        # Definir limiar baseado na Dificuldade
+        threshold = 7.0 # Normal (Reduzido de 10.0)
+        if self.difficulty == "Fácil":
+            threshold = 1.5 # Fácil (Reduzido de 5.0 - Muito mais sensível)
+        elif self.difficulty == "Difícil":
+            threshold = 15.0 # Difícil (Reduzido de 20.0)
+        
+        # Analisar se houve "canto" (energia combinada acima do limiar)
+        combined_vol = max(self.current_volume_mic1, self.current_volume_mic2 * 0.8) # Mic1 tem prioridade leve
+        
+        # Referência: consulta O(1) por tempo (sem analisar a faixa original em tempo real)
+        ref_midi, ref_energy = 0.0, 0
+        if self.reference is not None:
+            ref_midi, ref_energy = self.reference.at(self.get_song_time())
+
+        # Pausas de respiração dentro da linha (vocal original em silêncio) não contam
+        ref_silent = self.reference is not None and ref_energy < 40
+
+        if self.is_singing_segment and not ref_silent:
+            self.total_samples += 1
+            hit = 0
+            if combined_vol > threshold:
+                hit = 1
+                if ref_midi > 0:
+                    # Usa o mic mais forte para estimar a altura
+                    mic_src = float_d1 if self.current_volume_mic1 >= self.current_volume_mic2 * 0.8 else float_d2
+                    pitch_hit = self._pitch_hit(mic_src, ref_midi)
+                    if pitch_hit is not None:
+                        hit = pitch_hit
+            if hit:
+                self.hit_samples += 1
+            
+            # Atualizar janela deslizante de precisão
+            self.recent_hits.append(hit)
+            if len(self.recent_hits) > self.accuracy_window_size:
+                self.recent_hits.pop(0)
+
+    def _read_mic(self, stream):
+        """
+        Lê um bloco do mic e conta os overflows (amostras perdidas por atraso
+        do loop) sem descartar nem reler nada: se antes da leitura o buffer de
+        entrada já está cheio, o dispositivo está perdendo amostras.
+        """
+        try:
+            if stream.get_read_available() >= self.input_capacity:
+                self.input_overflows += 1
+        except (IOError, OSError):
+            pass
+        raw_data = stream.read(self.read_frames, exception_on_overflow=False)
+        return np.frombuffer(raw_data, dtype=np.int16)
+
+    def get_loop_stats(self):
+        """(média ms, máximo ms desde a última chamada, overflows) do loop de áudio."""
+        peak = self.loop_max_ms
+        self.loop_max_ms = 0.0
+        return self.loop_ms, peak, self.input_overflows
+
     def get_score(self):
         """Retorna nota 0-100."""
         if self.total_samples == 0: return 0
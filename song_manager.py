@@ -12,6 +12,12 @@ import shutil
 import http.server
 import socketserver
 import threading
+import contextlib
+from pydub.utils import mediainfo
+import numpy as np
+from audio_analysis import detect_voiced_regions, pack_regions, extract_reference_contours, save_reference_contours, write_waveform_sidecar
+from job_scheduler import MemoryScheduler, IngestJob, is_oom_error
+from audio_info import build_manifest, write_manifest
 
 
 class SongManager:
@@ -26,6 +32,10 @@ class SongManager:
         self.song_dir = song_dir
         self.library_file = library_file
         self.ytmusic = YTMusic()
+        # Agendador de memória opcional (ingestão concorrente). None = sem controle de admissão.
+        self.scheduler = None
+        self.library_lock = threading.Lock()
+        self._reserved_ids = set()
 
         if not os.path.exists(self.song_dir):
             os.makedirs(self.song_dir)
@@ -44,16 +54,33 @@ class SongManager:
             self.library = {}
 
     def save_library(self):
-        with open(self.library_file, 'w') as f:
-            json.dump(self.library, f, indent=4)
+        with self.library_lock:
+            with open(self.library_file, 'w') as f:
+                json.dump(self.library, f, indent=4)
 
     def generate_id(self):
         """Gera um ID único de 4 dígitos para a música."""
-        while True:
-            # Gera um código de 4 dígitos
-            code = str(random.randint(1000, 9999))
-            if code not in self.library:
-                return code
+        with self.library_lock:
+            while True:
+                # Gera um código de 4 dígitos
+                code = str(random.randint(1000, 9999))
+                # Também evita IDs reservados por downloads concorrentes ainda não salvos
+                if code not in self.library and code not in self._reserved_ids:
+                    self._reserved_ids.add(code)
+                    return code
+
+    def _stage(self, name, duration_sec=0.0):
+        """Reserva memória para um estágio do pipeline (se houver agendador configurado)."""
+        if self.scheduler:
+            return self.scheduler.stage(name, duration_sec)
+        return contextlib.nullcontext()
+
+    def get_audio_duration(self, path):
+        """Duração do áudio em segundos (via ffprobe, sem decodificar o arquivo)."""
+        try:
+            return float(mediainfo(path).get('duration', 0) or 0)
+        except Exception:
+            return 0.0
 
     def search_song(self, query):
         results = self.ytmusic.search(query, filter='songs')
@@ -102,6 +129,7 @@ class SongManager:
                 print(msg)
 
         song_folder = os.path.dirname(input_path)
+        duration_sec = self.get_audio_duration(input_path)
         
         # 1. DEMUCS separação de áudio
         log(f"Iniciando separação de áudio específica para {title}...")
@@ -126,7 +154,8 @@ class SongManager:
             try:
                 cmd = ["demucs", "-n", "htdemucs", "--two-stems=vocals", input_path, "-o", song_folder]
                 log(f"Executando Demucs (isso pode demorar)...")
-                subprocess.run(cmd, check=True) 
+                with self._stage("demucs", duration_sec):
+                    subprocess.run(cmd, check=True)
                 
                 # Localizar caminhos
                 # Demucs cria pasta baseada no nome do arquivo.
@@ -147,17 +176,26 @@ class SongManager:
                 AudioSegment.from_wav(no_vocals_path).export(final_instrumental_path, format="mp3")
                 
             except Exception as e:
+                if is_oom_error(e):
+                    raise # Falta de memória: o agendador reenfileira o job inteiro
                 log(f"Erro no Demucs: {e}")
                 return None, None
 
         # 2. TRANSCRIÇÃO COM WHISPER
         try:
-            log("Carregando modelo Whisper (base)...")
-            model = whisper.load_model("base")
-            log("Transcrevendo vocais com timestamps de palavras...")
-            
-            # Chave: word_timestamps=True para obter tempos por palavra
-            result = model.transcribe(vocals_path, word_timestamps=True)
+            with self._stage("whisper", duration_sec):
+                log("Carregando modelo Whisper (base)...")
+                model = whisper.load_model("base")
+                log("Transcrevendo vocais com timestamps de palavras...")
+                
+                # Chave: word_timestamps=True para obter tempos por palavra
+                # Transcreve apenas os trechos com voz (VAD) para evitar alucinações em intros/solos
+                result = self.transcribe_voiced(model, vocals_path, log)
+                # Libera o modelo antes do alinhamento (Wav2Vec2 é bem maior)
+                del model
+
+            # Contornos de referência (altura/energia) para a pontuação ao vivo no player
+            self.save_reference(vocals_path, song_id, log)
             
             # Salva transcrição bruta do Whisper
             raw_text_path = os.path.join(self.song_dir, f"{song_id}_whisper.txt")
@@ -195,7 +233,8 @@ class SongManager:
                 if vocals_path and os.path.exists(vocals_path):
                      detected_lang = result.get('language', 'pt')
                      log(f"Whisper detected language: {detected_lang}")
-                     final_lrc_content, aligned_words = self.align_precise_lyrics_with_audio(vocals_path, official_lrc, language=detected_lang)
+                     with self._stage("align", duration_sec):
+                         final_lrc_content, aligned_words = self.align_precise_lyrics_with_audio(vocals_path, official_lrc, language=detected_lang)
                 else:
                      log("Erro: Não foi possível encontrar vocals.wav para alinhamento. Usando LRC simples.")
                      # Fallback para LRC simples baseada em linhas ou Whisper
@@ -294,6 +333,7 @@ class SongManager:
                         "id": song_id,
                         "title": title,
                         "artist": artist,
+                        "vad_skipped_fraction": result.get('vad_skipped_fraction'),
                         "lines": lines_data
                     }, f, indent=2)
                 log(f"JSON Salvo com sucesso.")
@@ -319,11 +359,113 @@ class SongManager:
                         log(f"Aviso: Não foi possível limpar arquivos temporários: {e}")
 
         except Exception as e:
+            if is_oom_error(e):
+                raise
             log(f"Erro em Whisper/Alinhamento: {e}")
             import traceback
             traceback.print_exc()
             return None, None
 
+    def transcribe_voiced(self, model, vocals_path, log=print):
+        """
+        Transcreve com Whisper apenas as regiões com voz detectadas pelo VAD.
+        As regiões são agrupadas em lotes e os timestamps (segmentos e palavras)
+        são mapeados de volta para a linha do tempo original da música.
+        Retorna um dicionário no mesmo formato de model.transcribe().
+        """
+        sr = whisper.audio.SAMPLE_RATE
+        audio = whisper.load_audio(vocals_path)
+        total_sec = len(audio) / sr
+
+        regions = detect_voiced_regions(audio, sr)
+        voiced_sec = sum(e - s for s, e in regions)
+        if not regions:
+            # Sem voz detectada: transcreve tudo (comportamento antigo) para não perder nada
+            log("VAD: nenhum trecho com voz detectado, transcrevendo o áudio inteiro.")
+            result = model.transcribe(audio, word_timestamps=True)
+            result['vad_skipped_fraction'] = 0.0
+            return result
+
+        skipped = 1.0 - (voiced_sec / total_sec) if total_sec > 0 else 0.0
+        log(f"VAD: {len(regions)} trechos com voz, {skipped * 100:.1f}% do áudio ignorado.")
+
+        segments = []
+        texts = []
+        language = None
+        for packed_audio, timeline in pack_regions(audio, sr, regions):
+            # Fixa o idioma detectado no primeiro lote para manter consistência
+            res = model.transcribe(packed_audio, word_timestamps=True, language=language)
+            if language is None:
+                language = res.get('language')
+            texts.append(res.get('text', ''))
+            for seg in res['segments']:
+                seg['start'] = timeline.to_original(seg['start'])
+                seg['end'] = max(seg['start'], timeline.to_original(seg['end'], is_end=True))
+                for word in seg.get('words', []):
+                    word['start'] = timeline.to_original(word['start'])
+                    word['end'] = max(word['start'], timeline.to_original(word['end'], is_end=True))
+                segments.append(seg)
+
+        return {
+            'text': "".join(texts),
+            'segments': segments,
+            'language': language,
+            'vad_skipped_fraction': skipped
+        }
+
+    def save_reference(self, vocals_path, song_id, log=print):
+        """
+        Extrai dos vocais separados os contornos de altura (f0) e energia,
+        reduzidos para 1 valor a cada 20ms, e salva em {song_id}_reference.npz.
+        O player só faz uma consulta por índice durante a música.
+        """
+        try:
+            audio = whisper.load_audio(vocals_path)
+            midi, energy, hop_ms = extract_reference_contours(audio, whisper.audio.SAMPLE_RATE)
+            ref_path = os.path.join(self.song_dir, f"{song_id}_reference.npz")
+            save_reference_contours(ref_path, midi, energy, hop_ms)
+            log(f"Contornos de referência salvos ({len(midi)} frames).")
+            return ref_path
+        except Exception as e:
+            log(f"Aviso: Não foi possível extrair contornos de referência: {e}")
+            return None
+
+    def save_waveform(self, song_id, stem_paths, log=print):
+        """
+        Gera o sidecar binário {song_id}_waveform.bin com picos em múltiplas
+        resoluções e o loudness integrado de cada faixa.
+        stem_paths: {nome_da_faixa: caminho_do_audio}
+        """
+        try:
+            stems = {}
+            for name, path in stem_paths.items():
+                if not path or not os.path.exists(path):
+                    continue
+                seg = AudioSegment.from_file(path).set_channels(1)
+                scale = float(1 << (8 * seg.sample_width - 1))
+                samples = np.array(seg.get_array_of_samples(), dtype=np.float32) / scale
+                stems[name] = (samples, seg.frame_rate)
+            if not stems:
+                return None
+            sidecar_path = os.path.join(self.song_dir, f"{song_id}_waveform.bin")
+            write_waveform_sidecar(sidecar_path, stems)
+            log(f"Forma de onda salva ({', '.join(stems)}).")
+            return sidecar_path
+        except Exception as e:
+            log(f"Aviso: Não foi possível gerar forma de onda: {e}")
+            return None
+
+    def save_manifest(self, song_id, stem_paths, log=print):
+        """Gera {song_id}_manifest.json (manifest.json em songs/<id>/) com os dados de cada faixa."""
+        try:
+            manifest = build_manifest(stem_paths)
+            manifest_path = os.path.join(self.song_dir, f"{song_id}_manifest.json")
+            write_manifest(manifest_path, manifest)
+            return manifest_path
+        except Exception as e:
+            log(f"Aviso: Não foi possível gerar manifest: {e}")
+            return None
+
     def align_precise_lyrics(self, whisper_segments, official_lrc_content):
         """
         Alinha letras usando CTC Segmentation com Wav2Vec2 (Torchaudio).
@@ -621,13 +763,24 @@ class SongManager:
         return song_id
 
     
-    def download_song(self, video_id, title, artist, progress_callback=None):
+    def discard_song_files(self, song_id):
+        """Remove os arquivos gerados para um song_id (download/processamento interrompido)."""
+        for name in os.listdir(self.song_dir):
+            if name.startswith(f"{song_id}.") or name.startswith(f"{song_id}_"):
+                try:
+                    os.remove(os.path.join(self.song_dir, name))
+                except OSError:
+                    pass
+        shutil.rmtree(os.path.join(self.song_dir, "htdemucs", song_id), ignore_errors=True)
+
+    def download_song(self, video_id, title, artist, progress_callback=None, song_id=None):
         """
         Realiza o download e processamento completo da música.
         1. Baixa o áudio do YouTube com alta qualidade.
         2. Executa o pipeline de IA (separação + alinhamento).
         3. Se falhar, tenta buscar LRC padrão na internet.
         4. Atualiza a biblioteca local.
+        song_id pode ser fornecido (ex.: reservado pela fila compartilhada do worker).
         """
         def log(msg):
             if progress_callback:
@@ -637,7 +790,8 @@ class SongManager:
 
         log(f"Baixando {title} por {artist}...")
         
-        song_id = self.generate_id()
+        if not song_id:
+            song_id = self.generate_id()
         base_filename = os.path.join(self.song_dir, song_id)
         
         # 1. Download Áudio (MP3) - Precisamos de alta qualidade para separação
@@ -654,10 +808,13 @@ class SongManager:
         }
 
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([f"https://music.youtube.com/watch?v={video_id}"])
+            with self._stage("download"):
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    ydl.download([f"https://music.youtube.com/watch?v={video_id}"])
         except Exception as e:
             log(f"Erro ao baixar: {e}")
+            with self.library_lock:
+                self._reserved_ids.discard(song_id)
             return None
 
         audio_path_original = f"{base_filename}.mp3"
@@ -665,7 +822,16 @@ class SongManager:
         # 2. PROCESSAMENTO IA
         log("Iniciando Melhoria IA (Separação & Sync)...")
         # Isso retornará o caminho para o instrumental e o LRC gerado
-        instrumental_path, lrc_path = self.process_audio(audio_path_original, song_id, title, artist, progress_callback)
+        try:
+            instrumental_path, lrc_path = self.process_audio(audio_path_original, song_id, title, artist, progress_callback)
+        except Exception:
+            # Só falta de memória chega aqui: nada é registrado (sem música degradada na biblioteca)
+            # e os arquivos parciais são apagados, pois a nova tentativa recomeça do zero
+            log("Memória insuficiente no processamento. Descartando arquivos parciais...")
+            self.discard_song_files(song_id)
+            with self.library_lock:
+                self._reserved_ids.discard(song_id)
+            raise
         
         final_audio_path = instrumental_path if instrumental_path else audio_path_original
         final_lrc_path = lrc_path
@@ -682,27 +848,43 @@ class SongManager:
              except:
                  pass
         
+        # Picos de forma de onda + loudness por faixa (seek bar na web e normalização de volume no player)
+        stems = {"original": audio_path_original}
+        if instrumental_path:
+            stems["instrumental"] = instrumental_path
+        self.save_waveform(song_id, stems, log)
+        # Duração/taxa/tamanho por faixa lidos dos cabeçalhos: o player não precisa decodificar o áudio
+        self.save_manifest(song_id, stems, log)
+
         # 3. Atualizar Biblioteca
-        self.library[song_id] = {
-            "id": song_id,
-            "title": title,
-            "artist": artist,
-            "audio_path": final_audio_path,
-            "original_audio_path": audio_path_original, # Mantém original apenas por precaução
-            "lrc_path": final_lrc_path
-        }
+        with self.library_lock:
+            self.library[song_id] = {
+                "id": song_id,
+                "title": title,
+                "artist": artist,
+                "audio_path": final_audio_path,
+                "original_audio_path": audio_path_original, # Mantém original apenas por precaução
+                "lrc_path": final_lrc_path
+            }
+            self._reserved_ids.discard(song_id)
         self.save_library()
         
         return song_id
 
 
-import webview
-import threading
+# pywebview é necessário apenas para a GUI; o modo worker roda em máquinas headless
+try:
+    import webview
+except ImportError:
+    webview = None
 
 class Api:
-    def __init__(self, manager):
+    def __init__(self, manager, memory_ceiling_mb=6000, max_jobs=3):
         self.manager = manager
         self._window = None
+        # Ingestão em massa roda em paralelo, limitada pelo teto de memória (RSS)
+        self.memory_ceiling_mb = memory_ceiling_mb
+        self.max_jobs = max_jobs
 
     def set_window(self, window):
         self._window = window
@@ -753,6 +935,10 @@ class Api:
         """Processa o texto de input para download em massa."""
         lines = text.strip().split('\n')
         self._log(f"Processando {len(lines)} linhas...")
+
+        scheduler = MemoryScheduler(self.memory_ceiling_mb, self.max_jobs, log=self._log)
+        self.manager.scheduler = scheduler
+        scheduler.start()
         
         for line in lines:
             line = line.strip()
@@ -770,28 +956,34 @@ class Api:
                 video_id = line
             
             if video_id:
-                self._log(f"ID Encontrado: {video_id}. Buscando metadados...")
-                try:
-                    # Nós precisamos de metadados. self.manager.ytmusic.get_song(video_id) pode funcionar
-                    details = self.manager.ytmusic.get_song(video_id)
-                    title = details['videoDetails']['title']
-                    artist = details['videoDetails']['author']
-                    
-                    self._log(f"Baixando: {title} - {artist}")
-                    code = self.manager.download_song(video_id, title, artist, progress_callback=lambda m: self._log(m))
-                    if code:
-                        self._log(f"-> Sucesso! Código: {code}")
-                    else:
-                        self._log(f"-> Falhou.")
-                        # code = self.manager.create_mock_song(title, artist)
-                        # self._log(f"-> Mock Code: {code}")
-                        
-                except Exception as e:
-                    self._log(f"Erro ao processar {line}: {e}")
+                self._log(f"ID Encontrado: {video_id}. Enfileirando...")
+                scheduler.submit(IngestJob(line, lambda job, vid=video_id: self._bulk_job(vid)))
             else:
                  self._log(f"Linha inválida: {line}")
-                 
-        self._log("Processamento em massa concluído.")
+
+        # Aguarda a fila; jobs que estouraram memória já foram reenfileirados pelo agendador
+        for job in scheduler.wait():
+            if job.error:
+                self._log(f"Erro ao processar {job.job_id}: {job.error}")
+        scheduler.stop()
+        self.manager.scheduler = None
+        self._log(f"Processamento em massa concluído. Pico de memória: {scheduler.peak_rss // (1024 * 1024)} MB.")
+
+    def _bulk_job(self, video_id):
+        """Job de ingestão individual (roda numa thread do agendador)."""
+        self._log(f"Buscando metadados de {video_id}...")
+        # Nós precisamos de metadados. self.manager.ytmusic.get_song(video_id) pode funcionar
+        details = self.manager.ytmusic.get_song(video_id)
+        title = details['videoDetails']['title']
+        artist = details['videoDetails']['author']
+
+        self._log(f"Baixando: {title} - {artist}")
+        code = self.manager.download_song(video_id, title, artist, progress_callback=lambda m: self._log(m))
+        if code:
+            self._log(f"-> Sucesso! Código: {code}")
+        else:
+            self._log(f"-> Falhou: {title}")
+        return code
 
     def _log(self, message):
         print(message)
@@ -813,6 +1005,13 @@ def start_server():
             PORT += 1
 
 if __name__ == "__main__":
+    # Modo worker headless: python song_manager.py worker --jobs /mnt/compartilhado/jobs --songs /mnt/compartilhado/songs
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] in ("worker", "enqueue"):
+        from ingest_worker import main
+        main(sys.argv[1:])
+        sys.exit(0)
+
     # Inicia servidor local para evitar restrições de file:// (para incorporação do YouTube)
     t = threading.Thread(target=start_server, daemon=True)
     t.start()
@@ -0,0 +1,93 @@
+import threading
+
+WARM_CHUNK = 1024 * 1024
+
+
+def warm_file_cache(paths):
+    """Lê os arquivos até o fim para trazê-los ao cache de disco do sistema operacional."""
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                while f.read(WARM_CHUNK):
+                    pass
+        except OSError:
+            pass
+
+
+class SongPrefetcher:
+    """
+    Prepara a próxima música da fila em uma thread enquanto a atual toca.
+
+    prepare_fn(code, library) faz o trabalho pesado (consulta no banco,
+    leitura das letras, duração, referência) e não pode usar o display.
+    library_factory cria a conexão SQLite própria da thread de prefetch.
+    """
+    def __init__(self, prepare_fn, library_factory):
+        self.prepare_fn = prepare_fn
+        self.library_factory = library_factory
+        self.library = None
+
+        self.cond = threading.Condition()
+        self.requested = None # Código pedido mais recente
+        self.working = None # Código sendo preparado agora
+        self.results = {} # código -> dict preparado (ou None se não existe)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def request(self, code):
+        """Pede a preparação de 'code' (ignora se já está pronto ou em andamento)."""
+        with self.cond:
+            if code == self.requested or code in self.results:
+                return
+            self.requested = code
+            # Só guarda a música pedida agora: resultados antigos não serão usados
+            self.results = {c: r for c, r in self.results.items() if c == code}
+            self.cond.notify_all()
+
+    def take(self, code, timeout=5.0):
+        """
+        Entrega o resultado preparado para 'code'. Se ainda está sendo
+        preparado, espera até timeout. Retorna None se não foi pedido.
+        """
+        with self.cond:
+            if code not in self.results and (self.working == code or self.requested == code):
+                self.cond.wait_for(lambda: code in self.results or not self.running, timeout=timeout)
+            if self.requested == code:
+                self.requested = None
+            return self.results.pop(code, None)
+
+    def _worker_loop(self):
+        while True:
+            with self.cond:
+                while self.running and (self.requested is None or self.requested in self.results):
+                    self.cond.wait()
+                if not self.running:
+                    return
+                code = self.requested
+                self.working = code
+
+            try:
+                if self.library is None:
+                    self.library = self.library_factory()
+                result = self.prepare_fn(code, self.library)
+            except Exception as e:
+                print(f"Erro ao preparar música {code}: {e}")
+                result = None
+
+            with self.cond:
+                self.working = None
+                if self.requested == code:
+                    self.results[code] = result
+                self.cond.notify_all()
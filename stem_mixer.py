@@ -0,0 +1,183 @@
+import time
+import threading
+import numpy as np
+import pygame
+
+
+def decode_stem(path):
+    """Decodifica um arquivo de áudio para PCM int16 (frames, canais) no formato do mixer."""
+    return pygame.sndarray.array(pygame.mixer.Sound(path))
+
+
+class DualStemPlayer:
+    """
+    Reprodução das duas faixas (instrumental e original) ao mesmo tempo,
+    alinhadas amostra a amostra, com mistura própria.
+
+    O PCM das duas faixas fica em memória; uma thread mistura blocos curtos
+    (chunk_ms) com o ganho de cada faixa e os enfileira em um único Channel
+    do pygame (Channel.queue), então as faixas nunca se desalinham. Trocar
+    de faixa (ou misturar parcialmente os vocais) é só mudar o ganho alvo:
+    uma rampa de fade_ms evita cliques e não há nenhuma leitura de disco.
+    """
+    def __init__(self, chunk_ms=80, fade_ms=150, channel_id=0):
+        self.chunk_ms = chunk_ms
+        self.fade_ms = fade_ms
+        self.channel_id = channel_id
+        self.channel = None
+
+        self.lock = threading.Lock()
+        self.pos_lock = threading.Lock() # Contador de blocos x estado do canal
+        self.stems = {}
+        self.stem_gains = {}
+        self.sample_rate = 44100
+        self.num_frames = 0
+        self.chunk_frames = 0
+
+        self.vocal_level = 0.0 # 0 = só instrumental, 1 = só original (com voz)
+        self.target_level = 0.0
+        self.volume = 1.0
+
+        self.next_frame = 0 # Próximo frame a ser misturado
+        self.chunks_submitted = 0 # Blocos entregues ao canal desde o último play
+        self.playing = False
+        self.paused = False
+        self.thread = None
+
+    def load(self, stems, gains=None, sample_rate=None):
+        """
+        stems: {'instrumental': array, 'original': array} int16 (frames, canais).
+        gains: ganho de normalização por faixa (ex.: loudness_gain), reescalados
+        para nenhum passar de 1.0 (faixas mais baixas que o alvo não distorcem).
+        """
+        self.stop()
+        freq, _, channels = pygame.mixer.get_init()
+        self.sample_rate = sample_rate or freq
+        n = min(len(a) for a in stems.values())
+        # Mistura em float32; canais no formato do mixer
+        self.stems = {name: a[:n].reshape(n, -1)[:, :channels] for name, a in stems.items()}
+        gains = {name: float((gains or {}).get(name, 1.0)) for name in stems}
+        # Ganho > 1 estouraria (clip) as amostras int16: reduz as duas faixas juntas
+        # até a mais alta ficar em 1, mantendo o equilíbrio entre elas
+        peak = max(gains.values(), default=1.0)
+        self.stem_gains = {name: g / peak for name, g in gains.items()} if peak > 1.0 else gains
+        self.num_frames = n
+        self.chunk_frames = max(1, int(self.sample_rate * self.chunk_ms / 1000))
+
+    @property
+    def duration_ms(self):
+        return self.num_frames * 1000.0 / self.sample_rate if self.num_frames else 0.0
+
+    def set_vocal_level(self, level, instant=False):
+        """Nível dos vocais (0..1). Sem instant, faz crossfade de fade_ms."""
+        with self.lock:
+            self.target_level = max(0.0, min(1.0, level))
+            if instant:
+                self.vocal_level = self.target_level
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.channel:
+            self.channel.set_volume(volume)
+
+    def _mix_frames(self, count):
+        """Próximos 'count' frames misturados (int16), ou None no fim da música."""
+        with self.lock:
+            start = self.next_frame
+            if start >= self.num_frames:
+                return None
+            end = min(start + count, self.num_frames)
+            self.next_frame = end
+
+            # Rampa de ganho dentro do bloco em direção ao alvo
+            level0 = self.vocal_level
+            fade_frames = self.fade_ms * self.sample_rate / 1000.0
+            step = (end - start) / fade_frames if fade_frames else 1.0
+            delta = self.target_level - level0
+            level1 = level0 + max(-step, min(step, delta))
+            self.vocal_level = level1
+
+        ramp = np.linspace(level0, level1, end - start, endpoint=False, dtype=np.float32)[:, None]
+        inst = self.stems.get('instrumental')
+        orig = self.stems.get('original')
+        mix = np.zeros((end - start, next(iter(self.stems.values())).shape[1]), dtype=np.float32)
+        if inst is not None:
+            mix += inst[start:end] * ((1.0 - ramp) * self.stem_gains['instrumental'])
+        if orig is not None:
+            mix += orig[start:end] * (ramp * self.stem_gains['original'])
+        return np.clip(mix, -32768, 32767).astype(np.int16)
+
+    def _mix_chunk(self):
+        """Próximo bloco misturado como Sound, ou None no fim da música."""
+        pcm = self._mix_frames(self.chunk_frames)
+        return None if pcm is None else pygame.sndarray.make_sound(pcm)
+
+    def _feed_loop(self):
+        wait = self.chunk_ms / 10000.0 # Verifica a fila 10x por bloco
+        while self.playing:
+            ch = self.channel
+            if ch.get_queue() is None:
+                # Mantém sempre um bloco na fila atrás do que está tocando
+                chunk = self._mix_chunk()
+                if chunk is None:
+                    break
+                with self.pos_lock:
+                    if ch.get_busy():
+                        ch.queue(chunk)
+                    else:
+                        ch.play(chunk) # Underrun (thread atrasada): recomeça o canal
+                    self.chunks_submitted += 1
+            time.sleep(wait)
+
+    def play(self, start_ms=0.0):
+        """Toca a partir de start_ms (também usado para seek)."""
+        self.stop()
+        if not self.stems:
+            return
+        if self.channel is None:
+            pygame.mixer.set_reserved(self.channel_id + 1)
+            self.channel = pygame.mixer.Channel(self.channel_id)
+        self.channel.set_volume(self.volume)
+        with self.lock:
+            self.next_frame = min(self.num_frames, int(start_ms * self.sample_rate / 1000.0))
+            self.vocal_level = self.target_level
+        self.paused = False
+        self.playing = True
+        self.channel.play(self._mix_chunk())
+        self.chunks_submitted = 1
+        self.thread = threading.Thread(target=self._feed_loop, daemon=True)
+        self.thread.start()
+
+    seek = play
+
+    def pause(self):
+        if self.channel and self.playing:
+            self.channel.pause()
+            self.paused = True
+
+    def resume(self):
+        if self.channel and self.playing:
+            self.channel.unpause()
+            self.paused = False
+
+    def stop(self):
+        self.playing = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+        if self.channel:
+            self.channel.stop()
+
+    def get_busy(self):
+        """True enquanto há música a tocar (mesmo entre dois blocos)."""
+        return self.playing and (self.next_frame < self.num_frames or bool(self.channel and self.channel.get_busy()))
+
+    def get_pos(self):
+        """Como mixer.music.get_pos(): ms tocados desde o último play, ou -1 parado."""
+        if not self.playing or not self.channel:
+            return -1
+        # Tocados = entregues - (tocando agora + na fila)
+        with self.pos_lock:
+            pending = int(self.channel.get_busy()) + int(self.channel.get_queue() is not None)
+            done = max(0, self.chunks_submitted - pending)
+        return int(done * self.chunk_frames * 1000 / self.sample_rate)
@@ -0,0 +1,141 @@
+"""
+Fila compartilhada de ingestão com vários processos worker locais num
+diretório temporário (processador falso via --process, sem rede nem IA).
+"""
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest_worker import SharedJobQueue, commit_artifacts  # noqa: E402
+
+PROCESSOR = "test_ingest_worker:fake_process"
+DYING_PROCESSOR = "test_ingest_worker:dying_process"
+
+
+def fake_process(job, staging_dir):
+    """Gera os artefatos de uma música aos poucos (publicação parcial seria visível)."""
+    song_id = job["song_id"]
+    with open(os.path.join(os.environ["KARAOKE_TEST_LOG"], f"{song_id}.{os.getpid()}"), "w") as f:
+        f.write(job["job"])
+    for name in (f"{song_id}.mp3", f"{song_id}_instrumental.mp3", f"{song_id}.lrc"):
+        with open(os.path.join(staging_dir, name), "w") as f:
+            f.write(name)
+        time.sleep(0.05)
+    return song_id
+
+
+def dying_process(job, staging_dir):
+    """Simula um worker morto no meio do job (OOM killer): sai sem liberar o lease."""
+    os._exit(1)
+
+
+def start_worker(tmp_path, worker_id, processor=PROCESSOR, lease=60):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.dirname(__file__)]),
+               KARAOKE_TEST_LOG=str(tmp_path / "log"))
+    cmd = [sys.executable, os.path.join(ROOT, "ingest_worker.py"), "worker",
+           "--jobs", str(tmp_path / "jobs"), "--songs", str(tmp_path / "songs"),
+           "--id", worker_id, "--lease", str(lease), "--process", processor, "--exit-when-idle"]
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    (tmp_path / "songs").mkdir()
+    (tmp_path / "log").mkdir()
+    return SharedJobQueue(str(tmp_path / "jobs"))
+
+
+def enqueue(queue, tmp_path, count):
+    return [queue.enqueue({"video_id": f"vid{i}", "title": f"Música {i}", "artist": "Teste"},
+                          str(tmp_path / "songs")) for i in range(count)]
+
+
+def listing(queue, sub):
+    return sorted(os.listdir(os.path.join(queue.root, sub)))
+
+
+def test_workers_claim_each_job_once_and_publish_atomically(queue, tmp_path):
+    song_ids = enqueue(queue, tmp_path, 8)
+    workers = [start_worker(tmp_path, f"w{i}") for i in range(3)]
+
+    # Enquanto os workers rodam, songs/<id> nunca pode aparecer incompleto
+    songs_dir = tmp_path / "songs"
+    partial = set()
+    while any(w.poll() is None for w in workers):
+        for name in os.listdir(songs_dir):
+            if name.startswith("."):
+                continue
+            files = set(os.listdir(songs_dir / name))
+            if files != {"original.mp3", "instrumental.mp3", "lyrics.lrc"}:
+                partial.add(name)
+        time.sleep(0.01)
+
+    assert [w.returncode for w in workers] == [0, 0, 0]
+    assert not partial
+
+    processed = os.listdir(tmp_path / "log")
+    assert sorted(name.split(".")[0] for name in processed) == sorted(song_ids)
+    assert len({name.split(".")[1] for name in processed}) > 1  # Trabalho dividido entre processos
+
+    assert len(listing(queue, "done")) == 8
+    assert listing(queue, "pending") == []
+    assert listing(queue, "leases") == []
+    assert sorted(n for n in os.listdir(songs_dir) if not n.startswith(".")) == sorted(song_ids)
+    assert os.listdir(songs_dir / ".staging") == []
+
+
+def test_lease_of_dead_worker_is_reclaimed(queue, tmp_path):
+    (song_id,) = enqueue(queue, tmp_path, 1)
+
+    dead = start_worker(tmp_path, "morto", processor=DYING_PROCESSOR)
+    assert dead.wait(timeout=30) == 1
+    assert len(listing(queue, "leases")) == 1
+    assert listing(queue, "done") == []
+
+    # Lease ainda válido: outro worker não pega o job
+    alive = start_worker(tmp_path, "vivo")
+    assert alive.wait(timeout=30) == 0
+    assert not (tmp_path / "songs" / song_id).exists()
+
+    # Lease vencido (sem heartbeat): reclamado e concluído por outro worker
+    time.sleep(1.2)
+    alive = start_worker(tmp_path, "vivo", lease=1)
+    assert alive.wait(timeout=30) == 0
+    assert (tmp_path / "songs" / song_id / "original.mp3").exists()
+    assert len(listing(queue, "done")) == 1
+    assert listing(queue, "leases") == []
+
+
+def test_job_that_keeps_killing_workers_goes_to_failed(queue, tmp_path):
+    enqueue(queue, tmp_path, 1)
+    for i in range(queue.max_attempts):
+        dead = start_worker(tmp_path, f"morto{i}", processor=DYING_PROCESSOR, lease=1)
+        assert dead.wait(timeout=30) == 1
+        time.sleep(1.2)
+
+    alive = start_worker(tmp_path, "vivo", lease=1)
+    assert alive.wait(timeout=30) == 0
+    assert os.listdir(tmp_path / "log") == []
+    assert listing(queue, "pending") == []
+    assert len(listing(queue, "failed")) == 1
+
+
+def test_commit_artifacts_does_not_overwrite_published_song(tmp_path):
+    songs_dir = tmp_path / "songs"
+    songs_dir.mkdir()
+    for attempt in ("a", "b"):
+        staging = tmp_path / attempt
+        staging.mkdir()
+        (staging / "1234.mp3").write_text(attempt)
+        (staging / "1234.lrc").write_text(attempt)
+        published = commit_artifacts(str(staging), "1234", str(songs_dir))
+        assert published == (attempt == "a")
+
+    assert sorted(os.listdir(songs_dir / "1234")) == ["lyrics.lrc", "original.mp3"]
+    assert (songs_dir / "1234" / "original.mp3").read_text() == "a"
@@ -0,0 +1,65 @@
+"""Agenda de exibição (DisplaySchedule.at) sem pygame: pontos, banner e cartão de título."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lyrics_timeline import LyricsData, LyricTimeline, DisplaySchedule  # noqa: E402
+
+
+@pytest.fixture
+def schedule():
+    lyrics = LyricsData()
+    lyrics.add_line(10000, 12000, "primeira")
+    lyrics.add_line(13000, 15000, "segunda")   # Pausa de 1s: sem pontos nem banner
+    lyrics.add_line(30000, 32000, "terceira")  # Pausa de 15s: banner e pontos
+    return DisplaySchedule(LyricTimeline(lyrics))
+
+
+def test_title_card_fades_out_in_the_last_second(schedule):
+    assert schedule.at(0).title_alpha == 255
+    assert schedule.at(4000).title_alpha == 255
+    assert schedule.at(4500).title_alpha == 127
+    assert schedule.at(5000).title_alpha == 0
+
+
+@pytest.mark.parametrize("time_ms,lit", [
+    (5999, 0), (6000, 1), (7000, 2), (8500, 3), (9000, 4), (9999, 4), (10000, 0),
+    (13000, 0), (25999, 0), (26000, 1), (27500, 2), (29000, 4), (30000, 0),
+])
+def test_countdown_dots(schedule, time_ms, lit):
+    assert schedule.at(time_ms).dots_lit == lit
+
+
+@pytest.mark.parametrize("time_ms,page,banner", [
+    (12500, 1, False),  # Entre linhas próximas: página troca, sem banner
+    (15000, 1, False),  # Fim da linha ainda na página dela (início aberto)
+    (15001, 2, True),
+    (21999, 2, True),
+    (22000, 2, False),  # Faltando 8s a linha aparece no lugar do banner
+])
+def test_instrumental_banner(schedule, time_ms, page, banner):
+    state = schedule.at(time_ms)
+    assert (state.page, state.banner) == (page, banner)
+
+
+def test_line_visibility_windows(schedule):
+    state = schedule.at(11000)
+    assert (state.page, state.show_active, state.show_preview) == (0, True, True)
+    # Depois da pausa longa a linha só aparece junto com os pontos (4s antes)
+    assert not schedule.at(25999).show_active
+    assert schedule.at(26000).show_active
+    assert schedule.at(32000).show_active
+    # Última linha terminou: página passa do fim da letra
+    state = schedule.at(32001)
+    assert (state.page, state.show_active, state.show_preview) == (3, False, False)
+
+
+def test_seek_backwards_matches_fresh_schedule(schedule):
+    times = list(range(0, 34000, 250))
+    forward = [repr(schedule.at(t)) for t in times]
+    schedule.at(34000)
+    backwards = [repr(schedule.at(t)) for t in reversed(times)]
+    assert backwards == forward[::-1]
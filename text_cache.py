@@ -0,0 +1,96 @@
+import collections
+import pygame
+
+
+class TextRenderCache:
+    """
+    Cache LRU de superfícies de texto pré-renderizadas.
+
+    Cada palavra é renderizada uma única vez por fonte/cor/contorno e reutilizada
+    em todos os frames. O cache deve ser limpo quando as fontes mudam (resize)
+    ou quando a música troca.
+    """
+    def __init__(self, max_items=1024):
+        self.max_items = max_items
+        self.surfaces = collections.OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.surfaces.clear()
+        self.sizes.clear()
+
+    def _get(self, key):
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+        return surf
+
+    def _put(self, key, surf):
+        self.misses += 1
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_items:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def size(self, font, text):
+        """font.size() com cache."""
+        key = (id(font), text)
+        size = self.sizes.get(key)
+        if size is None:
+            size = font.size(text)
+            self.sizes[key] = size
+        return size
+
+    def text(self, font, text, color):
+        """Texto simples (sem contorno)."""
+        key = ('t', id(font), text, color)
+        surf = self._get(key)
+        if surf is None:
+            surf = self._put(key, font.render(text, True, color))
+        return surf
+
+    def outlined(self, font, text, color, outline_color=(0, 0, 0), outline_width=2):
+        """
+        Texto com contorno embutido, construído uma única vez e reutilizado.
+
+        O contorno é feito com um único render na cor do contorno, blitado em
+        todos os deslocamentos dentro de um círculo de raio outline_width
+        (contorno mais suave que as 8 direções, e espessuras maiores não
+        custam nada por frame). A superfície tem outline_width pixels de
+        margem em cada lado: blitar em (x - outline_width, y - outline_width).
+        """
+        if not outline_width:
+            return self.text(font, text, color)
+
+        key = ('o', id(font), text, color, outline_color, outline_width)
+        surf = self._get(key)
+        if surf is None:
+            fill = font.render(text, True, color)
+            out = font.render(text, True, outline_color)
+            w, h = fill.get_size()
+            ow = outline_width
+            surf = pygame.Surface((w + 2 * ow, h + 2 * ow), pygame.SRCALPHA)
+            for dx, dy in outline_offsets(ow):
+                surf.blit(out, (ow + dx, ow + dy))
+            surf.blit(fill, (ow, ow))
+            self._put(key, surf)
+        return surf
+
+
+def outline_offsets(radius):
+    """Deslocamentos (dx, dy) dentro de um círculo, para contorno suave."""
+    offsets = _OFFSETS.get(radius)
+    if offsets is None:
+        limit = radius * radius + radius # Inclui a borda arredondada
+        offsets = [(dx, dy)
+                   for dx in range(-radius, radius + 1)
+                   for dy in range(-radius, radius + 1)
+                   if (dx or dy) and dx * dx + dy * dy <= limit]
+        _OFFSETS[radius] = offsets
+    return offsets
+
+
+_OFFSETS = {}